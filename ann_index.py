@@ -0,0 +1,156 @@
+"""
+语义匹配的近似最近邻（ANN）索引
+倒排文件索引（IVF）：用球面k-means把E、F、H列及同义词的全部向量划分为n_lists个簇，
+每个簇记录其向量所属的行。查询时只取与查询最接近的n_probe个簇中的行作为候选，
+由匹配器按原有规则对候选行精确重新打分。
+
+n_probe是召回率与延迟之间的调节参数：越大召回率越高、延迟越高，n_probe >= n_lists 时等价于暴力扫描
+"""
+
+import math
+from typing import Dict, Tuple
+
+import numpy as np
+
+from index_bundle import open_bundle, write_bundle
+
+ANN_VERSION = 1
+_CHUNK_SIZE = 16384  # 分配簇时每批计算的向量数（限制临时矩阵的内存）
+
+
+def default_n_lists(vector_count: int) -> int:
+    """按向量数自动选择簇数（约4 * sqrt(N)）"""
+    return max(1, min(vector_count, int(4 * math.sqrt(vector_count))))
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """把每个向量分配给内积最大的簇中心（分批计算）"""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for begin in range(0, len(vectors), _CHUNK_SIZE):
+        block = np.asarray(vectors[begin:begin + _CHUNK_SIZE], dtype=np.float32)
+        assignments[begin:begin + len(block)] = np.argmax(np.dot(block, centroids.T), axis=1)
+    return assignments
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return (x / (np.linalg.norm(x, axis=1, keepdims=True) + 1e-8)).astype(np.float32)
+
+
+class IVFIndex:
+    """倒排文件索引：簇中心 + 每个簇包含的行位置"""
+
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray):
+        """
+        Args:
+            centroids: 归一化的簇中心 (n_lists, dim)
+            list_offsets: 每个簇的行在list_rows中的起止位置 (n_lists + 1,)
+            list_rows: 按簇连续存放的行位置（同一簇内去重、升序）
+        """
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self._centroids64 = None  # probe使用的float64簇中心（第一次查询时生成）
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, owners: np.ndarray, n_lists: int = None,
+              n_iter: int = 10, sample_size: int = None, seed: int = 0) -> 'IVFIndex':
+        """
+        用球面k-means构建索引
+
+        Args:
+            vectors: 已归一化的向量 (N, dim)（可以是内存映射数组）
+            owners: 每个向量所属的行位置 (N,)
+            n_lists: 簇数（None表示按向量数自动选择）
+            n_iter: k-means迭代次数
+            sample_size: 训练簇中心使用的样本数（None表示 n_lists * 64，最多全部向量）
+            seed: 随机种子（保证同一份数据构建出相同的索引）
+
+        Returns:
+            IVFIndex
+        """
+        vector_count = len(vectors)
+        if n_lists is None:
+            n_lists = default_n_lists(vector_count)
+        n_lists = max(1, min(n_lists, vector_count))
+        if sample_size is None:
+            sample_size = n_lists * 64
+        sample_size = max(n_lists, min(sample_size, vector_count))
+
+        rng = np.random.default_rng(seed)
+        sample_ids = np.sort(rng.choice(vector_count, size=sample_size, replace=False))
+        sample = np.asarray(vectors[sample_ids], dtype=np.float32)
+        centroids = sample[rng.choice(sample_size, size=n_lists, replace=False)].copy()
+
+        for _ in range(n_iter):
+            assignments = _assign(sample, centroids)
+            order = np.argsort(assignments, kind='stable')
+            counts = np.bincount(assignments, minlength=n_lists)
+            non_empty = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[non_empty]
+            centroids[non_empty] = np.add.reduceat(sample[order], starts, axis=0)
+            # 空簇重新取一个随机样本作为中心
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(sample_size, size=len(empty), replace=False)]
+            centroids = _normalize(centroids)
+
+        # 全部向量分配到簇，同一簇内同一行只保留一次
+        assignments = _assign(vectors, centroids)
+        row_count = int(owners.max()) + 1 if len(owners) else 1
+        pairs = np.unique(assignments * row_count + owners.astype(np.int64))
+        list_ids = pairs // row_count
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(list_ids, minlength=n_lists))
+        list_rows = (pairs % row_count).astype(np.int64)
+        return cls(centroids, list_offsets, list_rows)
+
+    def save(self, path: str, meta: Dict):
+        """保存到索引文件（与embedding索引相同的文件格式）"""
+        write_bundle(path, meta=dict(meta, ann_version=ANN_VERSION, n_lists=self.n_lists), sections={
+            'centroids': self.centroids,
+            'list_offsets': self.list_offsets,
+            'list_rows': self.list_rows
+        })
+
+    @classmethod
+    def load(cls, path: str) -> Tuple[Dict, 'IVFIndex']:
+        """
+        以只读内存映射方式读取索引文件
+
+        Returns:
+            (元数据, IVFIndex)
+        """
+        meta, sections = open_bundle(path, mmap_mode='r')
+        if meta.get('ann_version') != ANN_VERSION:
+            raise ValueError(f"ANN索引版本不兼容: {meta.get('ann_version')}")
+        return meta, cls(sections['centroids'], sections['list_offsets'], sections['list_rows'])
+
+    def probe(self, query_norm: np.ndarray, n_probe: int) -> np.ndarray:
+        """
+        为每个查询选出最接近的n_probe个簇
+
+        Args:
+            query_norm: 已归一化的查询embedding矩阵 (q, dim)
+            n_probe: 每个查询检查的簇数
+
+        Returns:
+            簇编号矩阵 (q, n_probe)
+        """
+        n_probe = max(1, min(n_probe, self.n_lists))
+        if self._centroids64 is None:
+            self._centroids64 = np.asarray(self.centroids, dtype=np.float64)
+        # 逐个查询计算：同一查询选出的簇与批量大小无关（批量查询与逐个查询的候选行相同）
+        scores = np.stack([self._centroids64.dot(q) for q in np.asarray(query_norm, dtype=np.float64)])
+        if n_probe == self.n_lists:
+            return np.broadcast_to(np.arange(self.n_lists), scores.shape)
+        return np.argpartition(-scores, n_probe - 1, axis=1)[:, :n_probe]
+
+    def candidate_rows(self, list_ids: np.ndarray) -> np.ndarray:
+        """返回这些簇包含的全部行位置（去重、升序）"""
+        starts = self.list_offsets[list_ids]
+        ends = self.list_offsets[list_ids + 1]
+        return np.unique(np.concatenate([self.list_rows[s:e] for s, e in zip(starts.tolist(), ends.tolist())]))
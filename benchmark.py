@@ -0,0 +1,342 @@
+"""
+性能基准测试
+生成指定规模的合成SDTM Terminology和映射文件，使用本地的哈希编码器代替embedding模型（离线运行、结果可复现），
+测量：
+- LabTestMatcher初始化（冷启动：无缓存；热启动：缓存已存在）
+- _load_embeddings（低精度扫描时为_load_compressed_embeddings）
+- search_top_matches精确匹配路径和语义匹配路径的延迟（p50/p95/p99）
+- search_top_matches_batch吞吐量
+- suggest输入联想（前缀索引）的延迟
+- 进程峰值内存（RSS）、加载缓存后的当前内存和embedding索引文件大小
+
+结果以JSON输出，便于比较不同版本的运行结果：
+    python benchmark.py --rows 20000 --output bench.json
+
+比较float32、float16、int8三种扫描精度（每种精度在单独的进程中运行，使用同一份合成数据）：
+    python benchmark.py --rows 20000 --compare-precisions
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from lab_test_matcher import LabTestMatcher
+
+BENCHMARK_VERSION = 1
+
+_WORDS = [
+    "Hemoglobin", "Glucose", "Alanine Aminotransferase", "Aspartate Aminotransferase", "Albumin", "Creatinine",
+    "Bilirubin", "Lymphocytes", "Neutrophils", "Platelets", "Sodium", "Potassium", "Chloride", "Calcium",
+    "Urea Nitrogen", "Cholesterol", "Triglycerides", "Protein", "Erythrocytes", "Leukocytes", "Basophils",
+    "Eosinophils", "Monocytes", "Ferritin", "Iron", "Magnesium", "Phosphate", "Lactate Dehydrogenase",
+    "Amylase", "Lipase", "Troponin", "Insulin", "Cortisol", "Thyroxine", "Bicarbonate", "Uric Acid"
+]
+_WORDS_CN = ["血红蛋白", "葡萄糖", "丙氨酸氨基转移酶", "天门冬氨酸氨基转移酶", "白蛋白", "肌酐", "胆红素", "淋巴细胞",
+             "中性粒细胞", "血小板", "钠", "钾", "氯", "钙", "尿素氮", "胆固醇", "甘油三酯", "蛋白", "红细胞", "白细胞"]
+_QUALIFIERS = ["Total", "Direct", "Free", "Serum", "Urine", "Plasma", "Absolute", "Fasting", "Random", "Cord Blood"]
+
+
+class HashingEncoder:
+    """字符三元组哈希编码器：不需要模型文件，相同文本总是得到相同的向量"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.encoder_id = f"benchmark-hashing-{dim}"
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        padded = f"  {text.lower()}  "
+        for i in range(len(padded) - 2):
+            h = zlib.crc32(padded[i:i + 3].encode('utf-8'))
+            vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        return vector
+
+    def encode(self, texts, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        if isinstance(texts, str):
+            return self._vector(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self._vector(text) for text in texts])
+
+
+def _term(rng: random.Random, i: int) -> str:
+    return f"{rng.choice(_QUALIFIERS)} {rng.choice(_WORDS)} {i}"
+
+
+def make_terminology_workbook(path: str, rows: int, codelists: int, seed: int = 0):
+    """生成合成的SDTM Terminology文件（第二个sheet，包含同义词、Ratio和空值等情况）"""
+    rng = random.Random(seed)
+    records = []
+    for i in range(rows):
+        term = _term(rng, i)
+        other = rng.choice(_WORDS)
+        kind = i % 6
+        if kind == 0:
+            synonyms = f"{term}; {other}; {term.split()[1][:3]}"
+        elif kind == 1:
+            synonyms = f"{term}/{other}"
+        elif kind == 2:
+            synonyms = None
+        else:
+            synonyms = term
+        preferred = f"{term} Measurement" if i % 4 else f"{term} Measurement; {other}"
+        records.append({
+            'Code': f"C{100000 + i}",
+            'Codelist Code': f"C{i % codelists}",
+            'Codelist Extensible (Yes/No)': "No",
+            'Codelist Name': f"Codelist {i * codelists // rows}",
+            'CDISC Submission Value': f"T{i:06d}",
+            'CDISC Synonym(s)': synonyms,
+            'CDISC Definition': f"Synthetic definition of {term}.",
+            'NCI Preferred Term': preferred
+        })
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'Readme': ["synthetic benchmark data"]}).to_excel(writer, sheet_name="README", index=False)
+        pd.DataFrame(records).to_excel(writer, sheet_name="Terminology", index=False)
+
+
+def make_mapping_workbook(path: str, rows: int, seed: int = 0) -> List[str]:
+    """生成合成的映射文件（Sheet1），返回可以精确匹配的查询"""
+    rng = random.Random(seed + 1)
+    records = []
+    for i in range(rows):
+        word = rng.choice(_WORDS)
+        records.append({
+            'TESTCD': f"M{i:05d}",
+            'TEST': f"{word} Test {i}",
+            'TESTDS': f"{word[:6].upper()}{i}",
+            'TESTS_CN': f"{rng.choice(_WORDS_CN)}{i}",
+            'TESTS_EN': f"{word} {i}"
+        })
+    pd.DataFrame(records).to_excel(path, sheet_name="Sheet1", index=False)
+    return [record['TEST'] for record in records] + [record['TESTS_CN'] for record in records]
+
+
+def make_semantic_queries(count: int, seed: int = 0) -> List[str]:
+    """生成不会命中映射文件的查询（走语义匹配路径）"""
+    rng = random.Random(seed + 2)
+    return [f"{rng.choice(_WORDS).lower()} {rng.choice(_QUALIFIERS).lower()} level q{i}" for i in range(count)]
+
+
+def peak_rss_mb():
+    """进程峰值内存（MB）；不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def current_rss_mb():
+    """进程当前内存（MB，读取/proc/self/statm）；不支持的平台返回None"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def latency_summary(seconds: List[float]) -> Dict:
+    """延迟统计（毫秒）"""
+    ms = np.asarray(seconds) * 1000.0
+    return {
+        'count': int(len(ms)),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max())
+    }
+
+
+def _timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def run_benchmark(args) -> Dict:
+    workdir = args.workdir or tempfile.mkdtemp(prefix="testcd_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    excel_path = os.path.join(workdir, "terminology.xlsx")
+    mapping_path = os.path.join(workdir, "mapping.xlsx")
+    cache_dir = os.path.join(workdir, "cache")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"生成合成数据: {args.rows} 行CT，{args.mapping_rows} 行映射文件 -> {workdir}", file=sys.stderr, flush=True)
+    make_terminology_workbook(excel_path, args.rows, args.codelists, args.seed)
+    exact_pool = make_mapping_workbook(mapping_path, args.mapping_rows, args.seed)
+    rng = random.Random(args.seed + 3)
+    exact_queries = [rng.choice(exact_pool) for _ in range(args.queries)]
+    semantic_queries = make_semantic_queries(args.queries, args.seed)
+    batch_queries = make_semantic_queries(args.batch_queries, args.seed + 100)
+
+    encoder = HashingEncoder(args.dim)
+
+    def new_matcher():
+        return LabTestMatcher(excel_path=excel_path, mapping_file=mapping_path, cache_dir=cache_dir, encoder=encoder,
+                              query_cache_size=0, persist_query_cache=False, warmup_model=False,
+                              use_ann_index=args.ann, search_workers=args.workers, scan_precision=args.scan_precision)
+
+    results = {}
+    _, results['init_cold_s'] = _timed(new_matcher)
+    matcher, results['init_cached_s'] = _timed(new_matcher)
+    results['peak_rss_after_init_mb'] = peak_rss_mb()
+    # 冷启动生成索引时的内存释放后，当前内存为加载缓存后的常驻内存
+    gc.collect()
+    results['rss_after_init_mb'] = current_rss_mb()
+    index_path = matcher._get_cache_path()['index' if args.scan_precision == 'float32' else 'compressed']
+    results['index_file_mb'] = os.path.getsize(index_path) / (1024 * 1024)
+
+    # 低精度扫描时不生成float32索引文件，测量压缩索引的加载
+    load = matcher._load_embeddings if args.scan_precision == 'float32' else matcher._load_compressed_embeddings
+    load_times = []
+    for _ in range(args.repeat):
+        loaded, elapsed = _timed(load)
+        if not loaded:
+            raise RuntimeError(f"{load.__name__}没有从缓存加载embedding索引")
+        load_times.append(elapsed)
+    results['load_embeddings'] = latency_summary(load_times)
+
+    for name, queries in (('exact', exact_queries), ('semantic', semantic_queries)):
+        matcher.search_top_matches(queries[0], top_k=args.top_k)  # 预热
+        times = [_timed(matcher.search_top_matches, query, top_k=args.top_k)[1] for query in queries]
+        results[f'{name}_search'] = latency_summary(times)
+
+    prefixes = [query[:max(1, len(query) // 2)] for query in exact_queries]
+    matcher.suggest(prefixes[0], args.top_k)  # 预热（构建前缀索引）
+    results['suggest'] = latency_summary([_timed(matcher.suggest, prefix, args.top_k)[1] for prefix in prefixes])
+
+    batch_elapsed = 0.0
+    for begin in range(0, len(batch_queries), args.batch_size):
+        _, elapsed = _timed(matcher.search_top_matches_batch, batch_queries[begin:begin + args.batch_size],
+                            top_k=args.top_k)
+        batch_elapsed += elapsed
+    results['batch_search'] = {
+        'queries': len(batch_queries),
+        'batch_size': args.batch_size,
+        'total_s': batch_elapsed,
+        'queries_per_s': len(batch_queries) / batch_elapsed if batch_elapsed > 0 else None
+    }
+    results['peak_rss_mb'] = peak_rss_mb()
+    # 扫描过全部行后的常驻内存（包括内存映射的索引文件中读取过的页）
+    results['rss_after_search_mb'] = current_rss_mb()
+    matcher.close_workers()
+
+    if not args.keep_workdir and not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'benchmark_version': BENCHMARK_VERSION,
+        'config': {
+            'rows': args.rows, 'codelists': args.codelists, 'mapping_rows': args.mapping_rows,
+            'queries': args.queries, 'batch_queries': args.batch_queries, 'batch_size': args.batch_size,
+            'top_k': args.top_k, 'dim': args.dim, 'seed': args.seed, 'repeat': args.repeat,
+            'ann': args.ann, 'workers': args.workers, 'scan_precision': args.scan_precision
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'results': results
+    }
+
+
+def compare_precisions(args) -> Dict:
+    """
+    在单独的进程中分别以float32、float16、int8运行基准测试（内存互不影响），
+    汇总索引文件大小、加载缓存后的内存和语义匹配延迟
+    """
+    workdir = args.workdir or tempfile.mkdtemp(prefix="testcd_bench_")
+    command = [
+        sys.executable, os.path.abspath(__file__), '--rows', str(args.rows), '--codelists', str(args.codelists),
+        '--mapping-rows', str(args.mapping_rows), '--queries', str(args.queries),
+        '--batch-queries', str(args.batch_queries), '--batch-size', str(args.batch_size), '--top-k', str(args.top_k),
+        '--dim', str(args.dim), '--repeat', str(args.repeat), '--seed', str(args.seed),
+        '--workers', str(args.workers), '--workdir', workdir
+    ] + (['--ann'] if args.ann else [])
+    reports = {}
+    try:
+        for precision in ('float32', 'float16', 'int8'):
+            output = os.path.join(workdir, f"bench_{precision}.json")
+            subprocess.run(command + ['--scan-precision', precision, '--output', output], check=True)
+            with open(output, 'r', encoding='utf-8') as f:
+                reports[precision] = json.load(f)
+    finally:
+        if not args.keep_workdir and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = {
+        precision: {
+            'index_file_mb': report['results']['index_file_mb'],
+            'load_embeddings_p50_ms': report['results']['load_embeddings']['p50_ms'],
+            'rss_after_init_mb': report['results']['rss_after_init_mb'],
+            'rss_after_search_mb': report['results']['rss_after_search_mb'],
+            'semantic_p50_ms': report['results']['semantic_search']['p50_ms'],
+            'batch_queries_per_s': report['results']['batch_search']['queries_per_s']
+        }
+        for precision, report in reports.items()
+    }
+    return {
+        'benchmark_version': BENCHMARK_VERSION,
+        'config': reports['float32']['config'],
+        'environment': reports['float32']['environment'],
+        'precision_comparison': summary,
+        'reports': reports
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查项目匹配器的性能基准测试")
+    parser.add_argument('--rows', type=int, default=5000, help="合成CT的行数（默认5000）")
+    parser.add_argument('--codelists', type=int, default=10, help="合成CT的Codelist数量（默认10）")
+    parser.add_argument('--mapping-rows', type=int, default=2000, help="合成映射文件的行数（默认2000）")
+    parser.add_argument('--queries', type=int, default=200, help="精确匹配和语义匹配各测量的查询数（默认200）")
+    parser.add_argument('--batch-queries', type=int, default=2000, help="批量查询的总查询数（默认2000）")
+    parser.add_argument('--batch-size', type=int, default=256, help="每次批量查询的查询数（默认256）")
+    parser.add_argument('--top-k', type=int, default=10, help="每个查询返回的结果数（默认10）")
+    parser.add_argument('--dim', type=int, default=384, help="哈希编码器的向量维度（默认384，与默认模型一致）")
+    parser.add_argument('--repeat', type=int, default=5, help="_load_embeddings（或_load_compressed_embeddings）的重复次数（默认5）")
+    parser.add_argument('--seed', type=int, default=0, help="随机种子（默认0）")
+    parser.add_argument('--ann', action='store_true', help="开启ANN索引")
+    parser.add_argument('--workers', type=int, default=0, help="语义打分的工作进程数（默认0，单进程）")
+    parser.add_argument('--scan-precision', default='float32', choices=['float32', 'float16', 'int8'],
+                        help="扫描全部行时的向量精度（默认float32）")
+    parser.add_argument('--compare-precisions', action='store_true',
+                        help="依次以float32、float16、int8运行并比较（忽略--scan-precision）")
+    parser.add_argument('--workdir', help="合成数据和缓存的目录（默认使用临时目录，结束后删除）")
+    parser.add_argument('--keep-workdir', action='store_true', help="保留临时目录")
+    parser.add_argument('--output', help="结果JSON文件（默认输出到stdout）")
+    args = parser.parse_args()
+
+    report = compare_precisions(args) if args.compare_precisions else run_benchmark(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"结果已保存到: {args.output}", file=sys.stderr, flush=True)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+批量映射命令行工具
+读取CSV/XLSX/Parquet文件中的一列原始检查项目名称，去重后分块批量匹配，
+把每个名称的前top_k个TESTCD候选写入CSV文件。输出按块追加写入，每块落盘后在进度文件（输出文件名 + .progress）
+中记录该块的名称和输出文件的长度；中断后重新运行时截掉最后一个完整块之后的行，跳过已完成的名称
+
+运行：
+    python bulk_map.py lab_names.xlsx --column LBTEST --output mapped.csv --top-k 5
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from typing import List
+
+import pandas as pd
+
+from lab_test_matcher import LabTestMatcher
+
+OUTPUT_COLUMNS = ['query', 'rank', 'similarity', 'match_type', 'testcd', 'cdisc_synonyms', 'nci_preferred_term',
+                  'tests_cn', 'tests_en', 'row_index', 'ct_versions']
+
+
+def read_input_column(path: str, column: str, sheet=0) -> List[str]:
+    """
+    读取输入文件的一列，去掉空值并去重（保持首次出现的顺序）
+
+    Args:
+        path: 输入文件路径（.csv、.xlsx/.xls 或 .parquet）
+        column: 列名
+        sheet: Excel文件的sheet名称或索引
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == '.csv':
+        df = pd.read_csv(path, usecols=[column], dtype=str)
+    elif suffix in ('.xlsx', '.xls'):
+        df = pd.read_excel(path, sheet_name=sheet, usecols=[column], dtype=str)
+    elif suffix == '.parquet':
+        df = pd.read_parquet(path, columns=[column])
+    else:
+        raise ValueError(f"不支持的输入文件格式: {suffix}（支持 .csv、.xlsx、.xls、.parquet）")
+
+    values = [str(value).strip() for value in df[column].dropna().tolist()]
+    return list(dict.fromkeys(value for value in values if value))
+
+
+def progress_path_for(output_path: str) -> str:
+    """输出文件对应的进度文件路径"""
+    return f"{output_path}.progress"
+
+
+def append_progress(progress_path: str, offset: int, queries: List[str]):
+    """
+    在进度文件中追加一条记录并落盘：一行JSON，包含输出文件在该块写完后的长度（字节）和该块的名称
+
+    每块的输出落盘之后才写入记录，因此记录中的长度之前的输出一定是完整的
+    """
+    with open(progress_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'offset': offset, 'queries': queries}, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _recover_legacy_output(output_path: str, progress_path: str) -> set:
+    """
+    没有进度文件的输出文件（旧版本写入）：保留最后一个名称之前的行（最后一个名称可能在写入途中被中断，
+    被截断的行可能无法解析），重写一次输出文件并生成进度文件
+    """
+    rows = []
+    with open(output_path, 'r', encoding='utf-8-sig', newline='') as f:
+        try:
+            for row in csv.DictReader(f):
+                if row.get('query'):
+                    rows.append(row)
+        except csv.Error:
+            pass
+    last_query = rows[-1]['query'] if rows else None
+    kept = [row for row in rows if row['query'] != last_query]
+
+    tmp_path = f"{output_path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_COLUMNS, restval='', extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(kept)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, output_path)
+    queries = list(dict.fromkeys(row['query'] for row in kept))
+    append_progress(progress_path, os.path.getsize(output_path), queries)
+    return set(queries)
+
+
+def read_completed_queries(output_path: str) -> set:
+    """
+    读取已完成的名称（用于中断后继续），并截掉输出文件中最后一个完整块之后的行
+
+    完成的名称和完整块的位置来自进度文件；进度文件最后一行可能在写入途中被中断，无法解析时忽略。
+    只截断输出文件的末尾，不重写已完成的部分
+    """
+    progress_path = progress_path_for(output_path)
+    if not os.path.exists(output_path):
+        # 进度文件属于已删除的输出文件
+        if os.path.exists(progress_path):
+            os.remove(progress_path)
+        return set()
+    if not os.path.exists(progress_path):
+        return _recover_legacy_output(output_path, progress_path)
+
+    completed = set()
+    offset = None
+    with open(progress_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            offset = record['offset']
+            completed.update(record['queries'])
+    if offset is None:
+        return _recover_legacy_output(output_path, progress_path)
+
+    size = os.path.getsize(output_path)
+    if size < offset:
+        raise ValueError(f"输出文件 {output_path} 比进度文件记录的短（{size} < {offset} 字节），"
+                         f"输出文件可能已被修改；请删除 {progress_path} 或换一个输出文件")
+    if size > offset:
+        # 最后一个完整块之后的行属于被中断的块，截掉后重新匹配
+        with open(output_path, 'r+b') as f:
+            f.truncate(offset)
+            f.flush()
+            os.fsync(f.fileno())
+    return completed
+
+
+def result_rows(query: str, results: List[dict]) -> List[dict]:
+    """把一个名称的匹配结果转换为输出行（没有结果时输出一行match_type为none的记录）"""
+    if not results:
+        return [{'query': query, 'rank': '', 'similarity': '', 'match_type': 'none'}]
+
+    rows = []
+    for rank, result in enumerate(results, 1):
+        row = {'query': query, 'rank': rank, 'similarity': f"{result['similarity']:.6f}",
+               'row_index': result.get('row_index', '')}
+        if result.get('is_exact_match'):
+            row.update(match_type='exact', testcd=result.get('testds_value', ''),
+                       tests_cn=result.get('tests_cn_value', ''), tests_en=result.get('tests_en_value', ''))
+        else:
+            # 字面快速路径的结果（未调用模型）与语义匹配结果的列相同
+            row.update(match_type='lexical' if result.get('is_lexical_match') else 'semantic',
+                       testcd=result.get('e_value', ''),
+                       cdisc_synonyms=result.get('f_value', ''), nci_preferred_term=result.get('h_value', ''),
+                       ct_versions=';'.join(result.get('ct_versions', {})))
+        rows.append(row)
+    return rows
+
+
+def bulk_map(matcher: LabTestMatcher, queries: List[str], output_path: str, top_k: int = 5,
+             chunk_size: int = 256, codelists=None, ct_versions=None) -> int:
+    """
+    分块批量匹配并追加写入输出文件（已在输出文件中的名称会被跳过）
+
+    Args:
+        matcher: 匹配器
+        queries: 去重后的名称列表
+        output_path: 输出CSV路径
+        top_k: 每个名称输出的候选数量（语义匹配）
+        chunk_size: 每块名称数（每块调用一次search_top_matches_batch并写入一次）
+        codelists: 语义匹配只在这些Codelist中进行
+        ct_versions: 语义匹配只在这些CT版本中进行（加载了多个CT版本时）
+
+    Returns:
+        本次处理的名称数量
+    """
+    completed = read_completed_queries(output_path)
+    pending = [query for query in queries if query not in completed]
+    print(f"共 {len(queries)} 个不同的名称，已完成 {len(queries) - len(pending)} 个，待处理 {len(pending)} 个",
+          file=sys.stderr, flush=True)
+    if not pending:
+        return 0
+
+    progress_path = progress_path_for(output_path)
+    write_header = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+    started = time.perf_counter()
+    done = 0
+    with open(output_path, 'a', encoding='utf-8-sig' if write_header else 'utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_COLUMNS, restval='')
+        if write_header:
+            writer.writeheader()
+            f.flush()
+            os.fsync(f.fileno())
+            append_progress(progress_path, os.fstat(f.fileno()).st_size, [])
+        for begin in range(0, len(pending), chunk_size):
+            chunk = pending[begin:begin + chunk_size]
+            batch_results = matcher.search_top_matches_batch(chunk, top_k=top_k, codelists=codelists,
+                                                             ct_versions=ct_versions)
+            for query, results in zip(chunk, batch_results):
+                writer.writerows(result_rows(query, results))
+            # 每块写完立即落盘，再记录进度，中断后从下一块继续
+            f.flush()
+            os.fsync(f.fileno())
+            append_progress(progress_path, os.fstat(f.fileno()).st_size, chunk)
+
+            done += len(chunk)
+            elapsed = time.perf_counter() - started
+            rate = done / elapsed if elapsed > 0 else 0.0
+            eta = (len(pending) - done) / rate if rate > 0 else 0.0
+            print(f"进度: {done}/{len(pending)}，{rate:.1f} 个/秒，预计剩余 {eta:.0f} 秒", file=sys.stderr, flush=True)
+
+    elapsed = time.perf_counter() - started
+    print(f"完成: {done} 个名称，用时 {elapsed:.1f} 秒（{done / elapsed if elapsed > 0 else 0.0:.1f} 个/秒）",
+          file=sys.stderr, flush=True)
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量把原始检查项目名称映射为TESTCD候选")
+    parser.add_argument('input', help="输入文件（.csv、.xlsx、.xls 或 .parquet）")
+    parser.add_argument('--column', required=True, help="包含检查项目名称的列名")
+    parser.add_argument('--sheet', default=0, help="Excel输入文件的sheet名称或索引（默认第一个）")
+    parser.add_argument('--output', required=True, help="输出CSV文件（已存在时继续上次的进度）")
+    parser.add_argument('--top-k', type=int, default=5, help="每个名称输出的候选数量（默认5）")
+    parser.add_argument('--chunk-size', type=int, default=256, help="每块名称数（默认256）")
+    parser.add_argument('--codelist', action='append', dest='codelists',
+                        help="语义匹配只在该Codelist中进行（可重复指定）")
+    parser.add_argument('--ct-version', action='append', dest='ct_versions',
+                        help="语义匹配只在该CT版本中进行（加载了多个CT版本时，可重复指定）")
+    parser.add_argument('--workers', type=int, help="语义打分的工作进程数（默认环境变量SEARCH_WORKERS；0或1表示单进程）")
+    parser.add_argument('--excel-path', help="SDTM Terminology文件路径（默认环境变量EXCEL_PATHS或EXCEL_PATH）")
+    parser.add_argument('--mapping-file', help="映射文件路径（默认环境变量MAPPING_FILE）")
+    parser.add_argument('--cache-dir', help="缓存目录（默认环境变量CACHE_DIR）")
+    args = parser.parse_args()
+
+    sheet = int(args.sheet) if isinstance(args.sheet, str) and args.sheet.isdigit() else args.sheet
+    queries = read_input_column(args.input, args.column, sheet)
+
+    matcher = LabTestMatcher(excel_path=args.excel_path, mapping_file=args.mapping_file, cache_dir=args.cache_dir,
+                             search_workers=args.workers)
+    try:
+        bulk_map(matcher, queries, args.output, top_k=args.top_k, chunk_size=args.chunk_size, codelists=args.codelists,
+                 ct_versions=args.ct_versions)
+    finally:
+        matcher.close_workers()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+低精度的embedding索引
+把全部归一化向量（E、F、H列及同义词）压缩为float16或int8（每个向量一个缩放系数），索引文件中只保存压缩向量。
+语义匹配先用压缩向量扫描全部行得到近似相似度，再只对可能进入前top_k的候选行精确重新打分：
+候选行的float32向量按需从按文本存储的.npy文件中读取（StoredVectors，不做内存映射，不常驻内存）。
+
+每个点积的误差有上界（见dot_error_bounds），候选行按误差上界选取，最终排序与float32扫描相同。
+numpy没有低精度的矩阵乘法，扫描时需要把压缩向量分块转换为float32，int8比float16的转换快得多
+"""
+
+import threading
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+from index_bundle import open_bundle, write_bundle
+
+COMPRESSED_VERSION = 2
+PRECISIONS = ('float32', 'float16', 'int8')
+_CHUNK_SIZE = 65536  # 压缩时每批处理的向量数
+_DOT_BLOCK = 512  # 点积时每批转换为float32的向量数（转换缓冲区留在CPU缓存中）
+
+
+class CompressedVectors:
+    """
+    压缩的向量矩阵，支持与numpy数组相同的行索引、reshape和dot用法：
+    行索引和reshape不反量化，dot时才把压缩向量转换为float32，缩放系数乘在点积结果上
+    """
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray = None):
+        """
+        Args:
+            codes: float16或int8的向量 (..., dim)
+            scales: int8向量的缩放系数 (...)（float16时为None）
+        """
+        self.codes = codes
+        self.scales = scales
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, rows) -> 'CompressedVectors':
+        return CompressedVectors(self.codes[rows], None if self.scales is None else self.scales[rows])
+
+    def reshape(self, *shape) -> 'CompressedVectors':
+        """改变形状（最后一维为向量维度）"""
+        codes = self.codes.reshape(shape)
+        return CompressedVectors(codes, None if self.scales is None else self.scales.reshape(codes.shape[:-1]))
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        """反量化为float32数组（用于构建ANN索引等需要完整向量的场合）"""
+        restored = self.codes.astype(np.float32)
+        if self.scales is not None:
+            restored *= self.scales[..., None]
+        return restored if dtype is None else restored.astype(dtype, copy=False)
+
+    def dot(self, other: np.ndarray) -> np.ndarray:
+        """与float32矩阵或向量相乘（与反量化后的float32向量相乘相同，只有舍入误差的差别）"""
+        codes = self.codes.reshape(-1, self.codes.shape[-1])
+        result = np.empty((len(codes),) + other.shape[1:], dtype=np.float32)
+        # 每块压缩向量转换到同一个缓冲区中再相乘，不生成整个矩阵的float32副本
+        buffer = np.empty((min(_DOT_BLOCK, len(codes)), codes.shape[1]), dtype=np.float32)
+        for begin in range(0, len(codes), _DOT_BLOCK):
+            block = codes[begin:begin + _DOT_BLOCK]
+            np.copyto(buffer[:len(block)], block)
+            result[begin:begin + len(block)] = buffer[:len(block)].dot(other)
+        result = result.reshape(self.codes.shape[:-1] + other.shape[1:])
+        if self.scales is None:
+            return result
+        return result * (self.scales[..., None] if result.ndim > self.scales.ndim else self.scales)
+
+
+class NpyRowReader:
+    """
+    按行读取.npy文件中的二维float32数组（seek + readinto，不做内存映射，读取的行不常驻进程内存）
+
+    文件保持打开：按文本存储被替换为新文件（os.replace）后，仍读取打开时的版本
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        version = np.lib.format.read_magic(self._file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(self._file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(self._file)
+        if len(shape) != 2 or fortran_order or dtype != np.dtype(np.float32):
+            self._file.close()
+            raise ValueError(f"不是按行存放的二维float32数组: {path}")
+        self.shape = shape
+        self._data_offset = self._file.tell()
+        self._row_bytes = shape[1] * 4
+        self._lock = threading.Lock()
+
+    def read(self, rows: np.ndarray) -> np.ndarray:
+        """
+        读取这些行（可以重复、无序）；相邻的行合并为一次读取
+
+        Returns:
+            float32数组 (len(rows), dim)
+        """
+        unique, inverse = np.unique(np.asarray(rows, dtype=np.int64), return_inverse=True)
+        if len(unique) and (unique[0] < 0 or unique[-1] >= self.shape[0]):
+            raise IndexError("行号超出按文本存储的范围")
+        buffer = np.empty((len(unique), self.shape[1]), dtype=np.float32)
+        # 连续的行为一段：breaks为每段在unique中的起始位置
+        breaks = np.concatenate(([0], np.flatnonzero(np.diff(unique) != 1) + 1, [len(unique)]))
+        with self._lock:
+            for begin, end in zip(breaks[:-1].tolist(), breaks[1:].tolist()):
+                if begin == end:
+                    continue
+                self._file.seek(self._data_offset + int(unique[begin]) * self._row_bytes)
+                target = memoryview(buffer[begin:end]).cast('B')
+                if self._file.readinto(target) != len(target):
+                    raise IOError("按文本存储的文件被截断")
+        return buffer[inverse.reshape(-1)]
+
+    def close(self):
+        self._file.close()
+
+
+class StoredVectors:
+    """
+    按需读取的float32向量：行索引与numpy数组相同（返回float32数组），每次索引都从文件读取并归一化
+
+    用于压缩索引的重新打分：只读取候选行，不保留在内存中
+    """
+
+    def __init__(self, reader: NpyRowReader, rows: np.ndarray, normalize: Callable[[np.ndarray], np.ndarray]):
+        """
+        Args:
+            reader: 按文本存储的读取器
+            rows: 每个向量在按文本存储中的行号，形状即向量矩阵去掉最后一维的形状（如 (n, 3)）
+            normalize: 归一化函数（与写入float32索引时相同，保证两种精度重新打分的结果一致）
+        """
+        self.reader = reader
+        self.rows = rows
+        self.normalize = normalize
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return tuple(self.rows.shape) + (self.reader.shape[1],)
+
+    def __getitem__(self, key) -> np.ndarray:
+        rows = np.asarray(self.rows[key])
+        vectors = self.normalize(self.reader.read(rows.reshape(-1)))
+        return vectors.reshape(rows.shape + (self.reader.shape[1],))
+
+
+def quantize(vectors: np.ndarray, precision: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    压缩归一化向量
+
+    Args:
+        vectors: float32向量 (m, dim)
+        precision: 'float16' 或 'int8'
+
+    Returns:
+        (压缩后的向量 (m, dim), 每个向量的缩放系数 (m,)（float16时为None）)
+    """
+    if precision == 'float16':
+        return np.asarray(vectors, dtype=np.float16), None
+    if precision != 'int8':
+        raise ValueError(f"不支持的压缩精度: {precision}（可选: float16、int8）")
+
+    codes = np.empty(vectors.shape, dtype=np.int8)
+    scales = np.empty(len(vectors), dtype=np.float32)
+    for begin in range(0, len(vectors), _CHUNK_SIZE):
+        block = np.asarray(vectors[begin:begin + _CHUNK_SIZE], dtype=np.float32)
+        block_scales = np.abs(block).max(axis=1) / 127.0 if len(block) else np.empty(0, dtype=np.float32)
+        safe = np.where(block_scales > 0, block_scales, 1.0)
+        codes[begin:begin + len(block)] = np.clip(np.rint(block / safe[:, None]), -127, 127)
+        scales[begin:begin + len(block)] = block_scales
+    return codes, scales
+
+
+def max_quantization_error(vectors: np.ndarray, codes: np.ndarray, scales: np.ndarray = None) -> float:
+    """全部向量中最大的压缩误差 |v - 反量化(v)|_2（float64计算）"""
+    max_error = 0.0
+    for begin in range(0, len(vectors), _CHUNK_SIZE):
+        original = np.asarray(vectors[begin:begin + _CHUNK_SIZE], dtype=np.float64)
+        restored = codes[begin:begin + _CHUNK_SIZE].astype(np.float64)
+        if scales is not None:
+            restored *= scales[begin:begin + _CHUNK_SIZE, None]
+        if len(original):
+            max_error = max(max_error, float(np.linalg.norm(original - restored, axis=1).max()))
+    return max_error
+
+
+def dot_error_bounds(query_norm: np.ndarray, max_error: float) -> np.ndarray:
+    """
+    查询与压缩向量的点积误差上界（每个查询一个值）
+
+    由Cauchy-Schwarz不等式，|q·v - q·反量化(v)| <= |q|_2 * max_error；
+    另加float32累加和缩放的舍入误差
+    """
+    dim = query_norm.shape[1]
+    return np.linalg.norm(query_norm, axis=1) * max_error + dim * 2.0 ** -22
+
+
+def save_compressed(path: str, vectors: np.ndarray, precision: str, meta: Dict, sections: Dict[str, np.ndarray] = None):
+    """
+    压缩向量并保存（只保存压缩向量codes和缩放系数scales，不保存float32向量）
+
+    Args:
+        path: 索引文件路径
+        vectors: 归一化的float32向量 (m, dim)
+        precision: 'float16' 或 'int8'
+        meta: 元数据（追加精度、版本和最大压缩误差）
+        sections: 一起保存的其他数组
+    """
+    codes, scales = quantize(vectors, precision)
+    sections = dict(sections or {}, codes=codes)
+    if scales is not None:
+        sections['scales'] = scales
+    meta = dict(meta, compressed_version=COMPRESSED_VERSION, precision=precision,
+                max_error=max_quantization_error(vectors, codes, scales))
+    write_bundle(path, meta=meta, sections=sections)
+
+
+def load_compressed(path: str) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """
+    以只读内存映射方式读取压缩索引文件
+
+    Returns:
+        (元数据, {数组名: 数组})，codes为压缩后的向量，scales为缩放系数（float16时没有）
+    """
+    meta, sections = open_bundle(path, mmap_mode='r')
+    if meta.get('compressed_version') != COMPRESSED_VERSION:
+        raise ValueError(f"不支持的压缩索引版本: {meta.get('compressed_version')}")
+    return meta, sections
@@ -18,6 +18,10 @@ except ImportError:
 # 默认使用相对路径，适用于 Streamlit Cloud 部署（文件在 data/ 文件夹中）
 EXCEL_PATH = os.getenv('EXCEL_PATH', "data/SDTM Terminology.xls")
 
+# 同时加载多个CT版本（可选，格式 "版本名=路径;版本名=路径"，例如 "2024-03-29=data/CT_2024Q1.xls;2023-12-15=data/CT_2023Q4.xls"）
+# 设置后代替EXCEL_PATH：一个匹配器共享模型、查询缓存和embedding，查询时可指定版本
+EXCEL_PATHS = os.getenv('EXCEL_PATHS')
+
 # 映射文件路径（从环境变量读取，如果没有则使用默认值）
 # 默认使用相对路径，适用于 Streamlit Cloud 部署（文件在 data/ 文件夹中）
 MAPPING_FILE = os.getenv('MAPPING_FILE', "data/TEST_TESTCD_mapping.xlsx")
@@ -26,6 +30,48 @@ MAPPING_FILE = os.getenv('MAPPING_FILE', "data/TEST_TESTCD_mapping.xlsx")
 # 默认使用相对路径，适用于 Streamlit Cloud 部署
 CACHE_DIR = os.getenv('CACHE_DIR', "cache/testcd_embedding")
 
+# 查询embedding缓存（内存LRU缓存的最大条目数；是否在CACHE_DIR下持久化，设为1开启；磁盘存储的最大条目数）
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', "4096"))
+QUERY_CACHE_PERSIST = os.getenv('QUERY_CACHE_PERSIST', "0") not in ("0", "false", "False")
+QUERY_CACHE_DISK_SIZE = int(os.getenv('QUERY_CACHE_DISK_SIZE', "65536"))
+
+# 是否在初始化后于后台线程预热embedding模型（设为1开启）
+MODEL_WARMUP = os.getenv('MODEL_WARMUP', "0") not in ("0", "false", "False")
+
+# embedding编码器后端：torch（默认）、torch-int8（动态int8量化）或 onnx（需要ONNX_MODEL_PATH）
+ENCODER_BACKEND = os.getenv('ENCODER_BACKEND', "torch")
+ONNX_MODEL_PATH = os.getenv('ONNX_MODEL_PATH')
+
+# 语义匹配的近似最近邻（IVF）索引：设为1开启；簇数（0表示自动）；每次查询检查的簇数（越大召回率越高、延迟越高）
+ANN_INDEX = os.getenv('ANN_INDEX', "0") not in ("0", "false", "False")
+ANN_N_LISTS = int(os.getenv('ANN_N_LISTS', "0"))
+ANN_N_PROBE = int(os.getenv('ANN_N_PROBE', "32"))
+
+# 语义打分的工作进程数（0或1表示单进程；大批量查询时按查询或按行分片并行计算）
+SEARCH_WORKERS = int(os.getenv('SEARCH_WORKERS', "0"))
+
+# 是否记录初始化和查询各阶段的耗时（matcher.stats()查看；默认关闭，排查性能问题时开启）
+STAGE_STATS = os.getenv('STAGE_STATS', "0") not in ("0", "false", "False")
+
+# 语义匹配扫描全部行时的向量精度：float32（默认）、float16或int8（先用压缩向量扫描，再对候选行用float32精确重新打分）
+SCAN_PRECISION = os.getenv('SCAN_PRECISION', "float32")
+
+# 字面（字符n-gram TF-IDF）得分：与语义得分融合的权重（0~1，0表示不融合）；
+# 字面得分不低于该阈值时跳过模型编码、直接返回字面匹配结果（0表示关闭，例如0.9）
+LEXICAL_WEIGHT = float(os.getenv('LEXICAL_WEIGHT', "0"))
+LEXICAL_CONFIDENT = float(os.getenv('LEXICAL_CONFIDENT', "0"))
+
+# HTTP查询服务（search_service.py）：监听地址、端口；并发请求合并为一批的最大查询数和最长等待时间（毫秒）
+SERVICE_HOST = os.getenv('SERVICE_HOST', "127.0.0.1")
+SERVICE_PORT = int(os.getenv('SERVICE_PORT', "8765"))
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv('BATCH_MAX_WAIT_MS', "5"))
+
+# Streamlit结果翻译：后端 google（默认）、stub（本地桩翻译，用于测试）或 none；并发请求数上限；每批总超时（秒）
+TRANSLATOR = os.getenv('TRANSLATOR', "google")
+TRANSLATION_WORKERS = int(os.getenv('TRANSLATION_WORKERS', "8"))
+TRANSLATION_TIMEOUT = float(os.getenv('TRANSLATION_TIMEOUT', "5"))
+
 # 检查必需的环境变量
 def check_required_env_vars():
     """检查必需的环境变量是否已设置"""
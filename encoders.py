@@ -0,0 +1,128 @@
+"""
+embedding编码器后端
+- torch: SentenceTransformer默认的float32 PyTorch模型
+- torch-int8: 对Linear层做动态int8量化的PyTorch模型（CPU上编码更快、内存更小）
+- onnx: 从本地路径加载导出的ONNX模型，用onnxruntime在CPU上推理（不需要PyTorch）
+
+所有后端都提供与SentenceTransformer相同的 encode(texts, convert_to_numpy=True, ...) 接口。
+不同后端得到的embedding不完全相同，缓存按编码器标识（encoder_id）区分，切换后端会重新计算embedding
+"""
+
+import os
+import sys
+from typing import List
+
+import numpy as np
+
+from table_snapshot import file_hash
+
+BACKENDS = ('torch', 'torch-int8', 'onnx')
+
+
+def resolve_onnx_file(onnx_path: str) -> str:
+    """ONNX模型路径可以是.onnx文件，也可以是包含model.onnx和tokenizer文件的目录"""
+    if os.path.isdir(onnx_path):
+        return os.path.join(onnx_path, "model.onnx")
+    return onnx_path
+
+
+def encoder_id(model_name: str, backend: str = 'torch', onnx_path: str = None) -> str:
+    """
+    编码器标识，用作embedding缓存和查询embedding缓存的键（不需要加载模型）
+
+    torch后端的标识就是模型名称，与之前生成的缓存兼容
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"不支持的编码器后端: {backend}（可选: {', '.join(BACKENDS)}）")
+    if backend == 'torch':
+        return model_name
+    if backend == 'onnx':
+        if not onnx_path:
+            raise ValueError("onnx后端需要指定ONNX模型路径（onnx_model_path或环境变量ONNX_MODEL_PATH）")
+        onnx_file = resolve_onnx_file(onnx_path)
+        if not os.path.exists(onnx_file):
+            raise FileNotFoundError(f"ONNX模型文件不存在: {onnx_file}")
+        return f"{model_name}#onnx:{file_hash(onnx_file)[:16]}"
+    return f"{model_name}#{backend}"
+
+
+def load_encoder(model_name: str, backend: str = 'torch', onnx_path: str = None):
+    """
+    加载编码器
+
+    Args:
+        model_name: SentenceTransformer模型名称
+        backend: 'torch'、'torch-int8' 或 'onnx'
+        onnx_path: onnx后端的模型路径
+
+    Returns:
+        提供encode方法的编码器
+    """
+    if backend == 'onnx':
+        return OnnxEncoder(onnx_path)
+
+    from sentence_transformers import SentenceTransformer
+    if backend == 'torch-int8':
+        import torch
+        # 动态量化只支持CPU
+        model = SentenceTransformer(model_name, device='cpu')
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return SentenceTransformer(model_name)
+
+
+class OnnxEncoder:
+    """用onnxruntime推理导出的句向量模型（对token embedding做attention mask加权的平均池化）"""
+
+    def __init__(self, onnx_path: str, max_length: int = 128):
+        """
+        Args:
+            onnx_path: .onnx文件路径，或包含model.onnx和tokenizer文件的目录
+            max_length: 最大token数（与SentenceTransformer的max_seq_length一致）
+        """
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        onnx_file = resolve_onnx_file(onnx_path)
+        self.session = onnxruntime.InferenceSession(onnx_file, providers=['CPUExecutionProvider'])
+        self.input_names = [item.name for item in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(os.path.abspath(onnx_file)))
+        self.max_length = max_length
+
+    def encode(self, texts: List[str], convert_to_numpy: bool = True, show_progress_bar: bool = False,
+               batch_size: int = 32, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        batches = []
+        for begin in range(0, len(texts), batch_size):
+            if show_progress_bar:
+                print(f"ONNX编码: {begin}/{len(texts)}", file=sys.stderr, flush=True)
+            batches.append(self._encode_batch(list(texts[begin:begin + batch_size])))
+        embeddings = np.vstack(batches) if batches else np.zeros((0, self._dimension()), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors='np')
+        tokens = {name: np.asarray(value, dtype=np.int64) for name, value in tokens.items()}
+        input_ids = tokens['input_ids']
+        # 没有attention_mask时（tokenizer不返回）全部token参与池化
+        attention_mask = tokens.get('attention_mask', np.ones_like(input_ids))
+        # 按模型的输入构建feed：模型不需要的tokenizer输出不传入，tokenizer没有返回的常见输入补默认值
+        defaults = {'attention_mask': attention_mask, 'token_type_ids': np.zeros_like(input_ids)}
+        inputs = {}
+        for name in self.input_names:
+            if name in tokens:
+                inputs[name] = tokens[name]
+            elif name in defaults:
+                inputs[name] = defaults[name]
+            else:
+                raise ValueError(f"ONNX模型的输入 {name} 无法由tokenizer提供")
+        output = self.session.run(None, inputs)[0]
+        if output.ndim == 2:
+            # 导出时已包含池化层
+            return output.astype(np.float32)
+        mask = attention_mask[:, :, None].astype(np.float32)
+        return ((output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)).astype(np.float32)
+
+    def _dimension(self) -> int:
+        return int(self.session.get_outputs()[0].shape[-1])
@@ -0,0 +1,112 @@
+"""
+Embedding索引文件格式
+一个文件保存全部向量、偏移数组和元数据，支持以内存映射方式只读打开，
+同一台机器上的多个进程可以共享同一份页缓存
+
+文件布局（版本1）：
+    8字节    魔数 b"TCDIDX\\x00\\x00"
+    4字节    格式版本（uint32，小端）
+    4字节    保留
+    8字节    头部长度（uint64，小端）
+    头部     UTF-8编码的JSON：{"version", "meta", "sections": {名称: {"dtype", "shape", "offset"}}}
+    数据段   各数组的原始字节（C顺序），起始位置按64字节对齐
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Dict, Tuple
+
+import numpy as np
+
+MAGIC = b"TCDIDX\x00\x00"
+FORMAT_VERSION = 1
+_ALIGNMENT = 64
+_PREAMBLE = struct.Struct("<8sIIQ")
+
+
+def _align(offset: int) -> int:
+    """向上对齐到_ALIGNMENT字节"""
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def write_bundle(path: str, meta: Dict, sections: Dict[str, np.ndarray]):
+    """
+    写入索引文件（先写临时文件再原子替换，读取方不会看到写了一半的文件）
+
+    Args:
+        path: 索引文件路径
+        meta: 元数据（必须可JSON序列化）
+        sections: {段名称: numpy数组}
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in sections.items()}
+
+    # 头部中的偏移依赖头部长度，先用占位偏移计算长度，再固定下来
+    layout = {name: {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': 0}
+              for name, array in arrays.items()}
+    while True:
+        header = json.dumps({'version': FORMAT_VERSION, 'meta': meta, 'sections': layout},
+                            ensure_ascii=False).encode('utf-8')
+        offset = _align(_PREAMBLE.size + len(header))
+        new_layout = {}
+        for name, array in arrays.items():
+            new_layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset = _align(offset + array.nbytes)
+        if new_layout == layout:
+            break
+        layout = new_layout
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(layout[name]['offset'])
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+
+
+def open_bundle(path: str, mmap_mode: str = 'r') -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """
+    打开索引文件
+
+    Args:
+        path: 索引文件路径
+        mmap_mode: 'r' 表示以只读内存映射方式打开（数组直接引用页缓存，不复制）；
+                   None 表示把全部数据读入进程内存
+
+    Returns:
+        (元数据, {段名称: 只读numpy数组})
+    """
+    with open(path, 'rb') as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) != _PREAMBLE.size:
+            raise ValueError(f"索引文件不完整: {path}")
+        magic, version, _, header_len = _PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise ValueError(f"不是有效的索引文件: {path}")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"索引文件版本不兼容: {version}（当前支持 {FORMAT_VERSION}）")
+        header = json.loads(f.read(header_len).decode('utf-8'))
+
+        if mmap_mode == 'r':
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        elif mmap_mode is None:
+            f.seek(0)
+            buffer = f.read()
+        else:
+            raise ValueError(f"不支持的mmap_mode: {mmap_mode}")
+
+    sections = {}
+    for name, info in header['sections'].items():
+        dtype = np.dtype(info['dtype'])
+        shape = tuple(info['shape'])
+        count = int(np.prod(shape)) if shape else 1
+        if count == 0:
+            sections[name] = np.empty(shape, dtype=dtype)
+            continue
+        if info['offset'] + count * dtype.itemsize > len(buffer):
+            raise ValueError(f"索引文件不完整: {path}（段 {name} 超出文件末尾）")
+        sections[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=info['offset']).reshape(shape)
+    return header['meta'], sections
@@ -5,21 +5,51 @@
 
 import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from typing import List, Dict, Tuple, Optional
 import os
 import sys
 import hashlib
+import threading
+
+from ann_index import IVFIndex, default_n_lists
+from compressed_index import (PRECISIONS, CompressedVectors, NpyRowReader, StoredVectors, dot_error_bounds,
+                              load_compressed, save_compressed)
+from encoders import encoder_id, load_encoder
+from index_bundle import open_bundle, write_bundle
+from lexical_index import NgramIndex
+from parallel_search import ShardedScorer
+from prefix_index import PrefixIndex
+from query_cache import QueryEmbeddingCache
+from stage_stats import StageStats
+from table_snapshot import StringColumn, read_excel_with_snapshot
 
 # 导入配置
 try:
-    from config import EXCEL_PATH, MAPPING_FILE, CACHE_DIR, check_required_env_vars
+    from config import EXCEL_PATH, EXCEL_PATHS, MAPPING_FILE, CACHE_DIR, check_required_env_vars
+    from config import QUERY_CACHE_SIZE, QUERY_CACHE_PERSIST, QUERY_CACHE_DISK_SIZE, MODEL_WARMUP
+    from config import ANN_INDEX, ANN_N_LISTS, ANN_N_PROBE, ENCODER_BACKEND, ONNX_MODEL_PATH
+    from config import SEARCH_WORKERS, STAGE_STATS, SCAN_PRECISION, LEXICAL_WEIGHT, LEXICAL_CONFIDENT
 except ImportError:
     # 如果config.py不存在，直接从环境变量读取
     import os
     EXCEL_PATH = os.getenv('EXCEL_PATH')
+    EXCEL_PATHS = os.getenv('EXCEL_PATHS')
     MAPPING_FILE = os.getenv('MAPPING_FILE')
     CACHE_DIR = os.getenv('CACHE_DIR')
+    QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', "4096"))
+    QUERY_CACHE_PERSIST = os.getenv('QUERY_CACHE_PERSIST', "0") not in ("0", "false", "False")
+    QUERY_CACHE_DISK_SIZE = int(os.getenv('QUERY_CACHE_DISK_SIZE', "65536"))
+    MODEL_WARMUP = os.getenv('MODEL_WARMUP', "0") not in ("0", "false", "False")
+    ANN_INDEX = os.getenv('ANN_INDEX', "0") not in ("0", "false", "False")
+    ANN_N_LISTS = int(os.getenv('ANN_N_LISTS', "0"))
+    ANN_N_PROBE = int(os.getenv('ANN_N_PROBE', "32"))
+    ENCODER_BACKEND = os.getenv('ENCODER_BACKEND', "torch")
+    ONNX_MODEL_PATH = os.getenv('ONNX_MODEL_PATH')
+    SEARCH_WORKERS = int(os.getenv('SEARCH_WORKERS', "0"))
+    STAGE_STATS = os.getenv('STAGE_STATS', "0") not in ("0", "false", "False")
+    SCAN_PRECISION = os.getenv('SCAN_PRECISION', "float32")
+    LEXICAL_WEIGHT = float(os.getenv('LEXICAL_WEIGHT', "0"))
+    LEXICAL_CONFIDENT = float(os.getenv('LEXICAL_CONFIDENT', "0"))
     
     def check_required_env_vars():
         """检查必需的环境变量是否已设置"""
@@ -54,24 +84,98 @@ except ImportError:
         return True
 
 
+# 查询数 x 行数达到该值时才使用多进程打分（较小的计算量用单进程更快）
+PARALLEL_MIN_WORK = 200000
+
+# 批量查询重新打分时，每组的 查询数 x 候选行并集大小 不超过该值（限制float64临时矩阵的内存）
+RESCORE_BLOCK = 65536
+
+# 开启ANN索引和字面得分融合时，每个查询额外加入字面得分最高的这些行作为候选行
+LEXICAL_ANN_CANDIDATES = 100
+
+
+def parse_excel_paths(value: str) -> Dict[str, str]:
+    """
+    解析多个CT版本的配置
+    
+    Args:
+        value: "版本名=路径;版本名=路径"（例如 "2024-03-29=data/CT_2024Q1.xls;2023-12-15=data/CT_2023Q4.xls"）
+        
+    Returns:
+        {版本名: Excel文件路径}，按配置中的顺序排列
+    """
+    excel_paths = {}
+    for item in value.split(';'):
+        if not item.strip():
+            continue
+        version, sep, path = item.partition('=')
+        if not sep or not version.strip() or not path.strip():
+            raise ValueError(f"CT版本配置格式错误: {item}（应为 版本名=路径）")
+        if version.strip() in excel_paths:
+            raise ValueError(f"CT版本重复: {version.strip()}")
+        excel_paths[version.strip()] = path.strip()
+    return excel_paths
+
+
 class LabTestMatcher:
     """检查项目匹配器"""
     
-    def __init__(self, excel_path: str = None, mapping_file: str = None, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2", cache_dir: str = None):
+    def __init__(self, excel_path: str = None, mapping_file: str = None, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2", cache_dir: str = None,
+                 query_cache_size: int = None, persist_query_cache: bool = None, warmup_model: bool = None,
+                 use_ann_index: bool = None, ann_n_lists: int = None, ann_n_probe: int = None,
+                 encoder_backend: str = None, onnx_model_path: str = None, encoder=None,
+                 search_workers: int = None, collect_stats: bool = None, scan_precision: str = None,
+                 excel_paths: Dict[str, str] = None, lexical_weight: float = None, lexical_confident: float = None):
         """
         初始化匹配器
         
         Args:
-            excel_path: Excel文件路径（优先使用参数，否则从环境变量EXCEL_PATH读取）
+            excel_path: Excel文件路径（优先使用参数，否则从环境变量EXCEL_PATHS或EXCEL_PATH读取）
             mapping_file: 映射文件路径（优先使用参数，否则从环境变量MAPPING_FILE读取）
             model_name: embedding模型名称
             cache_dir: embedding缓存目录（优先使用参数，否则从环境变量CACHE_DIR读取）
+            query_cache_size: 查询embedding内存LRU缓存的最大条目数（默认从环境变量QUERY_CACHE_SIZE读取）
+            persist_query_cache: 是否将查询embedding持久化到cache_dir（默认从环境变量QUERY_CACHE_PERSIST读取）
+            warmup_model: 是否在初始化后于后台线程加载模型并做一次预热编码（默认从环境变量MODEL_WARMUP读取）；
+                          预热完成前到达的语义查询会等待模型加载完成
+            use_ann_index: 语义匹配是否先用近似最近邻（IVF）索引选出候选行，再按原有规则精确打分
+                           （默认从环境变量ANN_INDEX读取；关闭时暴力扫描全部行）
+            ann_n_lists: IVF索引的簇数（默认从环境变量ANN_N_LISTS读取，0表示按向量数自动选择）
+            ann_n_probe: 每次查询检查的簇数，召回率与延迟之间的调节参数（默认从环境变量ANN_N_PROBE读取；
+                         可以在运行时修改matcher.ann_n_probe）
+            encoder_backend: 编码器后端 'torch'、'torch-int8' 或 'onnx'（默认从环境变量ENCODER_BACKEND读取）
+            onnx_model_path: onnx后端的模型路径（.onnx文件或导出目录，默认从环境变量ONNX_MODEL_PATH读取）
+            encoder: 自定义编码器对象（提供 encode(texts, convert_to_numpy=True, ...) 方法），优先于encoder_backend；
+                     可通过encoder_id属性指定缓存键，否则使用 "模型名称#custom:类名"
+            search_workers: 语义打分的工作进程数（默认从环境变量SEARCH_WORKERS读取；0或1表示单进程）。
+                            计算量较大的批量查询会分片到进程池并行计算，结果与单进程一致
+            collect_stats: 是否记录初始化和查询各阶段的耗时（默认从环境变量STAGE_STATS读取），通过stats()查看
+            scan_precision: 语义匹配扫描全部行时使用的向量精度 'float32'、'float16' 或 'int8'（默认从环境变量
+                            SCAN_PRECISION读取）。低精度时缓存目录中只保存压缩索引，先用压缩向量扫描，
+                            再从按文本存储中读取候选行的float32向量精确重新打分，结果与float32相同
+            excel_paths: 同时加载多个CT版本 {版本名: Excel文件路径}（不能与excel_path同时指定；默认从环境变量
+                         EXCEL_PATHS读取）。各版本合并为一个索引，相同的行只保留一份，查询时通过ct_versions参数
+                         指定版本，语义匹配结果带有所属版本
+            lexical_weight: 字面得分（字符n-gram TF-IDF）与语义得分融合的权重，综合得分 =
+                            (1 - lexical_weight) * 语义得分 + lexical_weight * 字面得分（默认从环境变量LEXICAL_WEIGHT
+                            读取；0表示不融合）。融合时不使用多进程打分
+            lexical_confident: 字面得分的置信阈值：查询的最高字面得分不低于该值时不调用模型编码，直接按字面得分
+                               返回结果（默认从环境变量LEXICAL_CONFIDENT读取；0表示关闭）
         """
         # 如果参数未提供，从环境变量读取
-        if excel_path is None:
+        if excel_path is not None and excel_paths is not None:
+            raise ValueError("excel_path和excel_paths不能同时指定")
+        if excel_path is None and excel_paths is None and EXCEL_PATHS:
+            excel_paths = parse_excel_paths(EXCEL_PATHS)
+        if excel_path is None and excel_paths is None:
             if EXCEL_PATH is None:
                 check_required_env_vars()  # 会抛出异常
             excel_path = EXCEL_PATH
+        if excel_paths is None:
+            # 单个版本以文件名（不含扩展名）作为版本名
+            excel_paths = {os.path.splitext(os.path.basename(excel_path))[0]: excel_path}
+        if not excel_paths:
+            raise ValueError("excel_paths不能为空")
         
         if mapping_file is None:
             if MAPPING_FILE is None:
@@ -83,46 +187,113 @@ class LabTestMatcher:
                 check_required_env_vars()  # 会抛出异常
             cache_dir = CACHE_DIR
         
-        self.excel_path = excel_path
+        self.excel_paths = dict(excel_paths)  # {CT版本名: Excel文件路径}
+        self.ct_versions = list(self.excel_paths)  # CT版本名（按加载顺序）
+        self.excel_path = next(iter(self.excel_paths.values()))  # 第一个版本的Excel文件路径
         self.mapping_file = mapping_file
         self.model = None
         self.model_name = model_name
-        self.data = None
+        self.encoder_backend = encoder_backend or ENCODER_BACKEND
+        self.onnx_model_path = onnx_model_path or ONNX_MODEL_PATH
+        if encoder is not None:
+            # 自定义编码器视为已加载的模型
+            self.model = encoder
+            self.encoder_backend = 'custom'
+            self.encoder_id = getattr(encoder, 'encoder_id', None) or f"{model_name}#custom:{type(encoder).__name__}"
+        else:
+            # 缓存按编码器标识区分：不同后端的embedding不混用
+            self.encoder_id = encoder_id(model_name, self.encoder_backend, self.onnx_model_path)
+        self._model_lock = threading.Lock()  # 保证模型只加载一次（预热线程与查询线程之间）
+        self._warmup_thread = None
+        self._warmup_error = None
+        self.data = None  # Terminology的DataFrame（只在初始化期间使用，构建列式存储后释放）
+        self.row_count = 0  # 数据行数
+        self.row_labels = None  # 每行的原始行索引 (n,)
+        self.codelist_ranges = {}  # 按Codelist Name分组后的连续行范围 {Codelist Name: (起始位置, 结束位置)}
+        self.row_ranks = None  # 每行在Excel中的原始顺序 (n,)（分组改变了行顺序时用于并列排序）
+        self.row_groups = []  # 按Codelist和所属版本分组的连续行范围 [(起始位置, 结束位置, Codelist Name, 版本位掩码), ...]
+        self.version_row_labels = None  # 每行在各CT版本中的原始行索引 (版本数, n)（不属于该版本时为-1）
+        self.row_texts = {}  # E、F、H列的文本 {'e': StringColumn, 'f': ..., 'h': ...}（连续UTF-8字节 + 偏移）
+        self.first_word_index = {}  # F、H列分号前第一个词的精确匹配索引 {'f': {小写第一个词: 行位置数组}, 'h': ...}
+        self.ratio_masks = {}  # F、H列是否包含'/'（Ratio） {'f': np.array(bool), 'h': ...}
         self.cache_dir = cache_dir
-        self.embeddings_e = None  # E列的embedding
-        self.embeddings_f = None  # F列的embedding
-        self.embeddings_h = None  # H列的embedding
-        self.f_synonyms_map = {}  # F列分号分隔的同义词映射 {row_idx: {'synonyms': [...], 'embeddings': np.array}}
-        self.h_synonyms_map = {}  # H列分号分隔的同义词映射
+        self.embeddings_e = None  # E列的embedding（已归一化，fused_embeddings的视图）
+        self.embeddings_f = None  # F列的embedding（已归一化，fused_embeddings的视图）
+        self.embeddings_h = None  # H列的embedding（已归一化，fused_embeddings的视图）
+        self.fused_embeddings = None  # E、F、H列归一化embedding的连续float32矩阵 (n, 3, dim)
+        self.f_synonym_index = None  # F列分号分隔的同义词的扁平化索引（见_build_synonym_index）
+        self.h_synonym_index = None  # H列同义词的扁平化索引
+        self._index_vectors = None  # 索引文件中的全部归一化向量（E、F、H列及同义词，内存映射；低精度时为压缩向量）
+        self.ann_index = None  # 近似最近邻索引（IVFIndex；未开启时为None）
+        self.ann_n_probe = ANN_N_PROBE if ann_n_probe is None else ann_n_probe
+        self.search_workers = SEARCH_WORKERS if search_workers is None else search_workers
+        self._sharded_scorer = None  # 多进程打分的进程池（首次需要时创建）
+        self.scan_precision = scan_precision or SCAN_PRECISION
+        if self.scan_precision not in PRECISIONS:
+            raise ValueError(f"不支持的扫描精度: {self.scan_precision}（可选: {', '.join(PRECISIONS)}）")
+        self._scan_index = None  # 低精度扫描使用的压缩向量（见_attach_compressed_index；float32时为None）
+        self.lexical_weight = LEXICAL_WEIGHT if lexical_weight is None else lexical_weight
+        self.lexical_confident = LEXICAL_CONFIDENT if lexical_confident is None else lexical_confident
+        if not 0.0 <= self.lexical_weight <= 1.0:
+            raise ValueError(f"lexical_weight必须在0到1之间: {self.lexical_weight}")
+        self._lexical_index = None  # 字符n-gram倒排索引（NgramIndex；未开启字面得分时为None）
         self.mapping_data = None  # 映射文件数据
-        self._load_data()
-        self._load_mapping_file()
-        self._load_or_compute_embeddings()
+        self.mapping_index = {}  # 精确匹配索引 {归一化键: [映射文件行号, ...]}
+        self.mapping_records = []  # 映射文件每行的显示值 [{'testds_value', 'tests_cn_value', 'tests_en_value'}, ...]
+        self._prefix_index = None  # 输入联想的前缀索引（首次调用suggest时构建）
+        self._prefix_lock = threading.Lock()
+        self._stats = StageStats(enabled=STAGE_STATS if collect_stats is None else collect_stats)  # 分阶段耗时统计
+        
+        # 查询embedding缓存（内存LRU + 可选的磁盘存储）
+        if query_cache_size is None:
+            query_cache_size = QUERY_CACHE_SIZE
+        if persist_query_cache is None:
+            persist_query_cache = QUERY_CACHE_PERSIST
+        self.query_cache = QueryEmbeddingCache(
+            max_size=query_cache_size,
+            db_path=os.path.join(self.cache_dir, "query_embeddings.sqlite") if persist_query_cache else None,
+            disk_size=QUERY_CACHE_DISK_SIZE
+        )
+        
+        with self._stats.stage('init.load_data'):
+            self._load_data()
+        with self._stats.stage('init.row_metadata'):
+            self._build_row_metadata()
+        with self._stats.stage('init.load_mapping'):
+            self._load_mapping_file()
+        with self._stats.stage('init.embeddings'):
+            self._load_or_compute_embeddings()
+        
+        if use_ann_index is None:
+            use_ann_index = ANN_INDEX
+        if use_ann_index:
+            with self._stats.stage('init.ann_index'):
+                self._load_or_build_ann_index(ANN_N_LISTS if ann_n_lists is None else ann_n_lists)
+        
+        if (self.lexical_weight > 0 or self.lexical_confident > 0) and self.row_count:
+            with self._stats.stage('init.lexical_index'):
+                self._load_or_build_lexical_index()
+        
+        if warmup_model is None:
+            warmup_model = MODEL_WARMUP
+        if warmup_model:
+            self.start_model_warmup()
     
     def _load_data(self):
-        """加载Excel数据"""
-        if not os.path.exists(self.excel_path):
-            raise FileNotFoundError(f"Excel文件不存在: {self.excel_path}")
-        
-        # 读取第二个sheet（索引为1）
+        """加载Excel数据（多个CT版本时合并为一个表，见_merge_versions）"""
         try:
-            xls = pd.ExcelFile(self.excel_path)
-            sheet_names = xls.sheet_names
-            if len(sheet_names) < 2:
-                raise ValueError(f"Excel文件至少需要2个sheet，当前只有{len(sheet_names)}个")
-            
-            # 读取第二个sheet
-            self.data = pd.read_excel(self.excel_path, sheet_name=1)
-            
-            # 筛选D列值="Laboratory Test Code"的行
-            # D列是第4列（索引3），列名是 'Codelist Name'
-            if 'Codelist Name' not in self.data.columns:
-                raise ValueError("Excel文件缺少 'Codelist Name' 列")
+            frames = [self._read_terminology(path) for path in self.excel_paths.values()]
             
             #self.data = self.data[self.data['Codelist Name'] == 'Laboratory Test Code'].copy() #先暂时不筛选，可以搜索所有CT
+            # 不筛选数据，而是按Codelist Name分组为连续的行范围，查询时可通过codelists参数只计算指定范围
             
-            if len(self.data) == 0:
-                raise ValueError("未找到 'Laboratory Test Code' 的数据行")
+            if len(frames) == 1:
+                self.data = frames[0]
+                self.version_row_labels = np.asarray(self.data.index, dtype=np.int64)[None, :]
+            else:
+                self._merge_versions(frames)
+            
+            self._partition_by_codelist()
             
             # 注意：在MCP server环境中，print输出到stdout会干扰MCP协议通信
             # 如果需要调试信息，应该输出到stderr
@@ -131,6 +302,239 @@ class LabTestMatcher:
         except Exception as e:
             raise Exception(f"加载Excel文件失败: {str(e)}")
     
+    def _read_terminology(self, excel_path: str) -> pd.DataFrame:
+        """读取一个CT版本的Excel文件"""
+        if not os.path.exists(excel_path):
+            raise FileNotFoundError(f"Excel文件不存在: {excel_path}")
+        
+        # 读取第二个sheet（索引为1）
+        # 只保留匹配器使用的列，并以源文件内容哈希缓存列式快照，后续启动无需再解析Excel
+        used_columns = ['Codelist Name', 'CDISC Submission Value', 'CDISC Synonym(s)', 'NCI Preferred Term']
+        data = read_excel_with_snapshot(
+            excel_path, 1, self.cache_dir, "terminology_snapshot",
+            select_columns=lambda columns: [col for col in used_columns if col in columns]
+        )
+        
+        # 筛选D列值="Laboratory Test Code"的行
+        # D列是第4列（索引3），列名是 'Codelist Name'
+        if 'Codelist Name' not in data.columns:
+            raise ValueError(f"Excel文件缺少 'Codelist Name' 列: {excel_path}")
+        
+        if len(data) == 0:
+            raise ValueError(f"未找到 'Laboratory Test Code' 的数据行: {excel_path}")
+        return data
+    
+    def _merge_versions(self, frames: List[pd.DataFrame]):
+        """
+        合并多个CT版本：Codelist Name和E、F、H列都相同的行只保留一份（同一版本中重复的行按出现次序分别对应）
+        
+        合并后的行顺序与每个版本中的顺序一致：新增的行排在它在该版本中的前一个已有行之后，
+        因此只查询一个版本时，并列结果的顺序与单独加载该版本相同
+        
+        设置self.data（每行的行索引为它在第一个包含它的版本中的行索引）和self.version_row_labels
+        """
+        columns = list(frames[0].columns)
+        for frame, version in zip(frames[1:], self.ct_versions[1:]):
+            if list(frame.columns) != columns:
+                raise ValueError(f"CT版本 {version} 的列与 {self.ct_versions[0]} 不同")
+        
+        row_ids = {}  # (行内容, 在该版本中的出现次序) -> 合并后的行号
+        sort_keys = []  # 每个合并后的行在合并顺序中的排序键
+        inserted = {}  # 已有行 -> 插入在它之后的新行数（-1表示插入在开头）
+        sources = [[] for _ in frames]  # 每个版本中被保留的行位置
+        labels = [[] for _ in frames]  # 每个版本中的行：(合并后的行号, 原始行索引)
+        for v, frame in enumerate(frames):
+            occurrences = {}
+            anchor = -1  # 该版本中前一个已有行
+            values = zip(*[[str(x) if pd.notna(x) else "" for x in frame[col].tolist()] for col in columns])
+            for pos, (key, label) in enumerate(zip(values, frame.index.tolist())):
+                occurrence = occurrences.get(key, 0)
+                occurrences[key] = occurrence + 1
+                row_id = row_ids.get((key, occurrence))
+                if row_id is None:
+                    row_id = row_ids[(key, occurrence)] = len(sort_keys)
+                    sources[v].append(pos)
+                    if v == 0:
+                        sort_keys.append((pos,))
+                    else:
+                        count = inserted.get(anchor, 0)
+                        inserted[anchor] = count + 1
+                        sort_keys.append((sort_keys[anchor] if anchor >= 0 else (-1,)) + (count,))
+                else:
+                    anchor = row_id
+                labels[v].append((row_id, label))
+        
+        order = np.asarray(sorted(range(len(sort_keys)), key=sort_keys.__getitem__), dtype=np.int64)
+        data = pd.concat([frame.iloc[positions] for frame, positions in zip(frames, sources)])
+        self.data = data.iloc[order]
+        
+        # 合并后的行号 -> 合并顺序中的位置
+        positions_of = np.empty(len(order), dtype=np.int64)
+        positions_of[order] = np.arange(len(order))
+        self.version_row_labels = np.full((len(frames), len(order)), -1, dtype=np.int64)
+        for v, version_labels in enumerate(labels):
+            ids, values = zip(*version_labels)
+            self.version_row_labels[v, positions_of[np.asarray(ids)]] = values
+        
+        shared = int(np.sum((self.version_row_labels >= 0).sum(axis=0) == len(frames)))
+        print(f"已合并 {len(frames)} 个CT版本: 共 {len(order)} 个不同的行，其中 {shared} 行在所有版本中都相同",
+              file=sys.stderr, flush=True)
+    
+    def _partition_by_codelist(self):
+        """
+        按Codelist Name将数据行分组为连续的行范围（组的顺序为首次出现的顺序，组内保持原有顺序）
+        
+        SDTM Terminology中同一Codelist的行通常本来就是连续的，此时行顺序不变。
+        多个CT版本时，Codelist内再按所属版本分组，任意Codelist和版本的组合都是若干连续的行范围
+        """
+        names = [str(v) if pd.notna(v) else "" for v in self.data['Codelist Name'].tolist()]
+        group_ids = {}
+        row_groups = np.array([group_ids.setdefault(name, len(group_ids)) for name in names], dtype=np.int64)
+        # 每行所属版本的位掩码（第v位表示属于第v个版本）
+        version_bits = ((self.version_row_labels >= 0).astype(np.int64) << np.arange(len(self.ct_versions))[:, None]).sum(axis=0)
+        bits_ids = {}
+        row_bits = np.array([bits_ids.setdefault(bits, len(bits_ids)) for bits in version_bits.tolist()], dtype=np.int64)
+        order = np.lexsort((row_bits, row_groups))
+        
+        if np.any(order != np.arange(len(order))):
+            self.data = self.data.iloc[order]
+            self.version_row_labels = self.version_row_labels[:, order]
+            version_bits = version_bits[order]
+        self.row_ranks = order
+        
+        counts = np.bincount(row_groups, minlength=len(group_ids))
+        ends = np.cumsum(counts)
+        self.codelist_ranges = {name: (int(ends[gid] - counts[gid]), int(ends[gid])) for name, gid in group_ids.items()}
+        
+        # 相邻的行Codelist和所属版本都相同时属于同一组
+        sorted_groups = row_groups[order]
+        boundaries = np.flatnonzero((np.diff(sorted_groups) != 0) | (np.diff(version_bits) != 0)) + 1
+        starts = np.concatenate([[0], boundaries]).astype(np.int64)
+        stops = np.concatenate([boundaries, [len(order)]]).astype(np.int64)
+        codelist_names = list(group_ids)
+        self.row_groups = [(int(start), int(stop), codelist_names[sorted_groups[start]], int(version_bits[start]))
+                           for start, stop in zip(starts, stops)]
+    
+    def list_codelists(self) -> Dict[str, int]:
+        """
+        返回所有Codelist Name及其行数
+        
+        Returns:
+            {Codelist Name: 行数}，按数据中的顺序排列（多个CT版本时相同的行只计一次）
+        """
+        return {name: end - start for name, (start, end) in self.codelist_ranges.items()}
+    
+    def list_ct_versions(self) -> Dict[str, int]:
+        """
+        返回已加载的CT版本及其行数
+        
+        Returns:
+            {版本名: 该版本的行数}，按加载顺序排列
+        """
+        return {version: int(np.count_nonzero(labels >= 0))
+                for version, labels in zip(self.ct_versions, self.version_row_labels)}
+    
+    def _resolve_ct_versions(self, ct_versions) -> Optional[int]:
+        """
+        将ct_versions参数解析为版本位掩码
+        
+        Args:
+            ct_versions: None（全部版本）、单个版本名或版本名列表（忽略大小写）
+            
+        Returns:
+            版本位掩码（第v位表示第v个版本）；不限制时返回None
+        """
+        if ct_versions is None:
+            return None
+        if isinstance(ct_versions, str):
+            ct_versions = [ct_versions]
+        
+        versions_lower = {version.lower(): v for v, version in enumerate(self.ct_versions)}
+        bits = 0
+        for version in ct_versions:
+            v = versions_lower.get(str(version).strip().lower())
+            if v is None:
+                raise ValueError(f"未知的CT版本: {version}（可选: {', '.join(self.ct_versions)}）")
+            bits |= 1 << v
+        return bits
+    
+    def _resolve_codelists(self, codelists, ct_versions=None) -> Optional[List[Tuple[int, int]]]:
+        """
+        将codelists和ct_versions参数解析为要计算的行范围
+        
+        Args:
+            codelists: None（不限制）、单个Codelist Name或Codelist Name列表（忽略大小写）
+            ct_versions: None（全部版本）、单个CT版本名或版本名列表（忽略大小写）
+            
+        Returns:
+            行范围列表 [(起始位置, 结束位置), ...]（按位置升序，可能为空）；不限制时返回None
+        """
+        version_bits = self._resolve_ct_versions(ct_versions)
+        if codelists is None and version_bits is None:
+            return None
+        
+        names = None
+        if codelists is not None:
+            if isinstance(codelists, str):
+                codelists = [codelists]
+            names_lower = {name.lower(): name for name in self.codelist_ranges}
+            names = set()
+            for codelist in codelists:
+                name = names_lower.get(str(codelist).strip().lower())
+                if name is None:
+                    raise ValueError(f"未知的Codelist: {codelist}")
+                names.add(name)
+        
+        ranges = []
+        previous_name = None
+        for start, end, name, bits in self.row_groups:
+            if (names is not None and name not in names) or (version_bits is not None and not bits & version_bits):
+                continue
+            if ranges and ranges[-1][1] == start and name == previous_name:
+                ranges[-1] = (ranges[-1][0], end)  # 合并同一Codelist中相邻的行范围
+            else:
+                ranges.append((start, end))
+            previous_name = name
+        return ranges
+    
+    def _build_row_metadata(self):
+        """
+        预先计算每行的文本信息，避免每次查询都逐行遍历DataFrame
+        
+        - row_texts: E、F、H列的文本（空值为""），以列式存储保存
+        - first_word_index: F、H列中包含分号的文本，分号前第一个词（小写）到行位置的索引
+        - ratio_masks: F、H列文本是否包含'/'（用于Ratio降权）
+        
+        之后不再需要DataFrame，构建完成后释放self.data
+        """
+        e_col = 'CDISC Submission Value'  # E列
+        f_col = 'CDISC Synonym(s)'  # F列
+        h_col = 'NCI Preferred Term'  # H列
+        
+        # 确保列存在
+        if e_col not in self.data.columns or f_col not in self.data.columns or h_col not in self.data.columns:
+            raise ValueError("Excel文件缺少必要的列：CDISC Submission Value, CDISC Synonym(s), 或 NCI Preferred Term")
+        
+        self.row_count = len(self.data)
+        self.row_labels = np.asarray(self.data.index, dtype=np.int64)
+        for key, col in (('e', e_col), ('f', f_col), ('h', h_col)):
+            texts = [str(v) if pd.notna(v) else "" for v in self.data[col].tolist()]
+            self.row_texts[key] = StringColumn.from_values(texts)
+            if key == 'e':
+                continue
+            
+            first_words = {}
+            for i, text in enumerate(texts):
+                if ';' in text and text.strip():
+                    # 获取分号前的第一个词（去除前后空白）
+                    # 注意：只按分号";"分割，"/"表示Ratio，不作为分隔符
+                    first_words.setdefault(text.split(';')[0].strip().lower(), []).append(i)
+            self.first_word_index[key] = {word: np.asarray(rows, dtype=np.int64) for word, rows in first_words.items()}
+            self.ratio_masks[key] = np.array(['/' in text for text in texts], dtype=bool)
+        
+        # 释放DataFrame：之后只使用列式存储和Codelist行范围
+        self.data = None
+    
     def _load_mapping_file(self):
         """加载映射文件TEST_TESTCD_mapping.xlsx"""
         if not os.path.exists(self.mapping_file):
@@ -139,8 +543,8 @@ class LabTestMatcher:
             return
         
         try:
-            # 读取映射文件（读取Sheet1，索引为0）
-            self.mapping_data = pd.read_excel(self.mapping_file, sheet_name=0)
+            # 读取映射文件（读取Sheet1，索引为0；优先使用列式快照）
+            self.mapping_data = read_excel_with_snapshot(self.mapping_file, 0, self.cache_dir, "mapping_snapshot")
             
             # 自动识别列名
             # 用于匹配的列：TEST列、TESTS_CN列、TESTS_EN列
@@ -200,10 +604,86 @@ class LabTestMatcher:
             print(f"映射文件列识别: TESTDS（显示）={testds_col}", file=sys.stderr, flush=True)
             print(f"映射文件所有列名: {list(self.mapping_data.columns)}", file=sys.stderr, flush=True)
             
+            # 预先构建精确匹配索引，查询时无需再逐行扫描
+            self._build_mapping_index()
+            
         except Exception as e:
             print(f"警告: 加载映射文件失败: {e}，将跳过精确匹配", file=sys.stderr, flush=True)
             self.mapping_data = None
     
+    @staticmethod
+    def _remove_ignored_words(text: str) -> str:
+        """移除文本中的'计数'和'绝对值'等需要忽略的词"""
+        if not text:
+            return text
+        result = text
+        # 移除中文的"计数"和"绝对值"
+        result = result.replace('计数', '').replace('绝对值', '')
+        # 移除英文的"Absolute Value"等变体
+        result = result.replace('absolute value', '').replace('absolutevalue', '')
+        return result.strip()
+    
+    @classmethod
+    def _mapping_keys(cls, text: str) -> List[str]:
+        """
+        生成映射文件单元格的所有归一化匹配键（忽略大小写，忽略'计数'和'绝对值'）
+        
+        完整文本本身是一个键；如果包含分号，每个分号分隔的部分也各是一个键
+        
+        Args:
+            text: 单元格文本
+            
+        Returns:
+            归一化键列表（空单元格返回空列表）
+        """
+        if not text:
+            return []
+        text_str = str(text).strip()
+        if not text_str or text_str.lower() == 'nan':
+            return []
+        
+        keys = [cls._remove_ignored_words(text_str.lower())]
+        if ';' in text_str:
+            parts = [s.strip() for s in text_str.split(';') if s.strip()]
+            for part in parts:
+                keys.append(cls._remove_ignored_words(part.lower()))
+        return keys
+    
+    def _build_mapping_index(self):
+        """
+        构建映射文件的精确匹配索引
+        
+        对TEST、TESTS_CN、TESTS_EN列的每个单元格生成归一化键（包括分号分隔的同义词），
+        建立 {归一化键: [行号, ...]} 的字典，行号按映射文件中的原始顺序排列且不重复
+        """
+        def column_values(col) -> List[str]:
+            if not col:
+                return [""] * len(self.mapping_data)
+            return [str(v) if pd.notna(v) else "" for v in self.mapping_data[col].tolist()]
+        
+        test_values = column_values(self.mapping_test_col)
+        tests_cn_values = column_values(self.mapping_tests_cn_col)
+        tests_en_values = column_values(self.mapping_tests_en_col)
+        testds_values = column_values(self.mapping_testds_col)
+        
+        mapping_index = {}
+        mapping_records = []
+        for pos in range(len(self.mapping_data)):
+            mapping_records.append({
+                'testds_value': testds_values[pos],
+                'tests_cn_value': tests_cn_values[pos],
+                'tests_en_value': tests_en_values[pos]
+            })
+            # 匹配顺序：TEST列 -> TESTS_CN列 -> TESTS_EN列（同一行只记录一次）
+            for value in (test_values[pos], tests_cn_values[pos], tests_en_values[pos]):
+                for key in self._mapping_keys(value):
+                    row_ids = mapping_index.setdefault(key, [])
+                    if not row_ids or row_ids[-1] != pos:
+                        row_ids.append(pos)
+        
+        self.mapping_index = mapping_index
+        self.mapping_records = mapping_records
+    
     def _exact_match_in_mapping(self, query: str) -> Optional[List[Dict]]:
         """
         在映射文件中进行精确匹配（忽略大小写）
@@ -232,72 +712,9 @@ class LabTestMatcher:
         if not query_clean:
             return None
         
-        matched_rows = []
-        
-        def remove_ignored_words(text: str) -> str:
-            """移除文本中的'计数'和'绝对值'等需要忽略的词"""
-            if not text:
-                return text
-            result = text
-            # 移除中文的"计数"和"绝对值"
-            result = result.replace('计数', '').replace('绝对值', '')
-            # 移除英文的"Absolute Value"等变体
-            result = result.replace('absolute value', '').replace('absolutevalue', '')
-            return result.strip()
-        
-        def check_match(text: str, query: str) -> bool:
-            """检查文本是否与查询匹配（支持分号分隔的同义词，忽略'计数'和'绝对值'）"""
-            if not text:
-                return False
-            # 转换为字符串并清理
-            text_str = str(text).strip()
-            if not text_str or text_str.lower() == 'nan':
-                return False
-            
-            text_lower = text_str.lower()
-            # 移除"计数"和"绝对值"后进行比较
-            text_cleaned = remove_ignored_words(text_lower)
-            query_cleaned = remove_ignored_words(query)
-            
-            # 完全匹配（移除忽略词后）
-            if text_cleaned == query_cleaned:
-                return True
-            
-            # 如果包含分号，检查每个分号分隔的部分
-            if ';' in text_str:
-                parts = [s.strip() for s in text_str.split(';') if s.strip()]
-                for part in parts:
-                    part_cleaned = remove_ignored_words(part.lower())
-                    if part_cleaned == query_cleaned:
-                        return True
-            return False
-        
-        # 匹配顺序：TEST列、TESTS_CN列、TESTS_EN列
-        for idx, row in self.mapping_data.iterrows():
-            # 获取各列的值
-            test_value = str(row[self.mapping_test_col]) if self.mapping_test_col and pd.notna(row[self.mapping_test_col]) else ""
-            tests_cn_value = str(row[self.mapping_tests_cn_col]) if self.mapping_tests_cn_col and pd.notna(row[self.mapping_tests_cn_col]) else ""
-            tests_en_value = str(row[self.mapping_tests_en_col]) if self.mapping_tests_en_col and pd.notna(row[self.mapping_tests_en_col]) else ""
-            
-            # 按顺序检查：TEST列 -> TESTS_CN列 -> TESTS_EN列
-            if test_value and check_match(test_value, query_clean):
-                matched_rows.append({
-                    'testds_value': str(row[self.mapping_testds_col]) if self.mapping_testds_col and pd.notna(row[self.mapping_testds_col]) else "",
-                    'tests_cn_value': tests_cn_value,
-                    'tests_en_value': tests_en_value
-                })
-            elif tests_cn_value and check_match(tests_cn_value, query_clean):
-                matched_rows.append({
-                    'testds_value': str(row[self.mapping_testds_col]) if self.mapping_testds_col and pd.notna(row[self.mapping_testds_col]) else "",
-                    'tests_cn_value': tests_cn_value,
-                    'tests_en_value': tests_en_value
-                })
-            elif tests_en_value and check_match(tests_en_value, query_clean):
-                matched_rows.append({
-                    'testds_value': str(row[self.mapping_testds_col]) if self.mapping_testds_col and pd.notna(row[self.mapping_testds_col]) else "",
-                    'tests_cn_value': tests_cn_value,
-                    'tests_en_value': tests_en_value
-                })
+        # 与索引键使用相同的归一化规则，直接查字典（O(1)）
+        row_ids = self.mapping_index.get(self._remove_ignored_words(query_clean), [])
+        matched_rows = [self.mapping_records[pos] for pos in row_ids]
         
         if matched_rows:
             # 返回匹配结果，格式化为与语义匹配相同的结果格式
@@ -315,157 +732,375 @@ class LabTestMatcher:
         
         return None
     
+    def _build_prefix_index(self) -> PrefixIndex:
+        """
+        构建输入联想的前缀索引：映射文件的TEST、TESTS_CN、TESTS_EN列，以及CT的E列和F、H列的同义词
+        （单元格中分号分隔的每个部分各是一个候选；相同的词只保留一个，映射文件优先）
+        """
+        def parts(text: str) -> List[str]:
+            return [part.strip() for part in text.split(';') if part.strip()] if text else []
+        
+        entries = []
+        if self.mapping_data is not None:
+            for col in (self.mapping_test_col, self.mapping_tests_cn_col, self.mapping_tests_en_col):
+                if col:
+                    for value in self.mapping_data[col].tolist():
+                        if pd.notna(value):
+                            entries.extend((part, 'mapping') for part in parts(str(value)))
+        if self.row_count:
+            entries.extend((text, 'terminology') for text in self.row_texts['e'].tolist() if text.strip())
+            for key in ('f', 'h'):
+                for text in self.row_texts[key].tolist():
+                    entries.extend((part, 'terminology') for part in parts(text))
+        return PrefixIndex(entries)
+    
+    def suggest(self, prefix: str, k: int = 10) -> List[Dict]:
+        """
+        输入联想：返回以prefix开头的前k个候选词（忽略大小写），不调用embedding模型
+        
+        前缀索引在首次调用时构建，之后每次查询只做一次二分查找
+        
+        Args:
+            prefix: 已输入的文本
+            k: 最多返回的候选数
+            
+        Returns:
+            [{'text': 候选词, 'source': 'mapping'（映射文件，选择后走精确匹配）或 'terminology'（CT）}, ...]，
+            按字典序排列，与前缀完全相同的词排在最前
+        """
+        if self._prefix_index is None:
+            with self._prefix_lock:
+                if self._prefix_index is None:
+                    with self._stats.stage('init.prefix_index'):
+                        self._prefix_index = self._build_prefix_index()
+                    print(f"输入联想索引已构建: {len(self._prefix_index)} 个候选词", file=sys.stderr, flush=True)
+        self._stats.increment('suggest_calls')
+        with self._stats.stage('suggest.lookup'):
+            return self._prefix_index.suggest(prefix, k)
+    
     def _get_model(self):
-        """懒加载embedding模型"""
+        """懒加载embedding模型（线程安全；预热进行中时等待其完成）"""
         if self.model is None:
-            # 注意：在MCP server环境中，print输出到stdout会干扰MCP协议通信
-            # 如果需要调试信息，应该输出到stderr
-            print(f"正在加载embedding模型: {self.model_name}...", file=sys.stderr, flush=True)
-            self.model = SentenceTransformer(self.model_name)
-            print("模型加载完成", file=sys.stderr, flush=True)
+            with self._model_lock:
+                if self.model is None:
+                    # 注意：在MCP server环境中，print输出到stdout会干扰MCP协议通信
+                    # 如果需要调试信息，应该输出到stderr
+                    print(f"正在加载embedding模型: {self.model_name}（{self.encoder_backend}）...", file=sys.stderr, flush=True)
+                    with self._stats.stage('init.model_load'):
+                        self.model = load_encoder(self.model_name, self.encoder_backend, self.onnx_model_path)
+                    print("模型加载完成", file=sys.stderr, flush=True)
         return self.model
     
+    def start_model_warmup(self):
+        """在后台线程中加载模型并做一次预热编码（已加载或正在预热时不重复启动）"""
+        if self.model is not None or (self._warmup_thread is not None and self._warmup_thread.is_alive()):
+            return
+        self._warmup_error = None
+        self._warmup_thread = threading.Thread(target=self._warmup_model, name="model-warmup", daemon=True)
+        self._warmup_thread.start()
+    
+    def _warmup_model(self):
+        """加载模型并编码一个示例查询，使首次语义查询不再承担冷启动开销"""
+        try:
+            model = self._get_model()
+            model.encode(["warmup"], convert_to_numpy=True)
+            print("模型预热完成", file=sys.stderr, flush=True)
+        except Exception as e:
+            self._warmup_error = e
+            print(f"警告: 模型预热失败: {e}，将在首次查询时重新加载", file=sys.stderr, flush=True)
+    
+    def wait_for_model(self, timeout: float = None) -> bool:
+        """
+        等待后台预热完成
+        
+        Args:
+            timeout: 最长等待秒数（None表示一直等待）
+            
+        Returns:
+            模型是否已就绪
+        """
+        if self._warmup_thread is not None:
+            self._warmup_thread.join(timeout)
+        return self.model_ready
+    
+    @property
+    def model_ready(self) -> bool:
+        """模型是否已加载且预热已结束"""
+        return self.model is not None and (self._warmup_thread is None or not self._warmup_thread.is_alive())
+    
+    def model_status(self) -> str:
+        """
+        返回模型状态
+        
+        Returns:
+            'ready'（已就绪）、'warming_up'（后台预热中）、'failed'（预热失败）或 'not_loaded'（尚未加载，首次语义查询时加载）
+        """
+        if self.model_ready:
+            return 'ready'
+        if self._warmup_thread is not None and self._warmup_thread.is_alive():
+            return 'warming_up'
+        if self._warmup_error is not None:
+            return 'failed'
+        return 'not_loaded'
+    
+    def _content_hash(self) -> str:
+        """
+        计算E、F、H列文本内容的哈希（与文件路径无关）
+        
+        文件移动不会使缓存失效；内容变化（即使行数不变）都会得到新的哈希
+        """
+        if getattr(self, '_content_hash_value', None) is None:
+            hasher = hashlib.sha256()
+            hasher.update(self.encoder_id.encode('utf-8'))
+            for key in ('e', 'f', 'h'):
+                hasher.update(b'\x1e' + key.encode('utf-8'))
+                for text in self.row_texts[key]:
+                    hasher.update(text.encode('utf-8') + b'\x1f')
+            self._content_hash_value = hasher.hexdigest()
+        return self._content_hash_value
+    
     def _get_cache_path(self):
         """获取缓存文件路径"""
-        # 基于Excel文件路径和模型名称生成唯一的缓存文件名
-        cache_key = f"{os.path.abspath(self.excel_path)}_{self.model_name}"
-        cache_hash = hashlib.md5(cache_key.encode()).hexdigest()
+        # 基于E、F、H列的文本内容和编码器标识生成唯一的缓存文件名
+        cache_hash = self._content_hash()[:32]
+        model_hash = hashlib.md5(self.encoder_id.encode()).hexdigest()
         
         if not os.path.exists(self.cache_dir):
             os.makedirs(self.cache_dir)
         
         return {
-            'e': os.path.join(self.cache_dir, f"embeddings_e_{cache_hash}.npy"),
-            'f': os.path.join(self.cache_dir, f"embeddings_f_{cache_hash}.npy"),
-            'h': os.path.join(self.cache_dir, f"embeddings_h_{cache_hash}.npy"),
-            'meta': os.path.join(self.cache_dir, f"meta_{cache_hash}.npz")
+            # 单个索引文件：归一化的E、F、H列及同义词向量、同义词偏移和元数据
+            'index': os.path.join(self.cache_dir, f"embedding_index_{cache_hash}.tcdidx"),
+            # 低精度扫描时代替index的压缩索引文件：压缩向量、同义词偏移和每个向量在按文本存储中的行位置
+            'compressed': os.path.join(self.cache_dir, f"embedding_index_{cache_hash}_{self.scan_precision}.tcdidx"),
+            # 按文本存储的embedding（与CT版本无关，用于增量重建）
+            'text_vectors': os.path.join(self.cache_dir, f"text_embeddings_{model_hash}.npy"),
+            'text_keys': os.path.join(self.cache_dir, f"text_embeddings_{model_hash}_keys.npy")
         }
     
-    def _compute_and_save_embeddings(self):
-        """计算并保存所有数据的embedding"""
-        model = self._get_model()
-        
-        # 获取列名
-        e_col = 'CDISC Submission Value'
-        f_col = 'CDISC Synonym(s)'
-        h_col = 'NCI Preferred Term'
-        
-        # 准备文本数据
-        e_texts = [str(row[e_col]) if pd.notna(row[e_col]) else "" for _, row in self.data.iterrows()]
-        f_texts = [str(row[f_col]) if pd.notna(row[f_col]) else "" for _, row in self.data.iterrows()]
-        h_texts = [str(row[h_col]) if pd.notna(row[h_col]) else "" for _, row in self.data.iterrows()]
-        
-        print(f"正在计算 {len(e_texts)} 条数据的embedding...", file=sys.stderr, flush=True)
-        
-        # 批量计算embedding（更高效）
-        print("计算E列embedding...", file=sys.stderr, flush=True)
-        self.embeddings_e = model.encode(e_texts, convert_to_numpy=True, show_progress_bar=True, batch_size=32)
+    @staticmethod
+    def _text_key(text: str) -> bytes:
+        """文本在按文本存储中的键（SHA-1）"""
+        return hashlib.sha1(text.encode('utf-8')).hexdigest().encode('ascii')
+    
+    def _embed_texts_incremental(self, texts: List[str]) -> np.ndarray:
+        """
+        计算文本的embedding，优先复用按文本存储的embedding
         
-        print("计算F列embedding...", file=sys.stderr, flush=True)
-        # 处理F列：如果包含分号，分别计算每个同义词的embedding
-        self.embeddings_f, self.f_synonyms_map = self._compute_embeddings_with_synonyms(
-            model, f_texts, self.data.index.tolist()
-        )
+        新的CT版本只需要为新增或变化的文本调用模型编码，编码结果追加到按文本存储中
         
-        print("计算H列embedding...", file=sys.stderr, flush=True)
-        # 处理H列：如果包含分号，分别计算每个同义词的embedding
-        self.embeddings_h, self.h_synonyms_map = self._compute_embeddings_with_synonyms(
-            model, h_texts, self.data.index.tolist()
-        )
+        Args:
+            texts: 文本列表（可包含重复文本）
+            
+        Returns:
+            与texts一一对应的embedding矩阵 (len(texts), dim)
+        """
+        _, store_vectors, rows = self._update_text_store(texts)
+        return store_vectors[rows]
+    
+    def _update_text_store(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        为按文本存储中没有的文本调用模型编码并追加保存（已有的行位置不变）
         
-        # 保存embedding
+        Args:
+            texts: 文本列表（可包含重复文本）
+            
+        Returns:
+            (按文本存储的全部键 (m,), 全部embedding (m, dim), texts在其中的行位置 (len(texts),))
+        """
         cache_paths = self._get_cache_path()
-        np.save(cache_paths['e'], self.embeddings_e)
-        np.save(cache_paths['f'], self.embeddings_f)
-        np.save(cache_paths['h'], self.embeddings_h)
-        
-        # 保存同义词映射（如果有）
-        import pickle
-        if self.f_synonyms_map:
-            with open(cache_paths['f'].replace('.npy', '_synonyms.pkl'), 'wb') as f:
-                pickle.dump(self.f_synonyms_map, f)
-        if self.h_synonyms_map:
-            with open(cache_paths['h'].replace('.npy', '_synonyms.pkl'), 'wb') as f:
-                pickle.dump(self.h_synonyms_map, f)
-        
-        # 保存元数据（数据行数，用于验证）
-        np.savez(cache_paths['meta'], 
-                data_count=len(self.data),
-                model_name=self.model_name)
         
-        print(f"Embedding已保存到缓存目录: {self.cache_dir}", file=sys.stderr, flush=True)
+        store_keys = np.empty(0, dtype='S40')
+        store_vectors = None
+        if os.path.exists(cache_paths['text_vectors']) and os.path.exists(cache_paths['text_keys']):
+            try:
+                store_keys = np.load(cache_paths['text_keys'])
+                store_vectors = np.load(cache_paths['text_vectors'])
+                if len(store_keys) != len(store_vectors):
+                    raise ValueError("键与向量数量不一致")
+            except Exception as e:
+                print(f"按文本存储的embedding无法读取: {e}，将全部重新计算", file=sys.stderr, flush=True)
+                store_keys = np.empty(0, dtype='S40')
+                store_vectors = None
+        
+        key_to_row = {key: row for row, key in enumerate(store_keys.tolist())}
+        text_keys = [self._text_key(text) for text in texts]
+        
+        missing_texts = {}
+        for text, key in zip(texts, text_keys):
+            if key not in key_to_row and key not in missing_texts:
+                missing_texts[key] = text
+        
+        print(f"共 {len(key_to_row)} 条已缓存的文本embedding，需要新计算 {len(missing_texts)} 条", file=sys.stderr, flush=True)
+        
+        if missing_texts:
+            model = self._get_model()
+            with self._stats.stage('init.encode_texts'):
+                new_vectors = np.asarray(model.encode(list(missing_texts.values()), convert_to_numpy=True,
+                                                      show_progress_bar=True, batch_size=32), dtype=np.float32)
+            new_keys = np.array(list(missing_texts.keys()), dtype='S40')
+            for key in new_keys.tolist():
+                key_to_row[key] = len(key_to_row)
+            
+            store_keys = np.concatenate([store_keys, new_keys])
+            store_vectors = new_vectors if store_vectors is None else np.vstack([store_vectors, new_vectors])
+            self._save_npy(cache_paths['text_vectors'], store_vectors)
+            self._save_npy(cache_paths['text_keys'], store_keys)
+        
+        rows = np.fromiter((key_to_row[key] for key in text_keys), dtype=np.int64, count=len(text_keys))
+        return store_keys, store_vectors, rows
+    
+    @staticmethod
+    def _save_npy(path: str, array: np.ndarray):
+        """
+        写入临时文件后替换原文件：已打开原文件的读取方（压缩索引重新打分时读取按文本存储）仍读取完整的旧版本
+        """
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Windows上原文件被打开时不能替换，直接覆盖写入
+            os.remove(tmp_path)
+            np.save(path, array)
     
-    def _compute_embeddings_with_synonyms(self, model, texts: List[str], row_indices: List) -> Tuple[np.ndarray, Dict]:
+    @staticmethod
+    def _split_synonyms(texts: List[str]) -> Dict[int, List[str]]:
         """
-        计算embedding，处理包含分号的同义词
+        拆分包含分号的文本为同义词列表
         
         注意：只使用分号";"作为分隔符，"/"表示Ratio（比值），不作为分隔符
         
         Args:
-            model: embedding模型
             texts: 文本列表
-            row_indices: 行索引列表
             
         Returns:
-            (基础embedding数组, 同义词映射字典)
+            {行位置: [同义词, ...]}，只包含拆分后多于一个同义词的行，按行位置升序
         """
-        synonyms_map = {}
-        
-        # 首先计算所有文本的基础embedding（完整文本）
-        base_embeddings = model.encode(texts, convert_to_numpy=True, show_progress_bar=False, batch_size=32)
-        
-        # 处理包含分号的文本（只使用分号";"作为分隔符，"/"表示Ratio，不作为分隔符）
+        synonyms_by_row = {}
         for idx, text in enumerate(texts):
             if ';' in text and text.strip():
                 # 按分号分割，去除空白（注意："/"不是分隔符，表示Ratio比值）
                 synonyms = [s.strip() for s in text.split(';') if s.strip()]
                 if len(synonyms) > 1:
-                    # 为每个同义词计算embedding
-                    synonym_embeddings = model.encode(synonyms, convert_to_numpy=True, show_progress_bar=False, batch_size=32)
-                    synonyms_map[row_indices[idx]] = {
-                        'synonyms': synonyms,
-                        'embeddings': synonym_embeddings
-                    }
+                    synonyms_by_row[idx] = synonyms
+        return synonyms_by_row
+    
+    @staticmethod
+    def _normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+        """按行L2归一化embedding（与余弦相似度计算使用相同的公式）"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        return embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)
+    
+    def _index_texts(self) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """
+        索引文件中向量对应的文本（按索引中的排列顺序）和同义词数组
         
-        return base_embeddings, synonyms_map
+        Returns:
+            (每行依次为E、F、H列的文本，之后是F列、H列的全部同义词,
+             {'f_synonym_offsets', 'f_synonym_rows', 'h_synonym_offsets', 'h_synonym_rows'})
+        """
+        e_texts = self.row_texts['e'].tolist()
+        f_texts = self.row_texts['f'].tolist()
+        h_texts = self.row_texts['h'].tolist()
+        
+        # 处理F列和H列：如果包含分号，分别计算每个同义词的embedding
+        f_synonyms = self._split_synonyms(f_texts)
+        h_synonyms = self._split_synonyms(h_texts)
+        f_synonym_texts = [s for synonyms in f_synonyms.values() for s in synonyms]
+        h_synonym_texts = [s for synonyms in h_synonyms.values() for s in synonyms]
+        
+        def synonym_sections(synonyms_by_row: Dict[int, List[str]]) -> Tuple[np.ndarray, np.ndarray]:
+            offsets = np.zeros(len(synonyms_by_row) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(synonyms) for synonyms in synonyms_by_row.values()])
+            return offsets, np.fromiter(synonyms_by_row.keys(), dtype=np.int64, count=len(synonyms_by_row))
+        
+        f_offsets, f_rows = synonym_sections(f_synonyms)
+        h_offsets, h_rows = synonym_sections(h_synonyms)
+        row_texts = [text for texts in zip(e_texts, f_texts, h_texts) for text in texts]
+        return row_texts + f_synonym_texts + h_synonym_texts, {
+            'f_synonym_offsets': f_offsets,
+            'f_synonym_rows': f_rows,
+            'h_synonym_offsets': h_offsets,
+            'h_synonym_rows': h_rows
+        }
+    
+    def _index_meta(self, dim: int, synonym_sections: Dict[str, np.ndarray]) -> Dict:
+        """索引文件的元数据（float32索引和压缩索引相同的部分）"""
+        return {
+            'model_name': self.encoder_id,
+            'content_hash': self._content_hash(),
+            'data_count': self.row_count,
+            'dim': int(dim),
+            'f_synonym_count': int(synonym_sections['f_synonym_offsets'][-1]),
+            'h_synonym_count': int(synonym_sections['h_synonym_offsets'][-1])
+        }
+    
+    def _compute_and_save_embeddings(self):
+        """
+        计算所有数据的embedding并写入索引文件（只为按文本存储中没有的文本调用模型）
+        
+        索引文件中的向量均已归一化：
+        - vectors: 前3n行按行并排存放E、F、H列的向量（即 (n, 3, dim) 矩阵），
+          之后依次是F列、H列所有同义词的向量
+        - f_synonym_offsets / h_synonym_offsets: 每行同义词在各自同义词块中的起止位置 (r + 1,)
+        - f_synonym_rows / h_synonym_rows: 有同义词的行位置 (r,)
+        """
+        print(f"正在计算 {self.row_count} 条数据的embedding...", file=sys.stderr, flush=True)
+        
+        # 所有文本（E、F、H列及同义词）一起增量计算，逐个向量归一化
+        texts, synonym_sections = self._index_texts()
+        vectors = self._normalize_rows(self._embed_texts_incremental(texts))
+        
+        cache_paths = self._get_cache_path()
+        write_bundle(cache_paths['index'], meta=self._index_meta(vectors.shape[1], synonym_sections),
+                     sections=dict(synonym_sections, vectors=vectors))
+        
+        print(f"Embedding已保存到缓存目录: {self.cache_dir}", file=sys.stderr, flush=True)
+    
+    def _compute_and_save_compressed(self):
+        """
+        计算所有数据的embedding并写入压缩索引文件（scan_precision为float16或int8时代替float32索引文件）
+        
+        压缩索引文件只保存压缩向量，向量排列与float32索引文件相同，另外保存：
+        - store_rows: 每个向量在按文本存储（text_embeddings_*.npy）中的行位置，重新打分时按需读取float32向量
+        - 元数据store_key_count / store_keys_sha1: 生成时按文本存储中键的数量和哈希，
+          加载时检查按文本存储的前store_key_count个键不变（之后追加的键不影响已有的行位置）
+        """
+        print(f"正在计算 {self.row_count} 条数据的embedding（{self.scan_precision} 压缩索引）...",
+              file=sys.stderr, flush=True)
+        
+        texts, synonym_sections = self._index_texts()
+        store_keys, store_vectors, store_rows = self._update_text_store(texts)
+        vectors = self._normalize_rows(store_vectors[store_rows])
+        meta = dict(self._index_meta(vectors.shape[1], synonym_sections), store_key_count=len(store_keys),
+                    store_keys_sha1=hashlib.sha1(store_keys.tobytes()).hexdigest())
+        save_compressed(self._get_cache_path()['compressed'], vectors, self.scan_precision, meta,
+                        sections=dict(synonym_sections, store_rows=store_rows))
+        
+        print(f"压缩索引已保存到缓存目录: {self.cache_dir}", file=sys.stderr, flush=True)
     
     def _load_embeddings(self):
-        """从缓存加载embedding"""
+        """从缓存的索引文件加载embedding（只读内存映射，多个进程共享同一份页缓存）"""
         cache_paths = self._get_cache_path()
         
         # 检查缓存文件是否存在
-        if not all(os.path.exists(path) for path in [cache_paths['e'], cache_paths['f'], cache_paths['h'], cache_paths['meta']]):
+        if not os.path.exists(cache_paths['index']):
             return False
         
         try:
+            with self._stats.stage('init.open_index'):
+                meta, sections = open_bundle(cache_paths['index'], mmap_mode='r')
+            
             # 验证元数据
-            meta = np.load(cache_paths['meta'], allow_pickle=True)
-            if meta['data_count'] != len(self.data) or meta['model_name'] != self.model_name:
+            if (meta['data_count'] != self.row_count or meta['model_name'] != self.encoder_id
+                    or meta['content_hash'] != self._content_hash()):
                 print("缓存文件与当前数据不匹配，将重新计算", file=sys.stderr, flush=True)
                 return False
             
-            # 加载embedding
             print("从缓存加载embedding...", file=sys.stderr, flush=True)
-            self.embeddings_e = np.load(cache_paths['e'])
-            self.embeddings_f = np.load(cache_paths['f'])
-            self.embeddings_h = np.load(cache_paths['h'])
-            
-            # 加载同义词映射（如果存在）
-            import pickle
-            f_synonyms_path = cache_paths['f'].replace('.npy', '_synonyms.pkl')
-            h_synonyms_path = cache_paths['h'].replace('.npy', '_synonyms.pkl')
-            
-            if os.path.exists(f_synonyms_path):
-                with open(f_synonyms_path, 'rb') as f:
-                    self.f_synonyms_map = pickle.load(f)
-            else:
-                self.f_synonyms_map = {}
-            
-            if os.path.exists(h_synonyms_path):
-                with open(h_synonyms_path, 'rb') as f:
-                    self.h_synonyms_map = pickle.load(f)
-            else:
-                self.h_synonyms_map = {}
+            self._attach_index(meta, sections)
             
             print("Embedding加载完成", file=sys.stderr, flush=True)
             return True
@@ -473,154 +1108,547 @@ class LabTestMatcher:
             print(f"加载缓存失败: {e}，将重新计算", file=sys.stderr, flush=True)
             return False
     
+    def _attach_index(self, meta: Dict, sections: Dict[str, np.ndarray]):
+        """使用已打开的索引文件：E、F、H列和同义词的embedding都指向其中的数组（不复制）"""
+        n = meta['data_count']
+        dim = meta['dim']
+        f_count = meta['f_synonym_count']
+        vectors = sections['vectors']
+        self._index_vectors = vectors
+        
+        # E、F、H列指向融合矩阵的视图（不复制）
+        self.fused_embeddings = vectors[:3 * n].reshape(n, 3, dim)
+        self.embeddings_e = self.fused_embeddings[:, 0, :]
+        self.embeddings_f = self.fused_embeddings[:, 1, :]
+        self.embeddings_h = self.fused_embeddings[:, 2, :]
+        
+        self.f_synonym_index = self._build_synonym_index(
+            self.row_texts['f'], vectors[3 * n:3 * n + f_count],
+            sections['f_synonym_offsets'], sections['f_synonym_rows']
+        )
+        self.h_synonym_index = self._build_synonym_index(
+            self.row_texts['h'], vectors[3 * n + f_count:],
+            sections['h_synonym_offsets'], sections['h_synonym_rows']
+        )
+    
+    def _attach_compressed_index(self, meta: Dict, sections: Dict[str, np.ndarray], store_path: str):
+        """
+        使用已打开的压缩索引文件：扫描使用压缩向量（_scan_index）；
+        fused_embeddings和同义词embedding为按需从按文本存储读取的float32向量（StoredVectors），只用于重新打分
+        """
+        n = meta['data_count']
+        f_count = meta['f_synonym_count']
+        reader = NpyRowReader(store_path)
+        if reader.shape[0] < meta['store_key_count'] or reader.shape[1] != meta['dim']:
+            reader.close()
+            raise ValueError("按文本存储的embedding与压缩索引不一致")
+        store_rows = sections['store_rows']
+        codes, scales = sections['codes'], sections.get('scales')
+        self._index_vectors = CompressedVectors(codes, scales)
+        
+        self.fused_embeddings = StoredVectors(reader, store_rows[:3 * n].reshape(n, 3), self._normalize_rows)
+        self.embeddings_e = StoredVectors(reader, store_rows[0:3 * n:3], self._normalize_rows)
+        self.embeddings_f = StoredVectors(reader, store_rows[1:3 * n:3], self._normalize_rows)
+        self.embeddings_h = StoredVectors(reader, store_rows[2:3 * n:3], self._normalize_rows)
+        self.f_synonym_index = self._build_synonym_index(
+            self.row_texts['f'], StoredVectors(reader, store_rows[3 * n:3 * n + f_count], self._normalize_rows),
+            sections['f_synonym_offsets'], sections['f_synonym_rows']
+        )
+        self.h_synonym_index = self._build_synonym_index(
+            self.row_texts['h'], StoredVectors(reader, store_rows[3 * n + f_count:], self._normalize_rows),
+            sections['h_synonym_offsets'], sections['h_synonym_rows']
+        )
+        
+        def part(begin: int, end: int, shape=None) -> CompressedVectors:
+            part_codes = codes[begin:end]
+            part_scales = None if scales is None else scales[begin:end]
+            if shape is not None:
+                part_codes = part_codes.reshape(shape + (-1,))
+                part_scales = None if part_scales is None else part_scales.reshape(shape)
+            return CompressedVectors(part_codes, part_scales)
+        
+        self._scan_index = {
+            'precision': meta['precision'],
+            'max_error': meta['max_error'],
+            'fused_embeddings': part(0, 3 * n, (n, 3)),
+            'f_synonym_index': dict(self.f_synonym_index, embeddings=part(3 * n, 3 * n + f_count)),
+            'h_synonym_index': dict(self.h_synonym_index, embeddings=part(3 * n + f_count, len(codes)))
+        }
+    
+    def _scoring_state(self) -> Dict:
+        """
+        语义打分所需的最小状态（可pickle，用于在工作进程中重建只负责打分的匹配器）
+        
+        embedding不随状态传递：工作进程以内存映射方式打开同一个索引文件（低精度扫描时为压缩索引文件），共享页缓存
+        """
+        cache_paths = self._get_cache_path()
+        return {
+            'scan_precision': self.scan_precision,
+            'index_path': cache_paths['index' if self.scan_precision == 'float32' else 'compressed'],
+            'store_path': cache_paths['text_vectors'],
+            'row_texts': self.row_texts,
+            'first_word_index': self.first_word_index,
+            'ratio_masks': self.ratio_masks,
+            'row_labels': self.row_labels,
+            'row_ranks': self.row_ranks
+        }
+    
+    @classmethod
+    def _from_scoring_state(cls, state: Dict) -> 'LabTestMatcher':
+        """
+        由_scoring_state()重建只负责语义打分的匹配器（不加载Excel、映射文件和模型）
+        
+        只能调用_scan_top_k等打分方法，不能调用search_top_matches
+        """
+        matcher = cls.__new__(cls)
+        matcher.row_texts = state['row_texts']
+        matcher.first_word_index = state['first_word_index']
+        matcher.ratio_masks = state['ratio_masks']
+        matcher.row_labels = state['row_labels']
+        matcher.row_ranks = state['row_ranks']
+        matcher.ann_index = None
+        matcher._scan_index = None
+        matcher._stats = StageStats(enabled=False)
+        matcher.scan_precision = state['scan_precision']
+        if matcher.scan_precision == 'float32':
+            meta, sections = open_bundle(state['index_path'], mmap_mode='r')
+            matcher._attach_index(meta, sections)
+        else:
+            meta, sections = load_compressed(state['index_path'])
+            matcher._attach_compressed_index(meta, sections, state['store_path'])
+        return matcher
+    
     def _load_or_compute_embeddings(self):
-        """加载或计算embedding"""
+        """加载或计算embedding（低精度扫描时只使用压缩索引文件，不生成float32索引文件）"""
+        if self.scan_precision != 'float32':
+            if not self._load_compressed_embeddings():
+                self._compute_and_save_compressed()
+                if not self._load_compressed_embeddings():
+                    raise RuntimeError(f"无法加载刚写入的压缩索引文件: {self._get_cache_path()['compressed']}")
+            return
         if not self._load_embeddings():
             self._compute_and_save_embeddings()
+            if not self._load_embeddings():
+                raise RuntimeError(f"无法加载刚写入的embedding索引文件: {self._get_cache_path()['index']}")
+    
+    def _load_compressed_embeddings(self) -> bool:
+        """从缓存的压缩索引文件加载（压缩向量只读内存映射；float32向量留在按文本存储中按需读取）"""
+        cache_paths = self._get_cache_path()
+        if not os.path.exists(cache_paths['compressed']):
+            return False
+        
+        try:
+            with self._stats.stage('init.open_index'):
+                meta, sections = load_compressed(cache_paths['compressed'])
+            if (meta['data_count'] != self.row_count or meta['model_name'] != self.encoder_id
+                    or meta['content_hash'] != self._content_hash() or meta['precision'] != self.scan_precision):
+                print("压缩索引与当前数据不匹配，将重新生成", file=sys.stderr, flush=True)
+                return False
+            # 按文本存储重建过（行位置改变）时重新生成
+            store_keys = np.load(cache_paths['text_keys'], mmap_mode='r')
+            count = meta['store_key_count']
+            if (len(store_keys) < count
+                    or hashlib.sha1(np.ascontiguousarray(store_keys[:count]).tobytes()).hexdigest() != meta['store_keys_sha1']):
+                print("按文本存储的embedding已改变，将重新生成压缩索引", file=sys.stderr, flush=True)
+                return False
+            
+            print(f"从缓存加载 {self.scan_precision} 压缩索引...", file=sys.stderr, flush=True)
+            self._attach_compressed_index(meta, sections, cache_paths['text_vectors'])
+            print("Embedding加载完成", file=sys.stderr, flush=True)
+            return True
+        except Exception as e:
+            print(f"加载压缩索引失败: {e}，将重新生成", file=sys.stderr, flush=True)
+            return False
+    
+    def _load_or_build_ann_index(self, n_lists: int = 0):
+        """
+        加载或构建近似最近邻（IVF）索引，与embedding索引文件一起保存在缓存目录
+        
+        Args:
+            n_lists: 簇数（0表示按向量数自动选择）
+        """
+        vector_count = len(self._index_vectors)
+        if vector_count == 0:
+            return
+        if not n_lists:
+            n_lists = default_n_lists(vector_count)
+        ann_path = os.path.join(self.cache_dir, f"ann_index_{self._content_hash()[:32]}_{n_lists}.tcdidx")
+        
+        if os.path.exists(ann_path):
+            try:
+                meta, index = IVFIndex.load(ann_path)
+                if meta.get('content_hash') == self._content_hash() and meta.get('vector_count') == vector_count:
+                    self.ann_index = index
+                    print(f"从缓存加载ANN索引: {index.n_lists} 个簇", file=sys.stderr, flush=True)
+                    return
+                print("ANN索引与当前数据不匹配，将重新构建", file=sys.stderr, flush=True)
+            except Exception as e:
+                print(f"加载ANN索引失败: {e}，将重新构建", file=sys.stderr, flush=True)
+        
+        print(f"正在构建ANN索引: {vector_count} 个向量，{n_lists} 个簇...", file=sys.stderr, flush=True)
+        n = len(self.fused_embeddings)
+        # 每个向量所属的行：E、F、H列向量按行连续存放，其后是F列和H列的同义词向量
+        owners = np.concatenate([
+            np.repeat(np.arange(n, dtype=np.int64), 3),
+            np.repeat(self.f_synonym_index['rows'], np.diff(self.f_synonym_index['offsets'])),
+            np.repeat(self.h_synonym_index['rows'], np.diff(self.h_synonym_index['offsets']))
+        ])
+        # 低精度时用反量化的压缩向量训练簇中心（候选行仍精确重新打分）
+        index = IVFIndex.build(self._index_vectors, owners, n_lists=n_lists)
+        try:
+            index.save(ann_path, meta={'content_hash': self._content_hash(), 'vector_count': vector_count})
+        except Exception as e:
+            print(f"警告: 保存ANN索引失败: {e}", file=sys.stderr, flush=True)
+        self.ann_index = index
+        print("ANN索引构建完成", file=sys.stderr, flush=True)
     
-    def _calculate_similarity_batch(self, query_embedding: np.ndarray, data_embeddings: np.ndarray) -> np.ndarray:
+    def _lexical_texts(self) -> Tuple[List[str], np.ndarray]:
         """
-        批量计算查询embedding与数据embedding的余弦相似度（向量化操作，更高效）
+        字面索引的文本：每行的E列，以及F、H列中分号分隔的每个同义词（同一行中相同的文本只保留一个）
+        
+        Returns:
+            (文本列表, 每个文本所属的行位置)
+        """
+        texts, rows = [], []
+        columns = [self.row_texts[key].tolist() for key in ('e', 'f', 'h')]
+        for row, (e_text, f_text, h_text) in enumerate(zip(*columns)):
+            seen = set()
+            for text in [e_text] + f_text.split(';') + h_text.split(';'):
+                text = text.strip()
+                if text and text.lower() not in seen:
+                    seen.add(text.lower())
+                    texts.append(text)
+                    rows.append(row)
+        return texts, np.asarray(rows, dtype=np.int64)
+    
+    def _load_or_build_lexical_index(self):
+        """加载或构建字符n-gram倒排索引（按E、F、H列内容哈希保存在缓存目录）"""
+        lexical_path = os.path.join(self.cache_dir, f"lexical_index_{self._content_hash()[:32]}.tcdidx")
+        if os.path.exists(lexical_path):
+            try:
+                meta, index = NgramIndex.load(lexical_path)
+                if meta.get('content_hash') == self._content_hash() and meta.get('row_count') == self.row_count:
+                    self._lexical_index = index
+                    return
+                print("字面索引与当前数据不匹配，将重新构建", file=sys.stderr, flush=True)
+            except Exception as e:
+                print(f"加载字面索引失败: {e}，将重新构建", file=sys.stderr, flush=True)
+        
+        texts, rows = self._lexical_texts()
+        print(f"正在构建字面索引: {len(texts)} 个文本...", file=sys.stderr, flush=True)
+        NgramIndex.build(texts, rows, self.row_count).save(lexical_path, meta={'content_hash': self._content_hash()})
+        _, self._lexical_index = NgramIndex.load(lexical_path)
+    
+    def _lexical_scores(self, queries: List[str]) -> Optional[np.ndarray]:
+        """
+        查询对每行的字面得分 (q, n)；未开启字面得分时返回None
         
         Args:
-            query_embedding: 查询的embedding向量 (1, dim)
-            data_embeddings: 数据的embedding矩阵 (n, dim)
+            queries: 原始查询列表（不使用_preprocess_query处理后的查询：处理时移除了空格，
+                     会丢失CT文本中词边界的n-gram；大小写和多余空白在生成n-gram时统一）
+        """
+        if self._lexical_index is None:
+            return None
+        with self._stats.stage('search.lexical'):
+            return self._lexical_index.scores(queries)
+    
+    def _lexical_results(self, lexical_scores: np.ndarray, ranges: Optional[List[Tuple[int, int]]],
+                         top_k: int) -> Optional[List[Dict]]:
+        """
+        置信的字面匹配：最高字面得分不低于lexical_confident时按字面得分返回前top_k个结果（不需要模型编码）
+        
+        Args:
+            lexical_scores: 一个查询对每行的字面得分 (n,)
+            ranges: 只在这些行范围中匹配（None表示全部行）
+            top_k: 返回前k个结果
             
         Returns:
-            相似度分数数组 (n,)
+            结果列表（similarity为字面得分，is_lexical_match为True）；不够置信时返回None
+        """
+        if self.lexical_confident <= 0 or (ranges is not None and not ranges):
+            # 指定的Codelist在指定的CT版本中没有数据行时没有字面结果（语义匹配同样返回空结果）
+            return None
+        if ranges is None:
+            ranges = [(0, self.row_count)]
+        positions = np.concatenate([np.arange(start, end, dtype=np.int64) for start, end in ranges])
+        scores = lexical_scores[positions]
+        if not len(scores) or scores.max() < self.lexical_confident:
+            return None
+        results = self._build_semantic_results(scores, positions, top_k)
+        for result in results:
+            result['is_lexical_match'] = True
+        return results
+    
+    def _build_synonym_index(self, texts: np.ndarray, embeddings: np.ndarray, offsets: np.ndarray, rows: np.ndarray) -> Dict:
         """
-        # 归一化embedding向量
-        query_norm = query_embedding / (np.linalg.norm(query_embedding) + 1e-8)
-        data_norms = data_embeddings / (np.linalg.norm(data_embeddings, axis=1, keepdims=True) + 1e-8)
+        组装扁平化的同义词索引
         
-        # 批量计算余弦相似度（向量化操作）
-        similarities = np.dot(data_norms, query_norm.T).flatten()
+        Args:
+            texts: 该列每行的原始文本（用于生成同义词精确匹配的键）
+            embeddings: 所有同义词的归一化embedding，按行顺序连续存放 (m, dim)
+            offsets: 每行同义词在embeddings中的起止位置 (r + 1,)，第j行为 offsets[j]:offsets[j + 1]
+            rows: 有同义词的行在数据中的位置 (r,)
+            
+        Returns:
+            同义词索引字典：
+            - embeddings、offsets、rows: 同参数
+            - keys: {小写同义词: 在rows中的下标数组}，用于同义词精确匹配
+        """
+        synonyms_by_row = self._split_synonyms(texts)
+        keys = {}
+        for j, row in enumerate(rows.tolist()):
+            for synonym in synonyms_by_row[row]:
+                key_rows = keys.setdefault(synonym.strip().lower(), [])
+                if not key_rows or key_rows[-1] != j:
+                    key_rows.append(j)
         
-        return similarities
+        return {
+            'embeddings': embeddings,
+            'offsets': offsets,
+            'rows': rows,
+            'keys': {key: np.asarray(key_rows, dtype=np.int64) for key, key_rows in keys.items()}
+        }
     
-    def _calculate_similarity_with_synonyms(self, query: str, query_embedding: np.ndarray, base_embeddings: np.ndarray, 
-                                           synonyms_map: Dict, row_indices: List, original_texts: List[str]) -> np.ndarray:
+    def _calculate_similarity_fused(self, query_norm: np.ndarray, rows, fused=None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
-        计算相似度，处理包含分号分隔的同义词
+        用一次矩阵乘法计算查询与E、F、H列的余弦相似度
         
-        注意：只使用分号";"作为分隔符，"/"表示Ratio（比值），不作为分隔符
+        Args:
+            query_norm: 已归一化的查询embedding矩阵 (q, dim)
+            rows: 要计算的行，slice(起始位置, 结束位置) 或升序的行位置数组
+            fused: E、F、H列的向量 (n, 3, dim)（默认fused_embeddings；低精度扫描时为CompressedVectors）
+            
+        Returns:
+            (E列相似度, F列相似度, H列相似度)，每个形状为 (q, 行数)
+        """
+        if fused is None:
+            fused = self.fused_embeddings
+        block = fused[rows]  # slice为视图；行位置数组只复制候选行
+        n = len(block)
+        flat = block.reshape(n * 3, -1)
+        if len(query_norm) == 1:
+            # 单个查询：矩阵-向量乘法
+            scores = flat.dot(query_norm[0]).reshape(n, 3, 1)
+        else:
+            scores = flat.dot(query_norm.T).reshape(n, 3, -1)
+        return scores[:, 0, :].T, scores[:, 1, :].T, scores[:, 2, :].T
+    
+    @staticmethod
+    def _local_positions(positions: np.ndarray, rows) -> np.ndarray:
+        """
+        把行位置换算为在选择的行中的下标（不在选择中的位置被丢弃）
+        
+        Args:
+            positions: 行位置数组（升序）
+            rows: slice(起始位置, 结束位置) 或升序的行位置数组
+        """
+        if isinstance(rows, slice):
+            return positions[(positions >= rows.start) & (positions < rows.stop)] - rows.start
+        local = np.searchsorted(rows, positions)
+        found = local < len(rows)
+        found[found] = rows[local[found]] == positions[found]
+        return local[found]
+    
+    @staticmethod
+    def _synonym_segments(synonym_index: Dict, rows) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        取出选择的行中有同义词的部分
+        
+        Args:
+            synonym_index: 扁平化的同义词索引（见_build_synonym_index）
+            rows: slice(起始位置, 结束位置) 或升序的行位置数组
+            
+        Returns:
+            (有同义词的行在选择中的下标 (r,), 这些行在同义词索引中的编号 (r,),
+             这些行的同义词embedding (m, dim), 每行同义词在其中的起始位置 (r,))
+        """
+        all_rows = synonym_index['rows']
+        offsets = synonym_index['offsets']
+        if isinstance(rows, slice):
+            # 同义词按行位置排序，所需的同义词是连续的一段（视图，不复制）
+            j_start, j_end = np.searchsorted(all_rows, [rows.start, rows.stop])
+            segment_ids = np.arange(j_start, j_end)
+            local_rows = all_rows[j_start:j_end] - rows.start
+            embeddings = synonym_index['embeddings'][offsets[j_start]:offsets[j_end]]
+            starts = offsets[j_start:j_end] - offsets[j_start]
+            return local_rows, segment_ids, embeddings, starts
+        
+        j = np.searchsorted(all_rows, rows)
+        found = j < len(all_rows)
+        found[found] = all_rows[j[found]] == rows[found]
+        local_rows = np.flatnonzero(found)
+        segment_ids = j[found]
+        counts = offsets[segment_ids + 1] - offsets[segment_ids]
+        starts = np.zeros(len(counts), dtype=np.int64)
+        starts[1:] = np.cumsum(counts)[:-1]
+        # 每个同义词在同义词索引中的位置 = 所在行的起始位置 + 行内序号
+        gather = np.repeat(offsets[segment_ids] - starts, counts) + np.arange(int(counts.sum()))
+        return local_rows, segment_ids, synonym_index['embeddings'][gather], starts
+    
+    @staticmethod
+    def _top_k_indices(scores: np.ndarray, top_k: int, tie_breaker: np.ndarray = None) -> np.ndarray:
+        """
+        取相似度最高的top_k个下标（降序；相同相似度按原有顺序，与稳定排序结果一致）
+        
+        使用argpartition先选出候选，只对候选排序，避免对全部数据做完整排序
         
         Args:
-            query: 查询字符串（用于精确匹配检查）
-            query_embedding: 查询的embedding向量 (1, dim)
-            base_embeddings: 基础embedding矩阵 (n, dim)
-            synonyms_map: 同义词映射字典 {row_idx: {'synonyms': [...], 'embeddings': np.array}}
-            row_indices: 行索引列表
-            original_texts: 原始文本列表（用于精确匹配检查）
+            scores: 相似度数组 (n,)
+            top_k: 返回的数量
+            tie_breaker: 相同相似度时的排序键 (n,)（None表示按下标）
             
         Returns:
-            相似度分数数组 (n,)，对于有同义词的行，取所有同义词中的最大相似度
+            下标数组
+        """
+        n = len(scores)
+        if top_k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if top_k >= n:
+            candidates = np.arange(n)
+        else:
+            partition = np.argpartition(-scores, top_k - 1)[:top_k]
+            kth_score = scores[partition].min()
+            # 包含所有与第k个相似度相同的下标，保证并列时按原有顺序选取
+            candidates = np.flatnonzero(scores >= kth_score)
+        if tie_breaker is None:
+            order = np.argsort(-scores[candidates], kind='stable')
+        else:
+            order = np.lexsort((tie_breaker[candidates], -scores[candidates]))
+        return candidates[order][:top_k]
+    
+    def _calculate_similarity_with_synonyms(self, queries: List[str], query_norm: np.ndarray, base_similarities: np.ndarray, 
+                                           synonym_index: Dict, first_word_index: Dict, rows=None) -> np.ndarray:
         """
-        # 先计算基础相似度
-        base_similarities = self._calculate_similarity_batch(query_embedding, base_embeddings)
+        计算相似度，处理包含分号分隔的同义词（支持多个查询同时计算）
+        
+        注意：只使用分号";"作为分隔符，"/"表示Ratio（比值），不作为分隔符
         
+        Args:
+            queries: 查询字符串列表（用于精确匹配检查）
+            query_norm: 已归一化的查询embedding矩阵 (q, dim)
+            base_similarities: 与基础embedding（完整文本）的相似度矩阵 (q, n)
+            synonym_index: 扁平化的同义词索引（见_build_synonym_index）
+            first_word_index: 分号前第一个词的索引 {小写第一个词: 行位置数组}（用于精确匹配检查）
+            rows: base_similarities各列对应的行，slice(起始位置, 结束位置) 或升序的行位置数组（默认从第0行开始的连续n行）
+            
+        Returns:
+            相似度分数矩阵 (q, n)，对于有同义词的行，取所有同义词中的最大相似度
+        """
+        if rows is None:
+            rows = slice(0, base_similarities.shape[1])
         # 对于有同义词的行，计算每个同义词的相似度，取最大值
         similarities = base_similarities.copy()
         
-        query_lower = query.strip().lower()
-        
-        # 首先检查所有行的精确匹配（包括不在synonyms_map中的行）
-        for i, row_idx in enumerate(row_indices):
-            if i < len(original_texts):
-                original_text = original_texts[i]
-                if ';' in original_text and original_text.strip():
-                    # 获取分号前的第一个词（去除前后空白）
-                    # 注意：只按分号";"分割，"/"表示Ratio，不作为分隔符
-                    first_word = original_text.split(';')[0].strip()
-                    # 如果第一个词与查询完全相同（忽略大小写），给予最高相似度
-                    if first_word.lower() == query_lower:
-                        similarities[i] = 1.0  # 精确匹配，给予最高相似度
-                        continue  # 跳过后续的同义词处理
-        
-        # 对于在synonyms_map中的行，进一步处理同义词
-        if synonyms_map:
-            for i, row_idx in enumerate(row_indices):
-                # 如果已经是精确匹配，跳过
-                if similarities[i] >= 1.0:
-                    continue
-                    
-                if row_idx in synonyms_map:
-                    synonym_data = synonyms_map[row_idx]
-                    synonyms = synonym_data['synonyms']
-                    synonym_embeddings = synonym_data['embeddings']
-                    
-                    # 检查同义词列表中是否有完全匹配
-                    exact_match = False
-                    for synonym in synonyms:
-                        if synonym.strip().lower() == query_lower:
-                            exact_match = True
-                            similarities[i] = 1.0  # 精确匹配，给予最高相似度
-                            break
-                    
-                    # 如果没有精确匹配，计算查询与每个同义词的相似度
-                    if not exact_match:
-                        synonym_similarities = self._calculate_similarity_batch(query_embedding, synonym_embeddings)
-                        
-                        # 取所有同义词中的最大相似度
-                        max_synonym_sim = np.max(synonym_similarities)
-                        
-                        # 与基础相似度比较，取最大值
-                        similarities[i] = max(base_similarities[i], max_synonym_sim)
+        queries_lower = [query.strip().lower() for query in queries]
+        
+        # 首先检查所有行的精确匹配（包括没有同义词的行）
+        # 如果分号前的第一个词与查询完全相同（忽略大小写），给予最高相似度
+        for q, query_lower in enumerate(queries_lower):
+            exact_positions = first_word_index.get(query_lower)
+            if exact_positions is not None:
+                similarities[q, self._local_positions(exact_positions, rows)] = 1.0  # 精确匹配，给予最高相似度
+        
+        # 对于有同义词的行，进一步处理同义词
+        local_rows, segment_ids, synonym_embeddings, starts = self._synonym_segments(synonym_index, rows)
+        if len(local_rows) == 0:
+            return similarities
+        
+        # 一次矩阵乘法计算所有查询与所有同义词的相似度 (m, q)，再按行分段取最大值 (r, q)
+        synonym_similarities = synonym_embeddings.dot(query_norm.T)
+        max_synonym_sims = np.maximum.reduceat(synonym_similarities, starts, axis=0).T
+        
+        # 如果已经是精确匹配，不再处理
+        current = similarities[:, local_rows]
+        pending = current < 1.0
+        
+        # 检查同义词列表中是否有完全匹配
+        synonym_exact = np.zeros_like(pending)
+        for q, query_lower in enumerate(queries_lower):
+            exact_segments = synonym_index['keys'].get(query_lower)
+            if exact_segments is not None:
+                synonym_exact[q, self._local_positions(exact_segments, segment_ids)] = True
+        
+        # 精确匹配给予最高相似度；否则与基础相似度比较，取最大值
+        similarities[:, local_rows] = np.where(
+            pending,
+            np.where(synonym_exact, 1.0, np.maximum(base_similarities[:, local_rows], max_synonym_sims)),
+            current
+        )
         
         return similarities
     
-    def search_top_matches(self, query: str, top_k: int =10) -> List[Dict]:
+    def _encode_queries(self, processed_queries: List[str]) -> np.ndarray:
         """
-        搜索与查询最相似的前k个检查项目
-        
-        第一步：先在映射文件中进行精确匹配（忽略大小写）
-        - 中文输入优先匹配F列，英文输入优先匹配G列
-        - 如果匹配成功，直接返回映射文件的结果（A、E、F、G列）
-        
-        第二步：如果精确匹配失败，进行语义匹配
-        - 与SDTM Terminology.xls的E、F、H列进行语义匹配
-        - 返回前top_k个结果（默认10）
+        计算查询的embedding（优先从查询embedding缓存读取，未命中的查询一次性批量编码）
         
         Args:
-            query: 用户输入的检查项目名称（支持中英文）
-            top_k: 返回前k个结果，默认10（仅用于语义匹配）
+            processed_queries: 处理后的查询列表（已移除"绝对值"）
             
         Returns:
-            结果列表，每个结果包含：
-            - similarity: 相似度分数
-            - a_value: A列值（仅精确匹配时返回）
-            - e_value: E列值
-            - f_value: F列值
-            - g_value: G列值（仅精确匹配时返回）
-            - h_value: H列值（仅语义匹配时返回）
-            - is_exact_match: 是否为精确匹配
-            - row_index: 原始行索引
+            查询的embedding矩阵 (q, dim)
         """
-        # 第一步：尝试精确匹配
-        exact_match_results = self._exact_match_in_mapping(query)
-        if exact_match_results:
-            print(f"在映射文件中找到精确匹配: {len(exact_match_results)} 条结果", file=sys.stderr, flush=True)
-            return exact_match_results
-        else:
-            print(f"映射文件中未找到精确匹配，将进行语义匹配", file=sys.stderr, flush=True)
-        
-        # 第二步：精确匹配失败，进行语义匹配
-        if self.data is None or len(self.data) == 0:
-            return []
+        with self._stats.stage('search.query_cache'):
+            cached = self.query_cache.get_many(self.encoder_id, processed_queries)
+        
+        # 未命中的查询去重后一次性编码
+        missing = list(dict.fromkeys(query for query, embedding in zip(processed_queries, cached) if embedding is None))
+        if missing:
+            model = self._get_model()
+            with self._stats.stage('search.encode'):
+                missing_embeddings = np.asarray(model.encode(missing, convert_to_numpy=True), dtype=np.float32)
+            self._stats.increment('encoded_queries', len(missing))
+            self.query_cache.put_many(self.encoder_id, missing, missing_embeddings)
+            encoded = dict(zip(missing, missing_embeddings))
+            cached = [encoded[query] if embedding is None else embedding
+                      for query, embedding in zip(processed_queries, cached)]
+        
+        return np.vstack(cached)
+    
+    def query_cache_info(self) -> Dict:
+        """
+        返回查询embedding缓存的命中统计
         
-        if self.embeddings_e is None or self.embeddings_f is None or self.embeddings_h is None:
-            raise ValueError("Embedding未加载，请先初始化匹配器")
+        Returns:
+            包含memory_hits、disk_hits、misses、hit_rate、size等字段的字典
+        """
+        return self.query_cache.info()
+    
+    def stats(self) -> Dict:
+        """
+        返回分阶段耗时统计和计数器
         
-        # 获取列名
-        e_col = 'CDISC Submission Value'  # E列
-        f_col = 'CDISC Synonym(s)'  # F列
-        h_col = 'NCI Preferred Term'  # H列
+        阶段名称：
+        - init.*: 初始化各阶段（load_data、row_metadata、load_mapping、embeddings、open_index、
+          encode_texts、ann_index、model_load）
+        - search.*: 查询各阶段（exact_lookup、preprocess、query_cache、encode、ann_probe、score_efh、
+          score_synonyms、combine、parallel_score、rerank、assemble）
         
-        # 确保列存在
-        if e_col not in self.data.columns or f_col not in self.data.columns or h_col not in self.data.columns:
-            raise ValueError("Excel文件缺少必要的列：CDISC Submission Value, CDISC Synonym(s), 或 NCI Preferred Term")
+        Returns:
+            {'enabled': 是否记录, 'stages': {阶段: {count, total_ms, mean_ms, p50_ms, p95_ms, max_ms}},
+             'counters': {queries, exact_hits, semantic_queries, encoded_queries, ...},
+             'query_cache': query_cache_info(), 'model_status': model_status()}
+        """
+        snapshot = self._stats.snapshot()
+        snapshot['enabled'] = self._stats.enabled
+        snapshot['query_cache'] = self.query_cache_info()
+        snapshot['model_status'] = self.model_status()
+        return snapshot
+    
+    def reset_stats(self):
+        """清空分阶段耗时统计（包括初始化阶段）"""
+        self._stats.reset()
+    
+    @staticmethod
+    def _preprocess_query(query: str) -> str:
+        """
+        处理查询：忽略"绝对值"（Absolute Value）
         
-        # 处理查询：忽略"绝对值"（Absolute Value）
+        Args:
+            query: 原始查询字符串
+            
+        Returns:
+            用于语义匹配的查询字符串（移除后为空时返回原查询）
+        """
         # 移除查询中的"绝对值"或"Absolute Value"（不区分大小写）
         processed_query = query
         processed_query = processed_query.replace('绝对值', '').replace(' ', '')
@@ -631,51 +1659,380 @@ class LabTestMatcher:
         if not processed_query.strip():
             # 如果移除后查询为空，使用原查询
             processed_query = query
+        return processed_query
+    
+    def _check_semantic_ready(self):
+        """检查语义匹配所需的数据和embedding是否就绪"""
+        if self.embeddings_e is None or self.embeddings_f is None or self.embeddings_h is None:
+            raise ValueError("Embedding未加载，请先初始化匹配器")
+    
+    def _scan_top_k(self, processed_queries: List[str], query_norm: np.ndarray, selections: List, top_k: int,
+                    lexical_scores: np.ndarray = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        两阶段打分：先扫描选择的行得到近似综合相似度的区间，再只对可能进入前top_k的候选行精确重新打分
         
-        # 计算查询的embedding（忽略大小写，统一转换为小写以提高匹配效果）
-        model = self._get_model()
-        # 为了更好的匹配效果，在计算embedding时也考虑大小写不敏感的情况
-        # 但保留原始查询用于精确匹配检查
-        query_embedding = model.encode([processed_query], convert_to_numpy=True)
+        扫描使用float32向量（或低精度扫描的压缩向量），点积误差不超过dot_error_bounds给出的上界δ
+        （float32累加的舍入误差，加上压缩误差），同一规则分支内综合相似度的误差不超过1.05δ，
+        因此每行的精确相似度在 [近似值 - 1.05δ, 近似值 + 1.05δ] 内，以下两种情况除外：
+        - F/H列最大值与E列之差与-0.1相差不超过2δ：是否F/H列优先可能不同，精确值是两个分支之一，
+          取两个分支近似值的最小值和最大值作为区间的两端
+        - 含'/'的F、H列相似度与1.0相差不超过δ：是否降权可能不同，区间为无穷（总是候选行）
         
-        # 批量计算与E、F、H列的相似度
-        similarities_e = self._calculate_similarity_batch(query_embedding, self.embeddings_e)
+        以第top_k大的下界为阈值，上界不低于阈值的行都是候选行，精确的前top_k个（包括并列的行）一定都在其中。
+        候选行用float64重新计算后转为float32（见_rescore），与矩阵乘法的kernel、批量大小和行的选择无关：
+        同一查询单独计算、批量计算、分片计算或用压缩向量扫描，得到的相似度和排序都相同。
+        与字面得分融合时，字面得分是精确值，区间的两端按相同的权重融合
         
-        # 获取F列和H列的原始文本（用于精确匹配检查）
-        f_texts = [str(row[f_col]) if pd.notna(row[f_col]) else "" for _, row in self.data.iterrows()]
-        h_texts = [str(row[h_col]) if pd.notna(row[h_col]) else "" for _, row in self.data.iterrows()]
+        Args:
+            processed_queries: 处理后的查询列表（已移除"绝对值"）
+            query_norm: 已归一化的查询embedding矩阵 (q, dim)
+            selections: 要计算的行，slice(起始位置, 结束位置) 或升序的行位置数组的列表（按位置升序）
+            top_k: 每个查询需要的结果数
+            lexical_scores: 查询对全部行的字面得分 (q, n)（提供时按lexical_weight与语义得分融合）
+            
+        Returns:
+            与processed_queries一一对应的 (候选行的精确综合相似度 (c,), 候选行位置 (c,))
+        """
+        scan = self._scan_index
+        positions = np.concatenate([
+            np.arange(rows.start, rows.stop, dtype=np.int64) if isinstance(rows, slice) else rows for rows in selections
+        ])
+        dot_errors = dot_error_bounds(query_norm, 0.0 if scan is None else scan['max_error'])[:, None]
+        margins = dot_errors[:, 0] * 1.05
+        if lexical_scores is not None:
+            margins = margins * (1.0 - self.lexical_weight)
+        
+        # 下界和上界先不含margins（每个查询的margins相同，选取候选行时再计入）
+        lower_parts, upper_parts = [], []
+        for rows in selections:
+            similarities_e, similarities_f, similarities_h = self._column_similarities(
+                processed_queries, query_norm, rows, scan
+            )
+            with self._stats.stage('search.combine'):
+                lower, upper = self._similarity_bounds(processed_queries, rows, similarities_e, similarities_f,
+                                                       similarities_h, dot_errors)
+                if lexical_scores is not None:
+                    same = upper is lower
+                    lower = self._fuse_lexical(lower, lexical_scores[:, rows])
+                    upper = lower if same else self._fuse_lexical(upper, lexical_scores[:, rows])
+                lower_parts.append(lower)
+                upper_parts.append(upper)
+        lower = np.concatenate(lower_parts, axis=1) if len(lower_parts) > 1 else lower_parts[0]
+        upper = np.concatenate(upper_parts, axis=1) if len(upper_parts) > 1 else upper_parts[0]
+        
+        k = min(top_k, len(positions))
+        if k <= 0:
+            return [(np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)) for _ in processed_queries]
+        candidates = []
+        for q in range(len(processed_queries)):
+            threshold = np.partition(lower[q], len(positions) - k)[len(positions) - k] - 2 * margins[q]
+            candidates.append(positions[upper[q] >= threshold])
+        
+        # 候选行相近的相邻查询分组重新打分：每组计算全部候选行的并集，
+        # 并集大小 * 查询数不超过RESCORE_BLOCK，也不超过各查询候选行数之和的2倍（候选行各不相同时逐个计算）
+        top = []
+        begin = 0
+        while begin < len(processed_queries):
+            end = begin + 1
+            union = candidates[begin]
+            total = len(union)
+            while end < len(processed_queries):
+                merged = np.union1d(union, candidates[end])
+                size = len(merged) * (end - begin + 1)
+                if size > RESCORE_BLOCK or size > 2 * (total + len(candidates[end])):
+                    break
+                union = merged
+                total += len(candidates[end])
+                end += 1
+            scores = self._rescore(processed_queries[begin:end], query_norm[begin:end], union,
+                                   None if lexical_scores is None else lexical_scores[begin:end])
+            for q in range(begin, end):
+                top.append((scores[q - begin][np.searchsorted(union, candidates[q])], candidates[q]))
+            begin = end
+        return top
+    
+    def _similarity_bounds(self, processed_queries: List[str], rows, similarities_e: np.ndarray,
+                           similarities_f: np.ndarray, similarities_h: np.ndarray,
+                           dot_errors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        由近似的E、F、H列相似度得到精确综合相似度的区间（见_scan_top_k）
         
-        # 计算F列相似度（处理分号分隔的同义词）
-        # 使用处理后的查询进行相似度计算，但保留原查询用于精确匹配检查
-        similarities_f = self._calculate_similarity_with_synonyms(
-            processed_query, query_embedding, self.embeddings_f, self.f_synonyms_map, 
-            self.data.index.tolist(), f_texts
-        )
+        Args:
+            processed_queries: 处理后的查询列表
+            rows: 相似度各列对应的行，slice(起始位置, 结束位置) 或升序的行位置数组
+            similarities_e, similarities_f, similarities_h: 近似相似度 (q, 行数)，与精确值相差不超过dot_errors
+            dot_errors: 每个查询的点积误差上界 (q, 1)
+            
+        Returns:
+            (lower, upper)：精确综合相似度在 [lower - 1.05 * dot_errors, upper + 1.05 * dot_errors] 内。
+            只有不确定的行lower与upper不同，其余行upper与lower是同一个数组（近似综合相似度）
+        """
+        # 含'/'且相似度与1.0相差不超过δ：是否降权不确定
+        ratio_queries, ratio_columns = [], []
+        for column, similarities in (('f', similarities_f), ('h', similarities_h)):
+            columns = np.flatnonzero(self.ratio_masks[column][rows])
+            query_ids, hits = np.nonzero(np.abs(similarities[:, columns] - 1.0) <= dot_errors)
+            ratio_queries.append(query_ids)
+            ratio_columns.append(columns[hits])
+        ratio_queries = np.concatenate(ratio_queries)
+        ratio_columns = np.concatenate(ratio_columns)
+        
+        similarities_f, similarities_h = self._apply_ratio_penalty(processed_queries, rows, similarities_f, similarities_h)
+        lower = self._combine_similarities(similarities_e, similarities_f, similarities_h)
+        upper = lower
+        
+        # F/H列最大值与E列之差在-0.1附近：是否F/H列优先不确定
+        fh_max = np.maximum(similarities_f, similarities_h)
+        query_ids, columns = np.nonzero(np.abs(fh_max - similarities_e + 0.1) <= 2 * dot_errors)
+        if len(query_ids) or len(ratio_queries):
+            upper = lower.copy()
+            branch_fh = fh_max[query_ids, columns]
+            weighted = np.maximum(branch_fh * 1.05, similarities_e[query_ids, columns])
+            lower[query_ids, columns] = np.minimum(branch_fh, weighted)
+            upper[query_ids, columns] = np.maximum(branch_fh, weighted)
+            lower[ratio_queries, ratio_columns] = -np.inf
+            upper[ratio_queries, ratio_columns] = np.inf
+        return lower, upper
+    
+    def _rescore(self, processed_queries: List[str], query_norm: np.ndarray, rows: np.ndarray,
+                 lexical_scores: np.ndarray = None) -> np.ndarray:
+        """
+        候选行的精确综合相似度：用float64计算（float32向量的乘积在float64中没有舍入，累加的舍入误差约为1e-16），
+        再转为float32。不同的累加顺序和矩阵乘法的kernel只在float64的精度上有差别，
+        除非恰好落在float32的舍入边界上，转为float32后相同
         
-        # 计算H列相似度（处理分号分隔的同义词）
-        similarities_h = self._calculate_similarity_with_synonyms(
-            processed_query, query_embedding, self.embeddings_h, self.h_synonyms_map, 
-            self.data.index.tolist(), h_texts
-        )
+        Args:
+            processed_queries: 处理后的查询列表
+            query_norm: 已归一化的查询embedding矩阵 (q, dim)
+            rows: 升序的候选行位置
+            lexical_scores: 查询对全部行的字面得分 (q, n)（None表示不融合）
+            
+        Returns:
+            候选行的综合相似度 (q, 行数) float32
+        """
+        with self._stats.stage('search.rescore'):
+            scores = self._semantic_similarities_for_rows(
+                processed_queries, query_norm.astype(np.float64), rows, lexical_scores
+            )
+        self._stats.increment('rescored_rows', scores.size)
+        return scores.astype(np.float32)
+    
+    def _semantic_search(self, processed_queries: List[str], query_embeddings: np.ndarray,
+                         ranges: List[Tuple[int, int]], top_k: int,
+                         lexical_scores: np.ndarray = None) -> List[List[Dict]]:
+        """
+        语义匹配：开启ANN索引时只对候选行打分，否则扫描全部行（或指定的行范围）
+        
+        Args:
+            processed_queries: 处理后的查询列表（已移除"绝对值"）
+            query_embeddings: 查询的embedding矩阵 (q, dim)
+            ranges: 只在这些行范围中匹配（None表示全部行）
+            top_k: 每个查询返回前k个结果
+            lexical_scores: 查询对全部行的字面得分 (q, n)（lexical_weight大于0时与语义得分融合）
+            
+        Returns:
+            与processed_queries一一对应的结果列表
+        """
+        if self.lexical_weight <= 0:
+            lexical_scores = None
+        
+        if ranges is not None and not ranges:
+            # 指定的Codelist在指定的CT版本中没有数据行
+            return [[] for _ in processed_queries]
+        
+        if self.ann_index is None and self._use_workers(len(processed_queries), ranges):
+            scorer = self._get_sharded_scorer()
+            # 工作进程中的打分阶段不单独计时，只记录整体耗时（包括合并结果）
+            with self._stats.stage('search.parallel_score'):
+                return scorer.search(processed_queries, query_embeddings, ranges, top_k)
+        
+        # 查询向量只归一化一次
+        query_norm = self._normalize_rows(np.atleast_2d(query_embeddings))
+        if ranges is None:
+            ranges = [(0, self.row_count)]
+        selections = [slice(start, end) for start, end in ranges]
+        
+        if self.ann_index is None:
+            top = self._scan_top_k(processed_queries, query_norm, selections, top_k, lexical_scores)
+            return [self._build_semantic_results(scores, positions, top_k) for scores, positions in top]
+        
+        with self._stats.stage('search.ann_probe'):
+            list_ids = self.ann_index.probe(query_norm, self.ann_n_probe)
+        all_results = []
+        for q, processed_query in enumerate(processed_queries):
+            query_lexical = None if lexical_scores is None else lexical_scores[q:q + 1]
+            candidates = self._ann_candidate_rows(processed_query, list_ids[q], ranges,
+                                                  None if query_lexical is None else query_lexical[0])
+            # 候选行不足top_k个时退回暴力扫描，保证返回结果的数量不变
+            scores, positions = self._scan_top_k([processed_query], query_norm[q:q + 1],
+                                                 selections if len(candidates) < top_k else [candidates],
+                                                 top_k, query_lexical)[0]
+            all_results.append(self._build_semantic_results(scores, positions, top_k))
+        return all_results
+    
+    def _use_workers(self, query_count: int, ranges: List[Tuple[int, int]] = None) -> bool:
+        """计算量（查询数 x 行数）足够大时才使用多进程（进程间通信有固定开销）"""
+        if self.search_workers <= 1 or self.lexical_weight > 0:
+            # 字面得分融合只在主进程中进行
+            return False
+        row_count = len(self.row_labels) if ranges is None else sum(end - start for start, end in ranges)
+        return query_count * row_count >= PARALLEL_MIN_WORK
+    
+    def _get_sharded_scorer(self) -> ShardedScorer:
+        """获取多进程打分的进程池（首次调用时启动工作进程）"""
+        if self._sharded_scorer is None:
+            print(f"正在启动 {self.search_workers} 个打分进程...", file=sys.stderr, flush=True)
+            self._sharded_scorer = ShardedScorer(self, self.search_workers)
+        return self._sharded_scorer
+    
+    def close_workers(self):
+        """关闭多进程打分的进程池（之后需要时会重新启动）"""
+        if self._sharded_scorer is not None:
+            self._sharded_scorer.close()
+            self._sharded_scorer = None
+    
+    def _ann_candidate_rows(self, processed_query: str, list_ids: np.ndarray,
+                            ranges: List[Tuple[int, int]] = None, lexical_scores: np.ndarray = None) -> np.ndarray:
+        """
+        一个查询的候选行：ANN索引中被检查的簇包含的行，加上同义词与查询完全相同的行
+        （保证精确匹配的1.0结果不会因近似检索而丢失）；与字面得分融合时再加上字面得分最高的行
+        
+        Args:
+            processed_query: 处理后的查询
+            list_ids: 要检查的簇编号
+            ranges: 只保留这些行范围中的行（None表示不限制）
+            lexical_scores: 查询对全部行的字面得分 (n,)（None表示不融合）
+            
+        Returns:
+            升序的候选行位置数组
+        """
+        parts = [self.ann_index.candidate_rows(list_ids)]
+        query_lower = processed_query.strip().lower()
+        for column, synonym_index in (('f', self.f_synonym_index), ('h', self.h_synonym_index)):
+            exact_positions = self.first_word_index[column].get(query_lower)
+            if exact_positions is not None:
+                parts.append(exact_positions)
+            exact_segments = synonym_index['keys'].get(query_lower)
+            if exact_segments is not None:
+                parts.append(synonym_index['rows'][exact_segments])
+        if lexical_scores is not None:
+            count = min(LEXICAL_ANN_CANDIDATES, len(lexical_scores))
+            top_lexical = np.argpartition(lexical_scores, len(lexical_scores) - count)[len(lexical_scores) - count:]
+            parts.append(top_lexical[lexical_scores[top_lexical] > 0])
+        candidates = np.unique(np.concatenate(parts))
+        
+        if ranges is not None:
+            in_ranges = np.zeros(len(candidates), dtype=bool)
+            for start, end in ranges:
+                in_ranges |= (candidates >= start) & (candidates < end)
+            candidates = candidates[in_ranges]
+        return candidates
+    
+    def _semantic_similarities_for_rows(self, processed_queries: List[str], query_norm: np.ndarray, rows,
+                                        lexical_scores: np.ndarray = None) -> np.ndarray:
+        """
+        计算多个查询与选择的行的E、F、H列综合相似度
+        
+        Args:
+            processed_queries: 处理后的查询列表（已移除"绝对值"）
+            query_norm: 已归一化的查询embedding矩阵 (q, dim)
+            rows: slice(起始位置, 结束位置) 或升序的行位置数组（ANN候选行）
+            lexical_scores: 查询对全部行的字面得分 (q, n)（提供时按lexical_weight与语义得分融合）
+            
+        Returns:
+            综合相似度矩阵 (q, 行数)
+        """
+        similarities_e, similarities_f, similarities_h = self._column_similarities(processed_queries, query_norm, rows)
+        with self._stats.stage('search.combine'):
+            similarities_f, similarities_h = self._apply_ratio_penalty(processed_queries, rows, similarities_f, similarities_h)
+            combined = self._combine_similarities(similarities_e, similarities_f, similarities_h)
+            if lexical_scores is not None:
+                combined = self._fuse_lexical(combined, lexical_scores[:, rows])
+            return combined
+    
+    def _fuse_lexical(self, semantic: np.ndarray, lexical: np.ndarray) -> np.ndarray:
+        """语义得分与字面得分的线性融合：(1 - lexical_weight) * 语义 + lexical_weight * 字面"""
+        return (1.0 - self.lexical_weight) * semantic + self.lexical_weight * lexical
+    
+    def _column_similarities(self, processed_queries: List[str], query_norm: np.ndarray, rows,
+                             index: Dict = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        计算E、F、H列各自的相似度（F、H列已处理同义词和精确匹配）
+        
+        Args:
+            processed_queries: 处理后的查询列表
+            query_norm: 已归一化的查询embedding矩阵 (q, dim)
+            rows: slice(起始位置, 结束位置) 或升序的行位置数组
+            index: 使用的向量（默认float32向量；低精度扫描时为_scan_index）
+            
+        Returns:
+            (E列相似度, F列相似度, H列相似度)，每个形状为 (q, 行数)
+        """
+        fused = None if index is None else index['fused_embeddings']
+        f_synonym_index = self.f_synonym_index if index is None else index['f_synonym_index']
+        h_synonym_index = self.h_synonym_index if index is None else index['h_synonym_index']
+        
+        # 一次矩阵乘法计算与E、F、H列的相似度 (q, n)
+        with self._stats.stage('search.score_efh'):
+            similarities_e, base_similarities_f, base_similarities_h = self._calculate_similarity_fused(query_norm, rows, fused)
+        
+        with self._stats.stage('search.score_synonyms'):
+            # 计算F列相似度（处理分号分隔的同义词）
+            # 使用处理后的查询进行相似度计算，但保留原查询用于精确匹配检查
+            similarities_f = self._calculate_similarity_with_synonyms(
+                processed_queries, query_norm, base_similarities_f, f_synonym_index, self.first_word_index['f'], rows
+            )
+            
+            # 计算H列相似度（处理分号分隔的同义词）
+            similarities_h = self._calculate_similarity_with_synonyms(
+                processed_queries, query_norm, base_similarities_h, h_synonym_index, self.first_word_index['h'], rows
+            )
+        return similarities_e, similarities_f, similarities_h
+    
+    def _apply_ratio_penalty(self, processed_queries: List[str], rows, similarities_f: np.ndarray,
+                             similarities_h: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        查询不含"比值"或"Ratio"时，对F、H列中包含'/'的值降权（精确匹配的1.0不受影响）
         
+        Args:
+            processed_queries: 处理后的查询列表
+            rows: 相似度各列对应的行，slice(起始位置, 结束位置) 或升序的行位置数组
+            similarities_f, similarities_h: F、H列的相似度 (q, 行数)
+            
+        Returns:
+            降权后的 (F列相似度, H列相似度)
+        """
         # 检查查询中是否包含"比值"或"Ratio"（中英文都要检查）
         # 使用处理后的查询进行检查
-        query_lower = processed_query.lower()
-        has_ratio_keyword = '比值' in processed_query or 'ratio' in query_lower
+        has_ratio_keyword = np.array(
+            ['比值' in processed_query or 'ratio' in processed_query.lower() for processed_query in processed_queries],
+            dtype=bool
+        )
         
         # 如果查询中不含"比值"或"Ratio"，对F列和H列中包含'/'的值进行降权
-        # 使不含'/'的值的相似度高于含'/'的值
-        if not has_ratio_keyword:
-            # 对F列中包含'/'的值进行降权
-            for i, f_text in enumerate(f_texts):
-                if '/' in f_text and similarities_f[i] < 1.0:  # 精确匹配（1.0）不受影响
-                    similarities_f[i] *= 0.8  # 降权20%
-            
-            # 对H列中包含'/'的值进行降权
-            for i, h_text in enumerate(h_texts):
-                if '/' in h_text and similarities_h[i] < 1.0:  # 精确匹配（1.0）不受影响
-                    similarities_h[i] *= 0.8  # 降权20%
+        # 使不含'/'的值的相似度高于含'/'的值；精确匹配（1.0）不受影响
+        without_ratio = ~has_ratio_keyword[:, None]
+        similarities_f = np.where(
+            without_ratio & self.ratio_masks['f'][None, rows] & (similarities_f < 1.0),
+            similarities_f * 0.8,  # 降权20%
+            similarities_f
+        )
+        similarities_h = np.where(
+            without_ratio & self.ratio_masks['h'][None, rows] & (similarities_h < 1.0),
+            similarities_h * 0.8,  # 降权20%
+            similarities_h
+        )
+        return similarities_f, similarities_h
+    
+    @staticmethod
+    def _combine_similarities(similarities_e: np.ndarray, similarities_f: np.ndarray,
+                              similarities_h: np.ndarray) -> np.ndarray:
+        """
+        按F/H列优先的规则合并E、F、H列的相似度（F、H列已降权）
         
+        Returns:
+            综合相似度矩阵 (q, 行数)
+        """
         # 优先匹配F列和H列：优先使用F和H列的最大值
         # 计算F和H列的最大值（优先列）
         fh_max = np.maximum(similarities_f, similarities_h)
@@ -703,34 +2060,210 @@ class LabTestMatcher:
             )
         )
         
+        return max_similarities
+    
+    def _build_semantic_results(self, max_similarities: np.ndarray, positions: np.ndarray, top_k: int) -> List[Dict]:
+        """
+        根据单个查询的综合相似度构建前top_k个语义匹配结果
+        
+        Args:
+            max_similarities: 综合相似度数组 (m,)
+            positions: 每个相似度对应的行位置 (m,)
+            top_k: 返回前k个结果
+            
+        Returns:
+            结果列表
+        """
         # 对结果进行排序，确保精确匹配排在前面
-        # 使用稳定的排序，对于相同相似度的结果，保持原有顺序
-        # 为了确保精确匹配排在前面，我们可以给精确匹配添加一个小的偏移量
-        sort_key = max_similarities.copy()
-        # 对于精确匹配，添加一个小的偏移量确保排在前面（但不超过1.0）
-        # 实际上，由于精确匹配已经是1.0，它们会自动排在前面
-        # 但为了确保稳定性，我们使用稳定的排序
-        top_indices = np.argsort(-sort_key, kind='stable')[:top_k]  # 降序排序，取前top_k个
+        # 相同相似度的结果按Excel中的原有顺序排列
+        # 由于精确匹配已经是1.0，它们会自动排在前面
+        with self._stats.stage('search.rerank'):
+            top_indices = self._top_k_indices(max_similarities, top_k, self.row_ranks[positions])  # 降序，取前top_k个
         
         # 构建结果列表
-        results = []
-        for idx in top_indices:
-            row = self.data.iloc[idx]
-            e_value = row[e_col] if pd.notna(row[e_col]) else ""
-            f_value = row[f_col] if pd.notna(row[f_col]) else ""
-            h_value = row[h_col] if pd.notna(row[h_col]) else ""
-            
-            results.append({
-                'similarity': float(max_similarities[idx]),
-                'e_value': str(e_value) if e_value else "",
-                'f_value': str(f_value) if f_value else "",
-                'h_value': str(h_value) if h_value else "",
-                'is_exact_match': False,  # 标记为语义匹配
-                'row_index': int(self.data.index[idx])
-            })
+        with self._stats.stage('search.assemble'):
+            results = []
+            for i in top_indices:
+                idx = positions[i]
+                results.append({
+                    'similarity': float(max_similarities[i]),
+                    'e_value': self.row_texts['e'][idx],
+                    'f_value': self.row_texts['f'][idx],
+                    'h_value': self.row_texts['h'][idx],
+                    'is_exact_match': False,  # 标记为语义匹配
+                    'row_index': int(self.row_labels[idx])
+                })
+                if len(self.ct_versions) > 1:
+                    # 多个CT版本时标记该行所属的版本及其在各版本中的行索引
+                    results[-1]['ct_versions'] = {
+                        version: int(label) for version, label in zip(self.ct_versions, self.version_row_labels[:, idx])
+                        if label >= 0
+                    }
         
         return results
     
+    def _version_row_index(self, results: List[Dict], ct_versions) -> List[Dict]:
+        """
+        指定了CT版本时，语义匹配结果的row_index改为该行在第一个指定版本中的行索引
+        （不指定时为第一个包含该行的版本中的行索引）
+        """
+        version_bits = self._resolve_ct_versions(ct_versions)
+        if version_bits is None or len(self.ct_versions) == 1:
+            return results
+        targets = [version for v, version in enumerate(self.ct_versions) if version_bits >> v & 1]
+        for result in results:
+            result['row_index'] = next(result['ct_versions'][version] for version in targets
+                                       if version in result['ct_versions'])
+        return results
+    
+    def search_top_matches(self, query: str, top_k: int =10, codelists=None, ct_versions=None) -> List[Dict]:
+        """
+        搜索与查询最相似的前k个检查项目
+        
+        第一步：先在映射文件中进行精确匹配（忽略大小写）
+        - 中文输入优先匹配F列，英文输入优先匹配G列
+        - 如果匹配成功，直接返回映射文件的结果（A、E、F、G列）
+        
+        第二步：如果精确匹配失败，进行语义匹配
+        - 与SDTM Terminology.xls的E、F、H列进行语义匹配
+        - 返回前top_k个结果（默认10）
+        
+        Args:
+            query: 用户输入的检查项目名称（支持中英文）
+            top_k: 返回前k个结果，默认10（仅用于语义匹配）
+            codelists: 语义匹配只在这些Codelist中进行（Codelist Name或其列表，忽略大小写；默认不限制），
+                       例如 "Laboratory Test Code"
+            ct_versions: 语义匹配只在这些CT版本中进行（版本名或其列表，忽略大小写；默认全部已加载的版本）
+            
+        Returns:
+            结果列表，每个结果包含：
+            - similarity: 相似度分数
+            - a_value: A列值（仅精确匹配时返回）
+            - e_value: E列值
+            - f_value: F列值
+            - g_value: G列值（仅精确匹配时返回）
+            - h_value: H列值（仅语义匹配时返回）
+            - is_exact_match: 是否为精确匹配
+            - row_index: 原始行索引（指定ct_versions时为在第一个指定版本中的行索引）
+            - ct_versions: 该行所属的CT版本 {版本名: 在该版本中的行索引}（仅加载了多个CT版本时的语义匹配结果）
+            - is_lexical_match: 字面得分足够置信、未调用模型编码的结果为True（此时similarity为字面得分）
+        """
+        self._stats.increment('queries')
+        # 第一步：尝试精确匹配
+        with self._stats.stage('search.exact_lookup'):
+            exact_match_results = self._exact_match_in_mapping(query)
+        if exact_match_results:
+            self._stats.increment('exact_hits')
+            print(f"在映射文件中找到精确匹配: {len(exact_match_results)} 条结果", file=sys.stderr, flush=True)
+            return exact_match_results
+        else:
+            print(f"映射文件中未找到精确匹配，将进行语义匹配", file=sys.stderr, flush=True)
+        
+        # 第二步：精确匹配失败，进行语义匹配
+        if self.row_count == 0:
+            return []
+        
+        self._check_semantic_ready()
+        
+        # 处理查询：忽略"绝对值"（Absolute Value）
+        self._stats.increment('semantic_queries')
+        with self._stats.stage('search.preprocess'):
+            processed_query = self._preprocess_query(query)
+        
+        ranges = self._resolve_codelists(codelists, ct_versions)
+        
+        # 字面得分足够置信时不调用模型编码
+        lexical_scores = self._lexical_scores([query])
+        if lexical_scores is not None:
+            lexical_results = self._lexical_results(lexical_scores[0], ranges, top_k)
+            if lexical_results is not None:
+                self._stats.increment('lexical_hits')
+                return self._version_row_index(lexical_results, ct_versions)
+        
+        # 计算查询的embedding（带缓存）
+        query_embedding = self._encode_queries([processed_query])
+        
+        results = self._semantic_search([processed_query], query_embedding, ranges, top_k, lexical_scores)[0]
+        return self._version_row_index(results, ct_versions)
+    
+    def search_top_matches_batch(self, queries: List[str], top_k: int = 10, codelists=None,
+                                 ct_versions=None) -> List[List[Dict]]:
+        """
+        批量搜索多个查询（结果与逐个调用search_top_matches相同，包括并列结果的顺序）
+        
+        先对每个查询进行映射文件精确匹配；其余需要语义匹配的查询只调用一次model.encode，
+        并通过矩阵乘法一次性计算与E、F、H列的近似相似度，候选行再逐个查询精确重新打分（见_scan_top_k）
+        
+        Args:
+            queries: 查询字符串列表
+            top_k: 每个查询返回前k个结果，默认10（仅用于语义匹配）
+            codelists: 语义匹配只在这些Codelist中进行（同search_top_matches）
+            ct_versions: 语义匹配只在这些CT版本中进行（同search_top_matches）
+            
+        Returns:
+            与queries一一对应的结果列表
+        """
+        all_results = [None] * len(queries)
+        
+        # 第一步：逐个尝试精确匹配（字典查找）
+        semantic_positions = []
+        with self._stats.stage('search.exact_lookup'):
+            for pos, query in enumerate(queries):
+                exact_match_results = self._exact_match_in_mapping(query)
+                if exact_match_results:
+                    all_results[pos] = exact_match_results
+                else:
+                    semantic_positions.append(pos)
+        self._stats.increment('batch_calls')
+        self._stats.increment('queries', len(queries))
+        self._stats.increment('exact_hits', len(queries) - len(semantic_positions))
+        
+        print(f"批量查询: {len(queries)} 条，精确匹配 {len(queries) - len(semantic_positions)} 条，"
+              f"语义匹配 {len(semantic_positions)} 条", file=sys.stderr, flush=True)
+        
+        if not semantic_positions:
+            return all_results
+        
+        # 第二步：对剩余查询进行语义匹配
+        if self.row_count == 0:
+            for pos in semantic_positions:
+                all_results[pos] = []
+            return all_results
+        
+        self._check_semantic_ready()
+        
+        self._stats.increment('semantic_queries', len(semantic_positions))
+        with self._stats.stage('search.preprocess'):
+            processed_queries = [self._preprocess_query(queries[pos]) for pos in semantic_positions]
+        
+        ranges = self._resolve_codelists(codelists, ct_versions)
+        
+        # 字面得分足够置信的查询不调用模型编码
+        lexical_scores = self._lexical_scores([queries[pos] for pos in semantic_positions])
+        remaining = list(range(len(processed_queries)))
+        if lexical_scores is not None:
+            remaining = []
+            for i, pos in enumerate(semantic_positions):
+                lexical_results = self._lexical_results(lexical_scores[i], ranges, top_k)
+                if lexical_results is None:
+                    remaining.append(i)
+                else:
+                    all_results[pos] = self._version_row_index(lexical_results, ct_versions)
+            self._stats.increment('lexical_hits', len(processed_queries) - len(remaining))
+            if not remaining:
+                return all_results
+            lexical_scores = lexical_scores[remaining]
+        processed_queries = [processed_queries[i] for i in remaining]
+        
+        # 一次性批量计算所有查询的embedding（已缓存的查询不再编码）
+        query_embeddings = self._encode_queries(processed_queries)
+        
+        semantic_results = self._semantic_search(processed_queries, query_embeddings, ranges, top_k, lexical_scores)
+        for i, results in zip(remaining, semantic_results):
+            all_results[semantic_positions[i]] = self._version_row_index(results, ct_versions)
+        
+        return all_results
+    
     def format_results_json(self, results: List[Dict]) -> Dict:
         """
         将结果格式化为JSON格式
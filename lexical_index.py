@@ -0,0 +1,157 @@
+"""
+字符n-gram倒排索引（TF-IDF）
+对CT的E列和F、H列的同义词按字符n-gram建立倒排索引，查询与每个文本的TF-IDF余弦相似度作为字面得分，
+每行的字面得分为该行各文本得分的最大值。不需要embedding模型，缩写和拼写错误的代码（如"HGB"、"ALT(SGPT)"）
+也能得到较高的得分
+
+倒排表按n-gram排列（CSR：indptr + 文本编号 + 权重），查询只读取查询中的n-gram对应的倒排表
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from index_bundle import open_bundle, write_bundle
+from table_snapshot import decode_strings, encode_strings
+
+LEXICAL_VERSION = 1
+DEFAULT_NGRAM = 3
+
+
+def char_ngrams(text: str, n: int = DEFAULT_NGRAM) -> Dict[str, int]:
+    """
+    文本的字符n-gram及出现次数（小写，连续空白合并为一个空格，首尾各补一个空格）
+
+    例如n=3时 "HGB" -> {' hg': 1, 'hgb': 1, 'gb ': 1}
+    """
+    normalized = ' '.join(str(text).lower().split())
+    if not normalized:
+        return {}
+    padded = f" {normalized} "
+    counts = {}
+    for i in range(max(1, len(padded) - n + 1)):
+        gram = padded[i:i + n]
+        counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+class NgramIndex:
+    """字符n-gram的TF-IDF倒排索引（构建后只读）"""
+
+    def __init__(self, grams: List[str], indptr: np.ndarray, postings: np.ndarray, weights: np.ndarray,
+                 idf: np.ndarray, text_rows: np.ndarray, row_count: int, ngram: int = DEFAULT_NGRAM):
+        """
+        Args:
+            grams: n-gram列表（下标为n-gram编号）
+            indptr: 每个n-gram的倒排表在postings中的范围 (G + 1,)
+            postings: 倒排表中的文本编号 (nnz,)
+            weights: 倒排表中的归一化TF-IDF权重 (nnz,)
+            idf: 每个n-gram的IDF (G,)
+            text_rows: 每个文本所属的行位置 (T,)
+            row_count: 行数
+            ngram: n-gram长度
+        """
+        self.vocabulary = {gram: i for i, gram in enumerate(grams)}
+        self.indptr = indptr
+        self.postings = postings
+        self.weights = weights
+        self.idf = idf
+        self.text_rows = text_rows
+        self.row_count = row_count
+        self.ngram = ngram
+        # 不在索引中的n-gram按只出现在0个文本中计算IDF（拼写错误会降低得分）
+        self.unknown_idf = float(np.log(len(text_rows) + 1.0) + 1.0)
+
+    @classmethod
+    def build(cls, texts: List[str], text_rows: np.ndarray, row_count: int, ngram: int = DEFAULT_NGRAM) -> 'NgramIndex':
+        """
+        构建索引
+
+        Args:
+            texts: 文本列表
+            text_rows: 每个文本所属的行位置 (T,)
+            row_count: 行数
+            ngram: n-gram长度
+        """
+        vocabulary = {}
+        gram_ids, counts, text_ids = [], [], []
+        for t, text in enumerate(texts):
+            for gram, count in char_ngrams(text, ngram).items():
+                gram_ids.append(vocabulary.setdefault(gram, len(vocabulary)))
+                counts.append(count)
+                text_ids.append(t)
+        gram_ids = np.asarray(gram_ids, dtype=np.int64)
+        text_ids = np.asarray(text_ids, dtype=np.int32)
+        text_count = len(texts)
+
+        # 平滑的IDF：log((T + 1) / (df + 1)) + 1；每个文本的TF-IDF向量归一化为单位长度
+        df = np.bincount(gram_ids, minlength=len(vocabulary))
+        idf = (np.log((text_count + 1.0) / (df + 1.0)) + 1.0).astype(np.float32)
+        weights = np.asarray(counts, dtype=np.float32) * idf[gram_ids]
+        norms = np.sqrt(np.bincount(text_ids, weights=weights.astype(np.float64) ** 2, minlength=text_count))
+        weights /= np.where(norms > 0, norms, 1.0)[text_ids].astype(np.float32)
+
+        order = np.argsort(gram_ids, kind='stable')
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(df)
+        return cls(list(vocabulary), indptr, text_ids[order], weights[order], idf,
+                   np.asarray(text_rows, dtype=np.int64), row_count, ngram)
+
+    def save(self, path: str, meta: Dict):
+        """保存为索引文件（meta中追加版本、n-gram长度和行数）"""
+        grams = [None] * len(self.vocabulary)
+        for gram, i in self.vocabulary.items():
+            grams[i] = gram
+        gram_data, gram_offsets, _ = encode_strings(grams)
+        meta = dict(meta, lexical_version=LEXICAL_VERSION, ngram=self.ngram, row_count=self.row_count)
+        write_bundle(path, meta=meta, sections={
+            'gram_data': gram_data, 'gram_offsets': gram_offsets, 'indptr': self.indptr,
+            'postings': self.postings, 'weights': self.weights, 'idf': self.idf, 'text_rows': self.text_rows
+        })
+
+    @classmethod
+    def load(cls, path: str) -> Tuple[Dict, 'NgramIndex']:
+        """以只读内存映射方式读取索引文件，返回 (元数据, 索引)"""
+        meta, sections = open_bundle(path, mmap_mode='r')
+        if meta.get('lexical_version') != LEXICAL_VERSION:
+            raise ValueError(f"不支持的字面索引版本: {meta.get('lexical_version')}")
+        grams = decode_strings(sections['gram_data'], sections['gram_offsets'])
+        return meta, cls(grams, sections['indptr'], sections['postings'], sections['weights'], sections['idf'],
+                         sections['text_rows'], meta['row_count'], meta['ngram'])
+
+    def _query_vector(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """查询的归一化TF-IDF向量中在索引内的部分 (n-gram编号, 权重)"""
+        ids, weights, norm = [], [], 0.0
+        for gram, count in char_ngrams(query, self.ngram).items():
+            gram_id = self.vocabulary.get(gram)
+            weight = count * (self.unknown_idf if gram_id is None else float(self.idf[gram_id]))
+            norm += weight * weight
+            if gram_id is not None:
+                ids.append(gram_id)
+                weights.append(weight)
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return np.asarray(ids, dtype=np.int64), np.asarray(weights) / np.sqrt(norm)
+
+    def scores(self, queries: List[str]) -> np.ndarray:
+        """
+        每个查询对每行的字面得分（该行各文本与查询的TF-IDF余弦相似度的最大值，范围0~1）
+
+        Returns:
+            得分矩阵 (q, row_count) float32
+        """
+        result = np.zeros((len(queries), self.row_count), dtype=np.float32)
+        text_count = len(self.text_rows)
+        for q, query in enumerate(queries):
+            ids, query_weights = self._query_vector(query)
+            if not len(ids):
+                continue
+            starts, ends = self.indptr[ids], self.indptr[ids + 1]
+            text_ids = np.concatenate([self.postings[s:e] for s, e in zip(starts, ends)])
+            products = np.concatenate([self.weights[s:e] * w for s, e, w in zip(starts, ends, query_weights)])
+            text_scores = np.bincount(text_ids, weights=products, minlength=text_count)
+            matched = np.flatnonzero(text_scores)
+            # 舍入误差可能使完全相同的文本略大于1
+            matched_scores = np.minimum(text_scores[matched], 1.0).astype(np.float32)
+            np.maximum.at(result[q], self.text_rows[matched], matched_scores)
+        return result
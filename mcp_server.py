@@ -0,0 +1,107 @@
+"""
+检查项目匹配的MCP服务器（stdio传输）
+服务器进程启动时加载一次匹配器（数据、embedding缓存），并在后台线程预热模型，
+之后所有工具调用共享这个匹配器，不再为每次会话冷启动
+
+注意：stdout用于MCP协议通信，所有日志都输出到stderr
+
+在MCP客户端中配置：
+    {"command": "python", "args": ["mcp_server.py"], "cwd": "<项目目录>"}
+"""
+
+import sys
+from typing import Dict, List, Optional, Union
+
+from mcp.server.fastmcp import FastMCP
+
+from lab_test_matcher import LabTestMatcher
+
+mcp = FastMCP("testcd-matcher")
+
+_matcher: Optional[LabTestMatcher] = None
+
+
+def get_matcher() -> LabTestMatcher:
+    """获取共享的匹配器（首次调用时加载，之后复用）"""
+    global _matcher
+    if _matcher is None:
+        _matcher = LabTestMatcher(warmup_model=True)
+    return _matcher
+
+
+@mcp.tool()
+def search_lab_test(query: str, top_k: int = 10, codelists: Optional[Union[str, List[str]]] = None,
+                    ct_versions: Optional[Union[str, List[str]]] = None) -> Dict:
+    """
+    根据检查项目名称（中文或英文）查找对应的TESTCD。
+    先在映射文件中精确匹配；未命中时在SDTM Terminology中做语义匹配，返回相似度最高的top_k个结果。
+
+    Args:
+        query: 检查项目名称，例如 "血红蛋白" 或 "Hemoglobin"
+        top_k: 语义匹配返回的结果数量（默认10）
+        codelists: 语义匹配只在这些Codelist中进行（Codelist Name或其列表，例如 "Laboratory Test Code"）
+        ct_versions: 语义匹配只在这些CT版本中进行（版本名或其列表，见list_ct_versions；默认全部版本）
+
+    Returns:
+        {"total_matches": 结果数, "results": [...]}（加载了多个CT版本时，语义匹配结果带有ct_versions）
+    """
+    matcher = get_matcher()
+    return matcher.format_results_json(matcher.search_top_matches(query, top_k=top_k, codelists=codelists,
+                                                                  ct_versions=ct_versions))
+
+
+@mcp.tool()
+def search_lab_tests_batch(queries: List[str], top_k: int = 10,
+                           codelists: Optional[Union[str, List[str]]] = None,
+                           ct_versions: Optional[Union[str, List[str]]] = None) -> Dict:
+    """
+    批量查找多个检查项目名称对应的TESTCD（所有需要语义匹配的查询只做一次模型编码）。
+
+    Args:
+        queries: 检查项目名称列表
+        top_k: 每个查询语义匹配返回的结果数量（默认10）
+        codelists: 语义匹配只在这些Codelist中进行
+        ct_versions: 语义匹配只在这些CT版本中进行
+
+    Returns:
+        {"results": [{"query": 查询, "total_matches": 结果数, "results": [...]}, ...]}，与queries一一对应
+    """
+    matcher = get_matcher()
+    batch_results = matcher.search_top_matches_batch(queries, top_k=top_k, codelists=codelists,
+                                                     ct_versions=ct_versions)
+    return {'results': [dict(query=query, **matcher.format_results_json(results))
+                        for query, results in zip(queries, batch_results)]}
+
+
+@mcp.tool()
+def list_codelists() -> Dict:
+    """
+    列出可用于codelists参数的Codelist Name及其行数。
+
+    Returns:
+        {Codelist Name: 行数}
+    """
+    return get_matcher().list_codelists()
+
+
+@mcp.tool()
+def list_ct_versions() -> Dict:
+    """
+    列出已加载、可用于ct_versions参数的CT版本及其行数。
+
+    Returns:
+        {版本名: 行数}
+    """
+    return get_matcher().list_ct_versions()
+
+
+def main():
+    # 在接受连接前加载匹配器，第一个工具调用不承担数据和embedding的加载开销
+    print("正在加载匹配器...", file=sys.stderr, flush=True)
+    get_matcher()
+    print("匹配器已就绪，MCP服务器启动（stdio）", file=sys.stderr, flush=True)
+    mcp.run(transport="stdio")
+
+
+if __name__ == "__main__":
+    main()
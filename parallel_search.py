@@ -0,0 +1,142 @@
+"""
+多进程分片的语义打分
+工作进程以内存映射方式打开同一个embedding索引文件（共享页缓存，不复制向量），
+每个任务计算一部分查询与一部分行的综合相似度，只返回每个查询的前top_k个（精确相似度, 行位置）。
+主进程合并各分片的候选后，用与单进程相同的排序规则（相似度降序，并列按原有顺序）取前top_k个；
+精确相似度与分片方式无关（见LabTestMatcher._scan_top_k），因此结果与单进程相同
+
+- 查询数不少于进程数时按查询分片（每个任务计算一部分查询与全部行）
+- 否则按行分片（每个任务计算全部查询与一段连续的行）
+"""
+
+import multiprocessing
+import os
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+_worker_matcher = None  # 工作进程中只负责打分的匹配器
+_BLAS_THREAD_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+def _init_worker(state: Dict):
+    global _worker_matcher
+    from lab_test_matcher import LabTestMatcher
+    _worker_matcher = LabTestMatcher._from_scoring_state(state)
+
+
+def _score_task(processed_queries: List[str], query_embeddings: np.ndarray,
+                ranges: List[Tuple[int, int]], top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """在工作进程中计算一个分片，返回每个查询的前top_k个 (精确相似度, 行位置)"""
+    matcher = _worker_matcher
+    query_norm = matcher._normalize_rows(np.atleast_2d(query_embeddings))
+    selections = [slice(start, end) for start, end in ranges]
+    shard_results = []
+    for scores, positions in matcher._scan_top_k(processed_queries, query_norm, selections, top_k):
+        top = matcher._top_k_indices(scores, top_k, matcher.row_ranks[positions])
+        shard_results.append((scores[top], positions[top]))
+    return shard_results
+
+
+def split_ranges(ranges: List[Tuple[int, int]], parts: int) -> List[List[Tuple[int, int]]]:
+    """
+    把行范围列表按行数均分为最多parts份（每份仍是行范围列表，保持行的顺序）
+    """
+    total = sum(end - start for start, end in ranges)
+    parts = max(1, min(parts, total))
+    bounds = [total * i // parts for i in range(parts + 1)]
+    shards = []
+    for begin, finish in zip(bounds[:-1], bounds[1:]):
+        shard = []
+        offset = 0
+        for start, end in ranges:
+            length = end - start
+            lo, hi = max(begin - offset, 0), min(finish - offset, length)
+            if lo < hi:
+                shard.append((start + lo, start + hi))
+            offset += length
+        shards.append(shard)
+    return shards
+
+
+@contextmanager
+def _single_threaded_blas():
+    """启动工作进程时让每个进程的BLAS只用一个线程，避免多进程 x 多线程抢占CPU"""
+    saved = {name: os.environ.get(name) for name in _BLAS_THREAD_VARS}
+    for name in _BLAS_THREAD_VARS:
+        os.environ[name] = "1"
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+class ShardedScorer:
+    """用进程池并行计算语义相似度（结果与单进程的排序一致）"""
+
+    def __init__(self, matcher, workers: int):
+        """
+        Args:
+            matcher: 已加载embedding的匹配器（只用于读取打分状态和合并结果）
+            workers: 工作进程数
+        """
+        self.matcher = matcher
+        self.workers = workers
+        # 使用spawn：主进程中可能已有模型和预热线程，fork不安全
+        context = multiprocessing.get_context('spawn')
+        with _single_threaded_blas():
+            self._pool = context.Pool(workers, initializer=_init_worker, initargs=(matcher._scoring_state(),))
+
+    def search(self, processed_queries: List[str], query_embeddings: np.ndarray,
+               ranges: List[Tuple[int, int]], top_k: int) -> List[List[Dict]]:
+        """
+        并行计算语义匹配结果
+
+        Args:
+            processed_queries: 处理后的查询列表
+            query_embeddings: 查询的embedding矩阵 (q, dim)
+            ranges: 行范围列表（None表示全部行）
+            top_k: 每个查询返回前k个结果
+
+        Returns:
+            与processed_queries一一对应的结果列表
+        """
+        if ranges is None:
+            ranges = [(0, len(self.matcher.row_labels))]
+        query_embeddings = np.atleast_2d(query_embeddings)
+        query_count = len(processed_queries)
+
+        if query_count >= self.workers:
+            bounds = [query_count * i // self.workers for i in range(self.workers + 1)]
+            tasks = [(list(range(begin, end)), ranges) for begin, end in zip(bounds[:-1], bounds[1:]) if begin < end]
+        else:
+            tasks = [(list(range(query_count)), shard) for shard in split_ranges(ranges, self.workers) if shard]
+
+        pending = [
+            (query_ids, self._pool.apply_async(
+                _score_task, ([processed_queries[q] for q in query_ids], query_embeddings[query_ids], shard, top_k)
+            ))
+            for query_ids, shard in tasks
+        ]
+
+        candidates = [[] for _ in range(query_count)]
+        for query_ids, result in pending:
+            for q, shard_result in zip(query_ids, result.get()):
+                candidates[q].append(shard_result)
+
+        all_results = []
+        for shard_results in candidates:
+            scores = np.concatenate([shard_scores for shard_scores, _ in shard_results])
+            positions = np.concatenate([shard_positions for _, shard_positions in shard_results])
+            all_results.append(self.matcher._build_semantic_results(scores, positions, top_k))
+        return all_results
+
+    def close(self):
+        """关闭进程池"""
+        self._pool.terminate()
+        self._pool.join()
@@ -0,0 +1,55 @@
+"""
+输入联想的前缀索引
+按归一化键（小写、合并空白）排序的数组，前缀查询用二分查找定位第一个匹配的键，
+之后顺序取出前k个，耗时为 O(log n + k)，不需要embedding模型
+"""
+
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+
+def normalize_key(text: str) -> str:
+    """前缀索引的归一化键：小写，去除首尾空白，连续空白合并为一个空格"""
+    return ' '.join(str(text).lower().split())
+
+
+class PrefixIndex:
+    """排序数组 + 二分查找的前缀索引（构建后只读，可以在多个线程中同时查询）"""
+
+    def __init__(self, entries: Iterable[Tuple[str, str]]):
+        """
+        Args:
+            entries: (显示文本, 来源) 序列；归一化键相同的文本只保留第一个
+        """
+        first = {}
+        for text, source in entries:
+            text = str(text).strip()
+            key = normalize_key(text)
+            if key and key not in first:
+                first[key] = (text, source)
+        self.keys = sorted(first)
+        self.texts = [first[key][0] for key in self.keys]
+        self.sources = [first[key][1] for key in self.keys]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def suggest(self, prefix: str, k: int = 10) -> List[Dict]:
+        """
+        返回以prefix开头的前k个候选（忽略大小写）
+
+        候选按归一化键的字典序排列：与前缀完全相同的键排在最前，较短的词排在以它开头的较长的词之前
+
+        Returns:
+            [{'text': 显示文本, 'source': 来源}, ...]
+        """
+        key = normalize_key(prefix)
+        if not key or k <= 0:
+            return []
+        suggestions = []
+        start = bisect_left(self.keys, key)
+        for i in range(start, min(len(self.keys), start + k)):
+            if not self.keys[i].startswith(key):
+                break
+            suggestions.append({'text': self.texts[i], 'source': self.sources[i]})
+        return suggestions
@@ -0,0 +1,247 @@
+"""
+查询embedding缓存
+两级缓存：进程内LRU缓存 + 可选的磁盘持久化存储（SQLite），重启后仍可命中
+磁盘存储按最近使用顺序限制条目数，写入积累到一定数量或间隔一定时间后才提交，不在每次查询时同步写盘
+"""
+
+import atexit
+import os
+import sys
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 未提交的写入达到此数量，或距上次提交超过此时间（秒）时提交
+COMMIT_BATCH = 256
+COMMIT_INTERVAL = 5.0
+
+# 打开了磁盘存储的缓存，进程退出时提交未提交的写入
+_open_caches = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_caches():
+    for cache in list(_open_caches):
+        cache.flush()
+
+
+class QueryEmbeddingCache:
+    """查询embedding的两级缓存，键为 (模型名称, 处理后的查询)"""
+
+    def __init__(self, max_size: int = 4096, db_path: str = None, disk_size: int = 65536):
+        """
+        初始化缓存
+
+        Args:
+            max_size: 内存LRU缓存的最大条目数（0表示不使用内存缓存）
+            db_path: 磁盘存储的SQLite文件路径（None表示不持久化）
+            disk_size: 磁盘存储的最大条目数，超出时删除最久未使用的条目
+        """
+        self.max_size = max_size
+        self.db_path = db_path
+        self.disk_size = disk_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._clock = 0  # 磁盘条目的最近使用序号
+        self._pending = 0  # 未提交的写入数
+        self._last_commit = time.monotonic()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if db_path:
+            self._open_disk_store(db_path)
+
+    def _open_disk_store(self, db_path: str):
+        """打开磁盘存储，失败时只使用内存缓存"""
+        try:
+            cache_dir = os.path.dirname(db_path)
+            if cache_dir and not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            # WAL模式下synchronous=NORMAL的提交不需要fsync
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(query_embeddings)")]
+            if columns and 'last_used' not in columns:
+                # 旧版本的表没有使用顺序，直接重建
+                self._conn.execute("DROP TABLE query_embeddings")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model TEXT NOT NULL, query TEXT NOT NULL, embedding BLOB NOT NULL, last_used INTEGER NOT NULL, "
+                "PRIMARY KEY (model, query))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS query_embeddings_last_used ON query_embeddings (last_used)"
+            )
+            self._clock = self._conn.execute("SELECT MAX(last_used) FROM query_embeddings").fetchone()[0] or 0
+            self._conn.commit()
+            _open_caches.add(self)
+        except sqlite3.Error as e:
+            print(f"警告: 无法打开查询embedding磁盘缓存: {e}，将只使用内存缓存", file=sys.stderr, flush=True)
+            self._conn = None
+
+    def _commit(self, force: bool = False):
+        """
+        提交积累的磁盘写入（调用方持有锁）：未提交的写入足够多、距上次提交足够久或force时提交，
+        提交前删除超出disk_size的最久未使用的条目
+        """
+        if self._conn is None or not self._pending:
+            return
+        if not force and self._pending < COMMIT_BATCH and time.monotonic() - self._last_commit < COMMIT_INTERVAL:
+            return
+        try:
+            excess = self._conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0] - self.disk_size
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM query_embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM query_embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"警告: 写入查询embedding磁盘缓存失败: {e}", file=sys.stderr, flush=True)
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def flush(self):
+        """立即提交积累的磁盘写入"""
+        with self._lock:
+            self._commit(force=True)
+
+    def close(self):
+        """提交积累的写入并关闭磁盘存储"""
+        with self._lock:
+            self._commit(force=True)
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, key: Tuple[str, str], embedding: np.ndarray):
+        """写入内存LRU缓存（调用方持有锁）"""
+        if self.max_size <= 0:
+            return
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model_name: str, queries: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        批量查找查询embedding
+
+        Args:
+            model_name: 模型名称
+            queries: 处理后的查询列表
+
+        Returns:
+            与queries一一对应的embedding列表，未命中的位置为None
+        """
+        results = [None] * len(queries)
+        with self._lock:
+            disk_lookups = []
+            for pos, query in enumerate(queries):
+                key = (model_name, query)
+                embedding = self._memory.get(key)
+                if embedding is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    results[pos] = embedding
+                else:
+                    disk_lookups.append(pos)
+
+            hits = []
+            for pos in disk_lookups:
+                embedding = None
+                if self._conn is not None:
+                    try:
+                        row = self._conn.execute(
+                            "SELECT embedding FROM query_embeddings WHERE model = ? AND query = ?",
+                            (model_name, queries[pos])
+                        ).fetchone()
+                    except sqlite3.Error:
+                        row = None
+                    if row is not None:
+                        embedding = np.frombuffer(row[0], dtype=np.float32).copy()
+                if embedding is not None:
+                    self.disk_hits += 1
+                    self._remember((model_name, queries[pos]), embedding)
+                    results[pos] = embedding
+                    hits.append(queries[pos])
+                else:
+                    self.misses += 1
+
+            if hits:
+                # 更新磁盘条目的使用顺序（与写入一起延后提交）
+                try:
+                    self._conn.executemany(
+                        "UPDATE query_embeddings SET last_used = ? WHERE model = ? AND query = ?",
+                        [(self._clock + i + 1, model_name, query) for i, query in enumerate(hits)]
+                    )
+                    self._clock += len(hits)
+                    self._pending += len(hits)
+                    self._commit()
+                except sqlite3.Error:
+                    pass
+        return results
+
+    def put_many(self, model_name: str, queries: List[str], embeddings: np.ndarray):
+        """
+        批量写入查询embedding
+
+        Args:
+            model_name: 模型名称
+            queries: 处理后的查询列表
+            embeddings: 对应的embedding矩阵 (q, dim)
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            for query, embedding in zip(queries, embeddings):
+                self._remember((model_name, query), embedding.copy())
+
+            if self._conn is not None:
+                try:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO query_embeddings (model, query, embedding, last_used) VALUES (?, ?, ?, ?)",
+                        [(model_name, query, embedding.tobytes(), self._clock + i + 1)
+                         for i, (query, embedding) in enumerate(zip(queries, embeddings))]
+                    )
+                    self._clock += len(queries)
+                    self._pending += len(queries)
+                    self._commit()
+                except sqlite3.Error as e:
+                    print(f"警告: 写入查询embedding磁盘缓存失败: {e}", file=sys.stderr, flush=True)
+
+    def info(self) -> Dict:
+        """
+        返回缓存统计信息
+
+        Returns:
+            包含memory_hits、disk_hits、misses、hit_rate、size、max_size、persistent、disk_size的字典
+        """
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'size': len(self._memory),
+                'max_size': self.max_size,
+                'persistent': self._conn is not None,
+                'disk_size': self.disk_size
+            }
+
+    def clear(self):
+        """清空内存缓存并重置计数（不删除磁盘存储）"""
+        with self._lock:
+            self._memory.clear()
+            self.memory_hits = 0
+            self.disk_hits = 0
+            self.misses = 0
@@ -0,0 +1,282 @@
+"""
+检查项目匹配的本地HTTP服务
+进程内只有一个LabTestMatcher；并发到达的请求在几毫秒内合并为一批，
+只调用一次search_top_matches_batch（一次模型编码 + 一次矩阵乘法）
+
+接口：
+    GET  /health        服务与模型状态、批处理统计
+    GET  /suggest?prefix=血红&k=10   输入联想（前缀索引，不调用模型，不经过批处理）
+    POST /search        {"query": "血红蛋白", "top_k": 10, "codelists": ["Laboratory Test Code"], "ct_versions": "2024-03-29"}
+    POST /search/batch  {"queries": ["血红蛋白", "ALT"], "top_k": 10, "codelists": null, "ct_versions": null}
+
+运行：
+    python search_service.py --port 8765 --max-batch-size 32 --max-wait-ms 5
+"""
+
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlsplit
+
+from lab_test_matcher import LabTestMatcher
+
+try:
+    from config import SERVICE_HOST, SERVICE_PORT, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+except ImportError:
+    import os
+    SERVICE_HOST = os.getenv('SERVICE_HOST', "127.0.0.1")
+    SERVICE_PORT = int(os.getenv('SERVICE_PORT', "8765"))
+    BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', "32"))
+    BATCH_MAX_WAIT_MS = float(os.getenv('BATCH_MAX_WAIT_MS', "5"))
+
+MAX_BODY_BYTES = 1 << 20  # 请求体最大1MB
+
+
+class MicroBatcher:
+    """把并发提交的查询合并为批量查询，由一个工作线程依次执行（匹配器不会被并发调用）"""
+
+    def __init__(self, matcher: LabTestMatcher, max_batch_size: int = 32, max_wait_ms: float = 5):
+        """
+        Args:
+            matcher: 共享的匹配器
+            max_batch_size: 一批最多包含的查询数
+            max_wait_ms: 收到一批中的第一个查询后，最多再等待多少毫秒收集后续查询
+        """
+        self.matcher = matcher
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.batch_count = 0
+        self.query_count = 0
+        self._worker = threading.Thread(target=self._run, name="search-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, query: str, top_k: int = 10, codelists=None, ct_versions=None) -> Future:
+        """
+        提交一个查询
+
+        Returns:
+            Future，结果为search_top_matches的返回值
+        """
+        future = Future()
+        self._queue.put((query, top_k, codelists, ct_versions, future))
+        return future
+
+    def search(self, query: str, top_k: int = 10, codelists=None, ct_versions=None) -> List[Dict]:
+        """提交一个查询并等待结果"""
+        return self.submit(query, top_k, codelists, ct_versions).result()
+
+    def search_batch(self, queries: List[str], top_k: int = 10, codelists=None, ct_versions=None) -> List[List[Dict]]:
+        """提交多个查询并等待全部结果（可以与其他请求的查询合并到同一批）"""
+        futures = [self.submit(query, top_k, codelists, ct_versions) for query in queries]
+        return [future.result() for future in futures]
+
+    def _collect(self) -> List:
+        """阻塞等待第一个查询，然后在max_wait内收集更多查询，直到达到max_batch_size"""
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                items.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            # top_k、codelists和ct_versions相同的查询才能放在同一次批量查询中
+            groups = {}
+            for item in items:
+                query, top_k, codelists, ct_versions, future = item
+                key = (top_k, _group_key(codelists), _group_key(ct_versions))
+                groups.setdefault(key, []).append(item)
+
+            for (top_k, codelists, ct_versions), group in groups.items():
+                try:
+                    results = self.matcher.search_top_matches_batch([item[0] for item in group], top_k=top_k,
+                                                                    codelists=codelists, ct_versions=ct_versions)
+                except Exception as e:
+                    for item in group:
+                        item[4].set_exception(e)
+                    continue
+                for item, result in zip(group, results):
+                    item[4].set_result(result)
+
+            with self._stats_lock:
+                self.batch_count += 1
+                self.query_count += len(items)
+
+    def info(self) -> Dict:
+        """批处理统计"""
+        with self._stats_lock:
+            return {
+                'batches': self.batch_count,
+                'queries': self.query_count,
+                'avg_batch_size': self.query_count / self.batch_count if self.batch_count else 0.0,
+                'pending': self._queue.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0
+            }
+
+
+def _parse_top_k(payload: Dict) -> int:
+    top_k = payload.get('top_k', 10)
+    if not isinstance(top_k, int) or isinstance(top_k, bool) or top_k < 1:
+        raise ValueError("top_k必须是正整数")
+    return top_k
+
+
+def _group_key(names):
+    """codelists或ct_versions参数作为分组键（列表转换为元组）"""
+    return names if names is None or isinstance(names, str) else tuple(names)
+
+
+def _parse_names(payload: Dict, field: str):
+    names = payload.get(field)
+    if names is None or isinstance(names, str):
+        return names
+    if isinstance(names, list) and all(isinstance(name, str) for name in names):
+        return names or None
+    raise ValueError(f"{field}必须是字符串或字符串列表")
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """处理/health、/search、/search/batch请求（batcher由make_server设置）"""
+
+    batcher: MicroBatcher = None
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError("请求体过大")
+        payload = json.loads(self.rfile.read(length).decode('utf-8') or "{}")
+        if not isinstance(payload, dict):
+            raise ValueError("请求体必须是JSON对象")
+        return payload
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/suggest':
+            self._suggest(parse_qs(url.query))
+            return
+        if url.path != '/health':
+            self._send_json(404, {'error': f"未知路径: {url.path}"})
+            return
+        matcher = self.batcher.matcher
+        self._send_json(200, {
+            'status': 'ok',
+            'model_status': matcher.model_status(),
+            'rows': len(matcher.row_labels) if matcher.row_labels is not None else 0,
+            'ct_versions': matcher.list_ct_versions(),
+            'batching': self.batcher.info(),
+            'query_cache': matcher.query_cache_info()
+        })
+
+    def _suggest(self, params: Dict):
+        prefix = params.get('prefix', [""])[0]
+        try:
+            k = int(params.get('k', ["10"])[0])
+            if k < 1:
+                raise ValueError
+        except ValueError:
+            self._send_json(400, {'error': "k必须是正整数"})
+            return
+        self._send_json(200, {'prefix': prefix, 'suggestions': self.batcher.matcher.suggest(prefix, k)})
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path not in ('/search', '/search/batch'):
+            self._send_json(404, {'error': f"未知路径: {path}"})
+            return
+        try:
+            payload = self._read_json()
+            top_k = _parse_top_k(payload)
+            codelists = _parse_names(payload, 'codelists')
+            ct_versions = _parse_names(payload, 'ct_versions')
+            matcher = self.batcher.matcher
+
+            if path == '/search':
+                query = payload.get('query')
+                if not isinstance(query, str) or not query.strip():
+                    raise ValueError("query不能为空")
+                results = self.batcher.search(query, top_k, codelists, ct_versions)
+                self._send_json(200, matcher.format_results_json(results))
+            else:
+                queries = payload.get('queries')
+                if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+                    raise ValueError("queries必须是字符串列表")
+                results = self.batcher.search_batch(queries, top_k, codelists, ct_versions)
+                self._send_json(200, {'results': [matcher.format_results_json(result) for result in results]})
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {'error': str(e)})
+        except Exception as e:
+            print(f"查询失败: {e}", file=sys.stderr, flush=True)
+            self._send_json(500, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        # 访问日志输出到stderr（与匹配器的日志一致）
+        print(f"{self.address_string()} - {format % args}", file=sys.stderr, flush=True)
+
+
+def make_server(matcher: LabTestMatcher, host: str = SERVICE_HOST, port: int = SERVICE_PORT,
+                max_batch_size: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS) -> ThreadingHTTPServer:
+    """
+    创建HTTP服务（每个连接一个线程，查询经MicroBatcher合并后执行）
+
+    Args:
+        matcher: 共享的匹配器
+        host: 监听地址
+        port: 监听端口（0表示随机端口）
+        max_batch_size: 一批最多包含的查询数
+        max_wait_ms: 收集一批查询的最长等待时间（毫秒）
+    """
+    handler = type('BoundSearchRequestHandler', (SearchRequestHandler,),
+                   {'batcher': MicroBatcher(matcher, max_batch_size, max_wait_ms)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查项目匹配HTTP服务")
+    parser.add_argument('--host', default=SERVICE_HOST, help="监听地址（默认环境变量SERVICE_HOST或127.0.0.1）")
+    parser.add_argument('--port', type=int, default=SERVICE_PORT, help="监听端口（默认环境变量SERVICE_PORT或8765）")
+    parser.add_argument('--max-batch-size', type=int, default=BATCH_MAX_SIZE, help="一批最多包含的查询数")
+    parser.add_argument('--max-wait-ms', type=float, default=BATCH_MAX_WAIT_MS, help="收集一批查询的最长等待时间（毫秒）")
+    args = parser.parse_args()
+
+    matcher = LabTestMatcher()
+    # 启动前加载模型，首个请求不承担冷启动开销
+    matcher.start_model_warmup()
+    matcher.wait_for_model()
+
+    server = make_server(matcher, args.host, args.port, args.max_batch_size, args.max_wait_ms)
+    print(f"检查项目匹配服务已启动: http://{args.host}:{server.server_address[1]}", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+分阶段计时统计
+记录初始化和查询各阶段的耗时（次数、总耗时、最近若干次的分位数）以及计数器，开销很低；
+关闭时stage()返回空的上下文管理器，不计时
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Dict
+
+import numpy as np
+
+_NULL_CONTEXT = nullcontext()
+
+
+class StageStats:
+    """线程安全的阶段耗时和计数器"""
+
+    def __init__(self, enabled: bool = True, window: int = 1024):
+        """
+        Args:
+            enabled: 是否记录
+            window: 每个阶段保留最近多少次耗时用于计算分位数
+        """
+        self.enabled = enabled
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+
+    def stage(self, name: str):
+        """
+        计时一个阶段：with stats.stage('search.encode'): ...
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float):
+        """记录一次阶段耗时（秒）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._stages.get(name)
+            if entry is None:
+                entry = self._stages[name] = {'count': 0, 'total': 0.0, 'max': 0.0,
+                                              'recent': deque(maxlen=self.window)}
+            entry['count'] += 1
+            entry['total'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            entry['recent'].append(seconds)
+
+    def increment(self, name: str, value: int = 1):
+        """增加计数器"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self) -> Dict:
+        """
+        返回统计快照
+
+        Returns:
+            {'stages': {阶段: {count, total_ms, mean_ms, p50_ms, p95_ms, max_ms}}, 'counters': {名称: 值}}
+            （分位数基于最近window次）
+        """
+        with self._lock:
+            stages = {}
+            for name, entry in self._stages.items():
+                recent = np.asarray(entry['recent']) * 1000.0
+                stages[name] = {
+                    'count': entry['count'],
+                    'total_ms': entry['total'] * 1000.0,
+                    'mean_ms': entry['total'] * 1000.0 / entry['count'],
+                    'p50_ms': float(np.percentile(recent, 50)),
+                    'p95_ms': float(np.percentile(recent, 95)),
+                    'max_ms': entry['max'] * 1000.0
+                }
+            return {'stages': stages, 'counters': dict(self._counters)}
+
+    def reset(self):
+        """清空全部统计"""
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
@@ -5,9 +5,10 @@
 
 import streamlit as st
 import json
-import re
 import os
 
+import pandas as pd
+
 # 优先从Streamlit Secrets读取配置（如果在Streamlit Cloud上运行）
 # 注意：在本地环境中，secrets文件不存在是正常的，需要捕获异常
 try:
@@ -26,6 +27,8 @@ try:
                 # 从Streamlit Secrets读取并设置为环境变量
                 if 'EXCEL_PATH' in paths:
                     os.environ['EXCEL_PATH'] = str(paths['EXCEL_PATH'])
+                if 'EXCEL_PATHS' in paths:
+                    os.environ['EXCEL_PATHS'] = str(paths['EXCEL_PATHS'])
                 if 'MAPPING_FILE' in paths:
                     os.environ['MAPPING_FILE'] = str(paths['MAPPING_FILE'])
                 if 'CACHE_DIR' in paths:
@@ -49,72 +52,15 @@ except ImportError:
 # 现在导入LabTestMatcher（此时环境变量应该已经设置好了）
 from lab_test_matcher import LabTestMatcher
 
-# 翻译功能（使用deep-translator，如果不可用则使用简单回退）
+# 翻译功能：整个结果表的F、H列一次性并发翻译，结果持久化到缓存目录
+from translation import ResultTranslator
+
 try:
-    from deep_translator import GoogleTranslator
-    HAS_TRANSLATOR = True
+    from config import TRANSLATOR, TRANSLATION_WORKERS, TRANSLATION_TIMEOUT
 except ImportError:
-    HAS_TRANSLATOR = False
-
-# 翻译缓存（避免重复翻译相同文本）
-_translation_cache = {}
-
-def translate_text(text: str) -> str:
-    """
-    翻译文本为中文
-    
-    Args:
-        text: 要翻译的文本
-        
-    Returns:
-        翻译后的中文文本，如果翻译失败则返回原文本
-    """
-    if not text or not text.strip():
-        return text
-    
-    # 如果文本已经是中文（包含中文字符），直接返回
-    if re.search(r'[\u4e00-\u9fff]', text):
-        return text
-    
-    # 检查缓存
-    if text in _translation_cache:
-        return _translation_cache[text]
-    
-    # 如果文本主要是英文，尝试翻译
-    if HAS_TRANSLATOR:
-        try:
-            # 只翻译英文部分，保留分号分隔的结构
-            if ';' in text:
-                parts = text.split(';')
-                translated_parts = []
-                for part in parts:
-                    part = part.strip()
-                    if part and not re.search(r'[\u4e00-\u9fff]', part):
-                        try:
-                            translator = GoogleTranslator(source='en', target='zh')
-                            translated = translator.translate(part)
-                            translated_parts.append(f"{part} ({translated})")
-                        except:
-                            translated_parts.append(part)
-                    else:
-                        translated_parts.append(part)
-                result = '; '.join(translated_parts)
-            else:
-                try:
-                    translator = GoogleTranslator(source='en', target='zh')
-                    translated = translator.translate(text)
-                    result = f"{text} ({translated})"
-                except:
-                    result = text
-            
-            # 缓存结果
-            _translation_cache[text] = result
-            return result
-        except Exception:
-            return text
-    else:
-        # 如果没有翻译器，返回原文本
-        return text
+    TRANSLATOR = os.getenv('TRANSLATOR', "google")
+    TRANSLATION_WORKERS = int(os.getenv('TRANSLATION_WORKERS', "8"))
+    TRANSLATION_TIMEOUT = float(os.getenv('TRANSLATION_TIMEOUT', "5"))
 
 # 页面配置
 st.set_page_config(
@@ -128,7 +74,18 @@ st.set_page_config(
 @st.cache_resource
 def get_matcher():
     """获取匹配器实例（带缓存）"""
-    return LabTestMatcher()
+    # 初始化后在后台线程预热embedding模型，避免首次语义查询承担模型加载开销
+    return LabTestMatcher(warmup_model=True)
+
+@st.cache_resource
+def get_translator(cache_dir: str):
+    """获取翻译器实例（带缓存；翻译结果保存在cache_dir/translations.sqlite）"""
+    return ResultTranslator(
+        backend=TRANSLATOR,
+        db_path=os.path.join(cache_dir, "translations.sqlite") if cache_dir else None,
+        max_workers=TRANSLATION_WORKERS,
+        timeout=TRANSLATION_TIMEOUT
+    )
 
 # 标题
 st.title("🔬 检查项目TEST - > TESTCD 查询工具")
@@ -155,25 +112,73 @@ except Exception as e:
     st.error(f"初始化失败: {e}")
     st.stop()
 
+# 侧边栏：语义匹配范围和模型预热状态
+with st.sidebar:
+    st.markdown("---")
+    selected_codelists = st.multiselect(
+        "语义匹配范围（Codelist，留空表示全部）",
+        options=list(matcher.list_codelists().keys()),
+        default=[]
+    )
+    # 加载了多个CT版本时可以指定版本（留空表示全部版本，相同的行只返回一次并标记所属版本）
+    selected_ct_versions = []
+    if len(matcher.ct_versions) > 1:
+        selected_ct_versions = st.multiselect(
+            "CT版本（留空表示全部）",
+            options=matcher.ct_versions,
+            default=[]
+        )
+    model_status = matcher.model_status()
+    if model_status == 'ready':
+        st.caption("🟢 语义匹配模型已就绪")
+    elif model_status == 'warming_up':
+        st.caption("🟡 语义匹配模型加载中（此时的语义查询会等待加载完成）")
+    elif model_status == 'failed':
+        st.caption("🔴 语义匹配模型预热失败，将在首次语义查询时重新加载")
+    else:
+        st.caption("⚪ 语义匹配模型尚未加载")
+
+def submit_query():
+    """输入框提交（回车）时搜索"""
+    st.session_state['search_requested'] = True
+
+def apply_suggestion():
+    """选择候选词时把它填入输入框并搜索"""
+    if st.session_state.get('suggestion'):
+        st.session_state['query'] = st.session_state['suggestion']
+        st.session_state['search_requested'] = True
+    st.session_state['suggestion'] = None
+
 # 搜索输入
 st.subheader("🔍 搜索")
 query = st.text_input(
     "输入检查项目名称（支持中英文）",
     placeholder="例如：血红蛋白 或 Hemoglobin",
-    label_visibility="collapsed"
+    label_visibility="collapsed",
+    key='query',
+    on_change=submit_query
 )
 
+# 输入联想：前缀索引查询，不调用embedding模型
+suggestions = matcher.suggest(query, k=8) if query.strip() else []
+if suggestions:
+    st.pills("候选词", options=[s['text'] for s in suggestions], key='suggestion',
+             on_change=apply_suggestion, label_visibility="collapsed")
+# 只有提交输入（回车）、选择候选词或点击"搜索"时才搜索，修改其他控件引起的重新运行不再重复搜索
+search_requested = st.session_state.pop('search_requested', False)
+
 # 搜索按钮
 col1, col2 = st.columns([1, 10])
 with col1:
     search_button = st.button("搜索", type="primary", width='stretch')
 
 # 执行搜索
-if search_button or query:
+if search_button or search_requested:
     if query.strip():
         try:
             with st.spinner(f"正在搜索 '{query}'..."):
-                results = matcher.search_top_matches(query, top_k=top_k)
+                results = matcher.search_top_matches(query, top_k=top_k, codelists=selected_codelists or None,
+                                                     ct_versions=selected_ct_versions or None)
             
             if results:
                 st.markdown("---")
@@ -183,11 +188,13 @@ if search_button or query:
                 if is_exact_match:
                     st.subheader(f"✅ 精确匹配结果（共 {len(results)} 条）")
                     st.info("🎯 在TEST_TESTCD_mapping.xlsx中找到精确匹配！")
+                elif results[0].get('is_lexical_match', False):
+                    st.subheader(f"🔤 字面匹配结果（共 {len(results)} 条）")
+                    st.info("相似度为字符n-gram字面得分，未调用embedding模型")
                 else:
                     st.subheader(f"📊 语义匹配结果（共 {len(results)} 条）")
                 
                 # 显示表格
-                import pandas as pd
                 df_data = []
                 
                 if is_exact_match:
@@ -202,29 +209,36 @@ if search_button or query:
                         })
                 else:
                     # 语义匹配：显示E、F、H列
+                    # F列优先使用映射文件中的中文；其余F列和全部H列一次性并发翻译
+                    translator = get_translator(matcher.cache_dir)
+                    f_values = [result.get('f_value', '') for result in results]
+                    h_values = [result.get('h_value', '') for result in results]
+                    f_to_translate = [i for i, result in enumerate(results) if not result.get('f_cn_value', '')]
+                    with st.spinner("正在翻译结果..."):
+                        translated = translator.translate_values([f_values[i] for i in f_to_translate] + h_values)
+                    f_translated = dict(zip(f_to_translate, translated[:len(f_to_translate)]))
+                    h_translated = translated[len(f_to_translate):]
+                    
                     for i, result in enumerate(results, 1):
-                        # F列：优先使用映射文件中的中文，如果没有则使用翻译API
-                        f_value = result.get('f_value', '')
+                        f_value = f_values[i - 1]
                         f_cn_value = result.get('f_cn_value', '')
                         
                         if f_cn_value:
                             # 如果映射文件中有中文，显示：英文 (中文)
                             f_value_display = f"{f_value} ({f_cn_value})" if f_value else f_cn_value
                         else:
-                            # 如果没有映射文件的中文，使用翻译API
-                            f_value_display = translate_text(f_value)
+                            f_value_display = f_translated[i - 1]
                         
-                        # H列：使用翻译API
-                        h_value = result.get('h_value', '')
-                        h_value_with_translation = translate_text(h_value)
-                        
-                        df_data.append({
+                        row = {
                             "排名": i,
                             "相似度": f"{result['similarity']:.4f}",
                             "CDISC Submission Value": result.get('e_value', ''),
                             "CDISC Synonym(s)": f_value_display,
-                            "NCI Preferred Term": h_value_with_translation
-                        })
+                            "NCI Preferred Term": h_translated[i - 1]
+                        }
+                        if 'ct_versions' in result:
+                            row["CT版本"] = ", ".join(result['ct_versions'])
+                        df_data.append(row)
                 
                 df = pd.DataFrame(df_data)
                 st.dataframe(df, width='stretch', hide_index=True)
@@ -250,6 +264,20 @@ if search_button or query:
             st.exception(e)
     else:
         st.warning("请输入查询文本")
+elif query.strip():
+    st.caption("按回车、选择候选词或点击\"搜索\"进行匹配")
+
+# 侧边栏：分阶段耗时统计（放在搜索之后，包含本次查询）
+with st.sidebar:
+    with st.expander("⏱️ 性能统计"):
+        stats = matcher.stats()
+        if not stats['enabled']:
+            st.caption("未开启分阶段耗时统计（设置环境变量STAGE_STATS=1开启）")
+        elif stats['stages']:
+            stage_table = pd.DataFrame.from_dict(stats['stages'], orient='index')
+            st.dataframe(stage_table.round(2), width='stretch')
+            st.caption("，".join(f"{name}: {value}" for name, value in stats['counters'].items()))
+            st.caption(f"查询embedding缓存命中率: {stats['query_cache'].get('hit_rate', 0.0):.1%}")
 
 # 页脚
 st.markdown("---")
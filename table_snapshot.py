@@ -0,0 +1,186 @@
+"""
+Excel表格的列式快照
+只保存匹配器需要的列（UTF-8字节 + 偏移数组 + 空值标记），以源文件内容哈希命名，
+后续启动直接读取快照，跳过缓慢的Excel解析
+"""
+
+import hashlib
+import os
+import sys
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from index_bundle import open_bundle, write_bundle
+
+SNAPSHOT_VERSION = 1
+
+
+def file_hash(path: str) -> str:
+    """计算文件内容的SHA-256"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def encode_strings(values: List[Optional[str]]):
+    """
+    将字符串列表编码为连续的UTF-8字节和偏移数组
+
+    Args:
+        values: 字符串列表（None表示空值，按空字符串存放）
+
+    Returns:
+        (UTF-8字节数组 uint8, 偏移数组 int64 (n + 1,), 空值标记 bool (n,))
+    """
+    encoded = [value.encode('utf-8') if value is not None else b'' for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(item) for item in encoded])
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    nulls = np.array([value is None for value in values], dtype=bool)
+    return data, offsets, nulls
+
+
+def decode_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """将连续的UTF-8字节和偏移数组解码为字符串列表"""
+    raw = data.tobytes()
+    bounds = offsets.tolist()
+    return [raw[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+
+
+class StringColumn:
+    """
+    只读的字符串列：所有字符串的UTF-8字节连续存放，按偏移数组取出
+    （比object数组中的Python字符串对象占用的内存少得多）
+    """
+
+    __slots__ = ('data', 'offsets')
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_values(cls, values: List[str]) -> 'StringColumn':
+        data, offsets, _ = encode_strings(values)
+        return cls(data, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i) -> str:
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self) -> List[str]:
+        return decode_strings(self.data, self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.offsets.nbytes
+
+
+def save_table_snapshot(path: str, df: pd.DataFrame, columns: List, source_hash: str):
+    """
+    保存表格快照（只保存指定的列，值按str()转换，空值单独标记）
+
+    Args:
+        path: 快照文件路径
+        df: 表格数据
+        columns: 需要保存的列名
+        source_hash: 源文件内容哈希
+    """
+    sections = {}
+    for pos, col in enumerate(columns):
+        values = [str(v) if pd.notna(v) else None for v in df[col].tolist()]
+        data, offsets, nulls = encode_strings(values)
+        sections[f"col{pos}_data"] = data
+        sections[f"col{pos}_offsets"] = offsets
+        sections[f"col{pos}_null"] = nulls
+
+    snapshot_dir = os.path.dirname(path)
+    if snapshot_dir and not os.path.exists(snapshot_dir):
+        os.makedirs(snapshot_dir)
+    write_bundle(path, meta={
+        'snapshot_version': SNAPSHOT_VERSION,
+        'source_hash': source_hash,
+        'columns': [str(col) for col in columns],
+        'row_count': len(df)
+    }, sections=sections)
+
+
+def load_table_snapshot(path: str, source_hash: str) -> Optional[pd.DataFrame]:
+    """
+    读取表格快照
+
+    Args:
+        path: 快照文件路径
+        source_hash: 期望的源文件内容哈希
+
+    Returns:
+        DataFrame（列为字符串，空值为NaN）；快照不存在或与源文件不一致时返回None
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        meta, sections = open_bundle(path, mmap_mode=None)
+        if meta.get('snapshot_version') != SNAPSHOT_VERSION or meta.get('source_hash') != source_hash:
+            return None
+        columns = {}
+        for pos, col in enumerate(meta['columns']):
+            values = np.array(decode_strings(sections[f"col{pos}_data"], sections[f"col{pos}_offsets"]), dtype=object)
+            values[sections[f"col{pos}_null"]] = np.nan
+            columns[col] = values
+        return pd.DataFrame(columns, index=pd.RangeIndex(meta['row_count']))
+    except Exception as e:
+        print(f"读取表格快照失败: {e}，将重新解析Excel文件", file=sys.stderr, flush=True)
+        return None
+
+
+def read_excel_with_snapshot(excel_path: str, sheet_name: int, cache_dir: str, prefix: str,
+                             select_columns=None) -> pd.DataFrame:
+    """
+    读取Excel的一个sheet，优先使用列式快照
+
+    Args:
+        excel_path: Excel文件路径
+        sheet_name: sheet索引
+        cache_dir: 快照存放目录
+        prefix: 快照文件名前缀
+        select_columns: 可选的函数，接收完整DataFrame的列名列表，返回需要保存的列（默认全部）
+
+    Returns:
+        DataFrame（只包含选择的列）
+    """
+    source_hash = file_hash(excel_path)
+    snapshot_path = os.path.join(cache_dir, f"{prefix}_{source_hash[:32]}.tcdidx")
+
+    df = load_table_snapshot(snapshot_path, source_hash)
+    if df is not None:
+        return df
+
+    xls = pd.ExcelFile(excel_path)
+    sheet_names = xls.sheet_names
+    if isinstance(sheet_name, int) and sheet_name >= len(sheet_names):
+        raise ValueError(f"Excel文件至少需要{sheet_name + 1}个sheet，当前只有{len(sheet_names)}个")
+    df = xls.parse(sheet_name)
+
+    columns = list(df.columns) if select_columns is None else select_columns(list(df.columns))
+    try:
+        save_table_snapshot(snapshot_path, df, columns, source_hash)
+    except Exception as e:
+        print(f"警告: 保存表格快照失败: {e}", file=sys.stderr, flush=True)
+
+    # 与快照读取结果保持一致：列名为字符串，值为str()后的字符串
+    snapshot_df = load_table_snapshot(snapshot_path, source_hash)
+    if snapshot_df is not None:
+        return snapshot_df
+    return df[columns]
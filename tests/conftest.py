@@ -0,0 +1,109 @@
+"""
+测试公用的fixture和比较函数
+使用benchmark.py的合成数据和哈希编码器（离线运行，不需要模型文件，同样的参数得到同样的数据和向量）
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import HashingEncoder, make_mapping_workbook, make_terminology_workbook  # noqa: E402
+from lab_test_matcher import LabTestMatcher  # noqa: E402
+
+# 合成数据的参数（与fixtures/baseline_results.json的生成参数相同）
+ROWS = 600
+CODELISTS = 6
+MAPPING_ROWS = 120
+SEED = 0
+DIM = 384
+
+# 不同矩阵乘法kernel之间的舍入误差（float32），在此范围内的相似度视为相同
+SIMILARITY_TOLERANCE = 1e-6
+
+
+@pytest.fixture(scope='session')
+def data_dir(tmp_path_factory):
+    """合成的SDTM Terminology和映射文件"""
+    path = tmp_path_factory.mktemp('data')
+    make_terminology_workbook(str(path / 'terminology.xlsx'), ROWS, CODELISTS, SEED)
+    make_mapping_workbook(str(path / 'mapping.xlsx'), MAPPING_ROWS, SEED)
+    return path
+
+
+@pytest.fixture(scope='session')
+def terminology(data_dir):
+    """合成的SDTM Terminology（第二个sheet）"""
+    return pd.read_excel(data_dir / 'terminology.xlsx', sheet_name=1)
+
+
+@pytest.fixture(scope='session')
+def make_matcher(data_dir, tmp_path_factory):
+    """
+    创建匹配器的函数：所有参数都显式指定（不受环境变量影响），同一会话中共享缓存目录，
+    关键字参数覆盖默认值
+    """
+    cache_dir = str(tmp_path_factory.mktemp('cache'))
+    encoder = HashingEncoder(DIM)
+
+    def make(**kwargs):
+        options = dict(
+            excel_path=str(data_dir / 'terminology.xlsx'), mapping_file=str(data_dir / 'mapping.xlsx'),
+            cache_dir=cache_dir, encoder=encoder, query_cache_size=0, persist_query_cache=False,
+            warmup_model=False, use_ann_index=False, search_workers=0, collect_stats=False,
+            scan_precision='float32', lexical_weight=0.0, lexical_confident=0.0
+        )
+        if 'excel_paths' in kwargs:
+            options.pop('excel_path')
+        options.update(kwargs)
+        return LabTestMatcher(**options)
+
+    return make
+
+
+@pytest.fixture(scope='session')
+def matcher(make_matcher):
+    """默认配置的匹配器（暴力扫描，单进程）"""
+    return make_matcher()
+
+
+def result_identity(result):
+    """结果的标识：精确匹配为映射文件的显示值，语义匹配为行索引和E列值"""
+    if result.get('is_exact_match'):
+        return ('exact', result['testds_value'], result['tests_cn_value'], result['tests_en_value'])
+    return ('semantic', result['row_index'], result['e_value'])
+
+
+def tie_groups(results):
+    """按相似度把结果分组（相似度相差不超过SIMILARITY_TOLERANCE的相邻结果为一组）"""
+    groups = []
+    for result in results:
+        if groups and abs(groups[-1][0] - result['similarity']) <= SIMILARITY_TOLERANCE:
+            groups[-1][1].append(result_identity(result))
+        else:
+            groups.append((result['similarity'], [result_identity(result)]))
+    return groups
+
+
+def assert_same_ranking(actual, expected):
+    """
+    比较两个结果列表：相似度逐个相同（允许SIMILARITY_TOLERANCE的舍入误差），并列的结果之间顺序不限
+
+    expected可以比actual长（同一查询较大的top_k），用于判断被top_k截断的最后一组并列结果
+    """
+    assert len(actual) <= len(expected)
+    for a, e in zip(actual, expected):
+        assert a['similarity'] == pytest.approx(e['similarity'], abs=SIMILARITY_TOLERANCE)
+    actual_groups = tie_groups(actual)
+    expected_groups = tie_groups(expected)
+    assert len(actual_groups) <= len(expected_groups)
+    for i, (_, identities) in enumerate(actual_groups):
+        expected_identities = expected_groups[i][1]
+        if i < len(actual_groups) - 1:
+            assert sorted(identities) == sorted(expected_identities)
+        elif len(actual) < len(expected):
+            assert set(identities) <= set(expected_identities)
+        # 两边长度相同时，最后一组可能都被top_k截断，截断时选中的并列结果不比较
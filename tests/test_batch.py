@@ -0,0 +1,73 @@
+"""
+批量查询与逐个查询的一致性：相似度和并列结果的顺序都完全相同（不允许舍入误差）
+"""
+
+import pytest
+
+import lab_test_matcher
+from conftest import ROWS
+from test_matching import BASELINE, SEMANTIC_QUERIES
+
+QUERIES = list(BASELINE['results'])
+
+
+def assert_batch_equals_single(matcher, queries, **kwargs):
+    batch = matcher.search_top_matches_batch(queries, **kwargs)
+    assert len(batch) == len(queries)
+    for query, results in zip(queries, batch):
+        assert results == matcher.search_top_matches(query, **kwargs), query
+
+
+@pytest.mark.parametrize('top_k', [1, 10, 20])
+def test_batch_equals_single(matcher, top_k):
+    assert_batch_equals_single(matcher, QUERIES, top_k=top_k)
+
+
+def test_batch_equals_single_with_codelists(matcher):
+    assert_batch_equals_single(matcher, QUERIES, top_k=10, codelists=['Codelist 1', 'Codelist 3'])
+
+
+def test_batch_of_duplicates(matcher):
+    # 同一查询在批量中的位置不影响结果
+    queries = [SEMANTIC_QUERIES[0]] * 3 + SEMANTIC_QUERIES[:5]
+    batch = matcher.search_top_matches_batch(queries, top_k=10)
+    for results in batch[1:3]:
+        assert results == batch[0]
+    assert batch[3] == batch[0]
+
+
+def test_rows_subset_does_not_change_scores(matcher):
+    # 限定Codelist只改变参与排序的行，不改变每行的相似度
+    for query in SEMANTIC_QUERIES[:10]:
+        full = {result['row_index']: result['similarity'] for result in matcher.search_top_matches(query, top_k=ROWS)}
+        for result in matcher.search_top_matches(query, top_k=10, codelists='Codelist 2'):
+            assert result['similarity'] == full[result['row_index']]
+
+
+def test_rescore_grouping(matcher, monkeypatch):
+    # 批量重新打分时的分组方式（每组一个查询或全部查询一组）不影响结果
+    expected = matcher.search_top_matches_batch(QUERIES, top_k=10)
+    for block in (1, ROWS * len(QUERIES)):
+        monkeypatch.setattr(lab_test_matcher, 'RESCORE_BLOCK', block)
+        assert matcher.search_top_matches_batch(QUERIES, top_k=10) == expected
+
+
+def test_ann_batch_equals_single(make_matcher):
+    ann = make_matcher(use_ann_index=True, ann_n_probe=4)
+    assert_batch_equals_single(ann, QUERIES, top_k=10)
+
+
+def test_lexical_batch_equals_single(make_matcher):
+    fused = make_matcher(lexical_weight=0.3)
+    assert_batch_equals_single(fused, QUERIES, top_k=10)
+
+
+def test_worker_batch_equals_single(make_matcher, matcher, monkeypatch):
+    monkeypatch.setattr(lab_test_matcher, 'PARALLEL_MIN_WORK', 0)
+    parallel = make_matcher(search_workers=2)
+    try:
+        batch = parallel.search_top_matches_batch(SEMANTIC_QUERIES, top_k=10)
+        for query, results in zip(SEMANTIC_QUERIES, batch):
+            assert results == matcher.search_top_matches(query, top_k=10)
+    finally:
+        parallel.close_workers()
@@ -0,0 +1,118 @@
+"""
+批量映射工具的中断后继续：进度文件、截断被中断的块、旧版本输出文件
+"""
+
+import csv
+import json
+
+import pytest
+
+import bulk_map
+from test_matching import BASELINE
+
+QUERIES = list(BASELINE['results'])
+
+
+def read_rows(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.fixture(scope='module')
+def expected_rows(matcher, tmp_path_factory):
+    """一次运行完成的输出"""
+    path = tmp_path_factory.mktemp('bulk') / 'full.csv'
+    assert bulk_map.bulk_map(matcher, QUERIES, str(path), top_k=3, chunk_size=8) == len(QUERIES)
+    return read_rows(path)
+
+
+def test_rerun_skips_everything(matcher, expected_rows, tmp_path):
+    path = tmp_path / 'mapped.csv'
+    bulk_map.bulk_map(matcher, QUERIES, str(path), top_k=3, chunk_size=8)
+    content = path.read_bytes()
+    assert bulk_map.bulk_map(matcher, QUERIES, str(path), top_k=3, chunk_size=8) == 0
+    assert path.read_bytes() == content
+    assert read_rows(path) == expected_rows
+
+
+def test_resume_after_interrupted_chunk(matcher, expected_rows, tmp_path):
+    path = tmp_path / 'mapped.csv'
+    progress = tmp_path / 'mapped.csv.progress'
+    bulk_map.bulk_map(matcher, QUERIES[:20], str(path), top_k=3, chunk_size=8)
+    complete = path.read_bytes()
+    # 模拟在下一块写入途中中断：输出文件末尾有半行，进度文件末尾有半条记录
+    with open(path, 'ab') as f:
+        f.write('{},1,0.5,"semantic,AB'.format(QUERIES[20]).encode('utf-8'))
+    with open(progress, 'a', encoding='utf-8') as f:
+        f.write('{"offset": 99999999, "queries": ["')
+
+    assert bulk_map.read_completed_queries(str(path)) == set(QUERIES[:20])
+    # 只截掉最后一个完整块之后的内容
+    assert path.read_bytes() == complete
+
+    # 重新运行：进度文件的半条记录之后仍可继续追加
+    with open(progress, 'r', encoding='utf-8') as f:
+        lines = f.read().split('\n')
+    with open(progress, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines[:-1]) + '\n')
+    assert bulk_map.bulk_map(matcher, QUERIES, str(path), top_k=3, chunk_size=8) == len(QUERIES) - 20
+    assert read_rows(path) == expected_rows
+    with open(progress, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert records[-1]['offset'] == path.stat().st_size
+    assert set().union(*(record['queries'] for record in records)) == set(QUERIES)
+
+
+def test_output_shorter_than_progress(matcher, tmp_path):
+    path = tmp_path / 'mapped.csv'
+    bulk_map.bulk_map(matcher, QUERIES[:10], str(path), top_k=3, chunk_size=4)
+    with open(path, 'r+b') as f:
+        f.truncate(path.stat().st_size - 10)
+    with pytest.raises(ValueError):
+        bulk_map.read_completed_queries(str(path))
+
+
+def test_deleted_output_starts_over(matcher, expected_rows, tmp_path):
+    path = tmp_path / 'mapped.csv'
+    bulk_map.bulk_map(matcher, QUERIES[:10], str(path), top_k=3, chunk_size=4)
+    path.unlink()
+    assert bulk_map.bulk_map(matcher, QUERIES, str(path), top_k=3, chunk_size=8) == len(QUERIES)
+    assert read_rows(path) == expected_rows
+
+
+def test_legacy_output_without_progress(matcher, expected_rows, tmp_path):
+    path = tmp_path / 'mapped.csv'
+    bulk_map.bulk_map(matcher, QUERIES[:12], str(path), top_k=3, chunk_size=4)
+    (tmp_path / 'mapped.csv.progress').unlink()
+    with open(path, 'ab') as f:
+        f.write('{},1,"0.5'.format(QUERIES[12]).encode('utf-8'))
+
+    # 最后一个名称（被截断的行）重新匹配
+    assert bulk_map.read_completed_queries(str(path)) == set(QUERIES[:12])
+    assert bulk_map.bulk_map(matcher, QUERIES, str(path), top_k=3, chunk_size=8) == len(QUERIES) - 12
+    assert read_rows(path) == expected_rows
+
+
+def test_legacy_output_with_unparsable_tail(matcher, expected_rows, tmp_path):
+    path = tmp_path / 'mapped.csv'
+    bulk_map.bulk_map(matcher, QUERIES[:12], str(path), top_k=3, chunk_size=4)
+    (tmp_path / 'mapped.csv.progress').unlink()
+    # 未闭合的引号使末尾成为超过csv字段长度限制的字段（csv.Error）
+    with open(path, 'ab') as f:
+        f.write(('{},1,"'.format(QUERIES[12]) + 'x' * (csv.field_size_limit() + 1)).encode('utf-8'))
+
+    assert bulk_map.read_completed_queries(str(path)) == set(QUERIES[:11])
+    assert bulk_map.bulk_map(matcher, QUERIES, str(path), top_k=3, chunk_size=8) == len(QUERIES) - 11
+    assert read_rows(path) == expected_rows
+
+
+def test_lexical_results_are_marked(make_matcher, terminology, tmp_path):
+    lexical = make_matcher(lexical_confident=0.95)
+    # CT的E列值（不在映射文件中）字面得分为1.0，走字面快速路径
+    query = next(value for value in terminology['CDISC Submission Value']
+                 if not lexical.search_top_matches(value, top_k=1)[0].get('is_exact_match'))
+    path = tmp_path / 'mapped.csv'
+    bulk_map.bulk_map(lexical, [query, QUERIES[0]], str(path), top_k=3, chunk_size=8)
+    match_types = {row['query']: row['match_type'] for row in read_rows(path)}
+    assert match_types[query] == 'lexical'
+    assert match_types[QUERIES[0]] != 'lexical'
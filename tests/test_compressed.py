@@ -0,0 +1,112 @@
+"""
+低精度扫描（int8/float16压缩索引）：结果与float32完全相同、近似相似度区间、按需读取float32向量
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import lab_test_matcher
+from compressed_index import NpyRowReader
+from conftest import ROWS
+from test_batch import QUERIES
+from test_matching import SEMANTIC_QUERIES
+
+PRECISIONS = ['int8', 'float16']
+
+
+@pytest.mark.parametrize('precision', PRECISIONS)
+def test_top_k_equals_float32(make_matcher, matcher, precision):
+    compressed = make_matcher(scan_precision=precision)
+    expected = matcher.search_top_matches_batch(QUERIES, top_k=10)
+    assert compressed.search_top_matches_batch(QUERIES, top_k=10) == expected
+    for query, results in zip(QUERIES, expected):
+        assert compressed.search_top_matches(query, top_k=10) == results, query
+    assert compressed.search_top_matches_batch(QUERIES, top_k=5, codelists='Codelist 2') == \
+        matcher.search_top_matches_batch(QUERIES, top_k=5, codelists='Codelist 2')
+
+
+@pytest.mark.parametrize('precision', PRECISIONS)
+def test_ann_top_k_equals_float32(make_matcher, precision):
+    expected = make_matcher(use_ann_index=True, ann_n_probe=4).search_top_matches_batch(SEMANTIC_QUERIES, top_k=10)
+    compressed = make_matcher(scan_precision=precision, use_ann_index=True, ann_n_probe=4)
+    assert compressed.search_top_matches_batch(SEMANTIC_QUERIES, top_k=10) == expected
+
+
+def test_worker_top_k_equals_float32(make_matcher, matcher, monkeypatch):
+    monkeypatch.setattr(lab_test_matcher, 'PARALLEL_MIN_WORK', 0)
+    parallel = make_matcher(scan_precision='int8', search_workers=2)
+    try:
+        assert parallel.search_top_matches_batch(SEMANTIC_QUERIES, top_k=10) == \
+            matcher.search_top_matches_batch(SEMANTIC_QUERIES, top_k=10)
+    finally:
+        parallel.close_workers()
+
+
+def test_compressed_mode_keeps_no_float32_index(make_matcher, tmp_path):
+    compressed = make_matcher(scan_precision='int8', cache_dir=str(tmp_path))
+    cache_paths = compressed._get_cache_path()
+    assert os.path.exists(cache_paths['compressed'])
+    assert not os.path.exists(cache_paths['index'])
+    # float32向量不常驻内存：向量矩阵是按需读取的
+    assert not isinstance(compressed.embeddings_e, np.ndarray)
+    assert isinstance(compressed.embeddings_e[:3], np.ndarray)
+
+    # 重新加载压缩索引得到相同的结果
+    reloaded = make_matcher(scan_precision='int8', cache_dir=str(tmp_path))
+    assert reloaded.search_top_matches_batch(QUERIES, top_k=10) == \
+        compressed.search_top_matches_batch(QUERIES, top_k=10)
+
+
+def test_similarity_bounds_contain_exact(matcher):
+    """近似相似度与精确值相差不超过δ时，精确综合相似度在 [lower - 1.05δ, upper + 1.05δ] 内"""
+    rng = np.random.default_rng(0)
+    queries = ['glucose', 'ALT ratio', 'hemoglobin', '比值']
+    delta = 1e-3
+    dot_errors = np.full((len(queries), 1), delta)
+    shape = (len(queries), ROWS)
+    rows = slice(0, ROWS)
+
+    for _ in range(20):
+        exact_e = rng.uniform(-0.8, 0.8, shape)
+        # 一半的F、H列相似度在分支边界（F/H列最大值 - E列 = -0.1）附近，含'/'的列中一部分在1.0附近
+        exact_f = np.where(rng.random(shape) < 0.5, exact_e - 0.1 + rng.uniform(-3, 3, shape) * delta,
+                           rng.uniform(-0.8, 0.8, shape))
+        exact_h = np.where(rng.random(shape) < 0.5, exact_e - 0.1 + rng.uniform(-3, 3, shape) * delta,
+                           rng.uniform(-0.8, 0.8, shape))
+        near_one = rng.random(shape) < 0.3
+        exact_f = np.where(near_one & matcher.ratio_masks['f'][None, :], 1.0 + rng.uniform(-2, 0, shape) * delta,
+                           exact_f)
+        exact_h = np.where(near_one & matcher.ratio_masks['h'][None, :], 1.0 + rng.uniform(-2, 0, shape) * delta,
+                           exact_h)
+
+        penalized_f, penalized_h = matcher._apply_ratio_penalty(queries, rows, exact_f, exact_h)
+        exact = matcher._combine_similarities(exact_e, penalized_f, penalized_h)
+        approx = [s + rng.uniform(-delta, delta, shape) for s in (exact_e, exact_f, exact_h)]
+        lower, upper = matcher._similarity_bounds(queries, rows, *approx, dot_errors)
+
+        margin = 1.05 * delta + 1e-12
+        assert np.all(lower - margin <= exact)
+        assert np.all(exact <= upper + margin)
+        # 区间只对不确定的行放宽
+        assert 0 < np.mean(upper > lower) < 0.5
+
+
+def test_npy_row_reader(tmp_path):
+    path = str(tmp_path / 'store.npy')
+    vectors = np.arange(40, dtype=np.float32).reshape(10, 4)
+    np.save(path, vectors)
+    reader = NpyRowReader(path)
+    try:
+        rows = np.array([7, 2, 3, 4, 2, 9, 0])
+        np.testing.assert_array_equal(reader.read(rows), vectors[rows])
+        with pytest.raises(IndexError):
+            reader.read(np.array([10]))
+
+        # 按文本存储被替换后仍读取打开时的版本（与压缩索引中的行位置对应）
+        np.save(str(tmp_path / 'new.npy'), -vectors)
+        os.replace(str(tmp_path / 'new.npy'), path)
+        np.testing.assert_array_equal(reader.read(rows), vectors[rows])
+    finally:
+        reader.close()
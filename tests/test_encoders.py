@@ -0,0 +1,78 @@
+"""
+OnnxEncoder的输入构建和池化（用简单的session和tokenizer代替onnxruntime推理和transformers分词）
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from encoders import OnnxEncoder
+
+
+class FakeSession:
+    """按输入名返回 (batch, 长度, 2) 的token embedding：每个token为 (input_id, 1)"""
+
+    def __init__(self, input_names):
+        self.inputs = [SimpleNamespace(name=name) for name in input_names]
+        self.feeds = []
+
+    def get_inputs(self):
+        return self.inputs
+
+    def run(self, output_names, feed):
+        self.feeds.append(feed)
+        ids = feed['input_ids'].astype(np.float32)
+        return [np.stack([ids, np.ones_like(ids)], axis=2)]
+
+
+def fake_tokenizer(with_mask=True, with_token_types=True):
+    def tokenize(texts, **kwargs):
+        length = max(len(text) for text in texts)
+        ids = np.array([[ord(c) for c in text] + [0] * (length - len(text)) for text in texts])
+        tokens = {'input_ids': ids}
+        if with_mask:
+            tokens['attention_mask'] = (ids > 0).astype(np.int64)
+        if with_token_types:
+            tokens['token_type_ids'] = np.zeros_like(ids)
+        return tokens
+    return tokenize
+
+
+def make_encoder(input_names, **tokenizer_options):
+    encoder = OnnxEncoder.__new__(OnnxEncoder)
+    encoder.session = FakeSession(input_names)
+    encoder.input_names = [item.name for item in encoder.session.get_inputs()]
+    encoder.tokenizer = fake_tokenizer(**tokenizer_options)
+    encoder.max_length = 128
+    return encoder
+
+
+def test_feed_only_contains_model_inputs():
+    encoder = make_encoder(['input_ids', 'attention_mask'])
+    embeddings = encoder.encode(['ab', 'c'])
+    assert set(encoder.session.feeds[0]) == {'input_ids', 'attention_mask'}
+    # 填充的token不参与平均池化
+    np.testing.assert_allclose(embeddings, [[(97 + 98) / 2, 1.0], [99.0, 1.0]])
+
+
+def test_missing_mask_pools_all_tokens():
+    encoder = make_encoder(['input_ids'], with_mask=False, with_token_types=False)
+    embeddings = encoder.encode(['ab', 'c'])
+    assert set(encoder.session.feeds[0]) == {'input_ids'}
+    np.testing.assert_allclose(embeddings, [[(97 + 98) / 2, 1.0], [99 / 2, 1.0]])
+
+
+def test_default_inputs_for_model():
+    encoder = make_encoder(['input_ids', 'attention_mask', 'token_type_ids'], with_mask=False,
+                           with_token_types=False)
+    encoder.encode('ab')
+    feed = encoder.session.feeds[0]
+    np.testing.assert_array_equal(feed['attention_mask'], [[1, 1]])
+    np.testing.assert_array_equal(feed['token_type_ids'], [[0, 0]])
+
+
+def test_unknown_model_input():
+    encoder = make_encoder(['input_ids', 'position_ids'])
+    with pytest.raises(ValueError):
+        encoder.encode(['ab'])
@@ -0,0 +1,119 @@
+"""
+字面匹配：字符n-gram索引、与语义得分的融合和字面快速路径
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import ROWS
+from lexical_index import NgramIndex, char_ngrams
+from test_matching import SEMANTIC_QUERIES
+
+WEIGHT = 0.3
+
+
+def test_char_ngrams():
+    assert char_ngrams("HGB") == {' hg': 1, 'hgb': 1, 'gb ': 1}
+    # 大小写和多余空白不影响n-gram，词之间的空格保留
+    assert char_ngrams("  Free   T4 ") == char_ngrams("free t4")
+    assert ' t4' in char_ngrams("free t4")
+    assert char_ngrams("   ") == {}
+
+
+@pytest.fixture
+def index():
+    texts = ["Alanine Aminotransferase", "ALT", "Aspartate Aminotransferase", "Hemoglobin", "Glucose"]
+    return NgramIndex.build(texts, np.array([0, 0, 1, 2, 3]), row_count=5)
+
+
+def test_ngram_index_scores(index):
+    scores = index.scores(["alanine  aminotransferase", "Hemoglobn", "zzz", ""])
+    assert scores.shape == (4, 5) and scores.dtype == np.float32
+    # 每行取该行各文本得分的最大值；相同文本（忽略大小写和空白）得分为1
+    assert scores[0, 0] == pytest.approx(1.0)
+    assert 0 < scores[0, 1] < 1
+    assert scores[0, 4] == 0
+    # 拼写错误仍得到最高得分，但低于1
+    assert np.argmax(scores[1]) == 2 and scores[1, 2] < 1
+    assert not scores[2].any() and not scores[3].any()
+
+
+def test_word_boundaries_matter(index):
+    # 去掉空格的查询丢失词边界的n-gram，得分低于保留空格的查询
+    spaced, joined = index.scores(["Alanine Aminotransferase", "AlanineAminotransferase"])[:, 0]
+    assert spaced == pytest.approx(1.0)
+    assert joined < 0.9
+
+
+def test_ngram_index_save_load(index, tmp_path):
+    path = str(tmp_path / 'lexical.tcdidx')
+    index.save(path, meta={'content_hash': 'x'})
+    meta, loaded = NgramIndex.load(path)
+    assert meta['content_hash'] == 'x' and meta['row_count'] == 5
+    queries = ["ALT", "Glucose level", "aminotransferase"]
+    np.testing.assert_array_equal(loaded.scores(queries), index.scores(queries))
+
+
+def test_fusion_ordering(make_matcher, matcher):
+    fused = make_matcher(lexical_weight=WEIGHT)
+    for query in SEMANTIC_QUERIES[:10]:
+        semantic = np.zeros(ROWS)
+        for result in matcher.search_top_matches(query, top_k=ROWS):
+            semantic[result['row_index']] = result['similarity']
+        expected = (1 - WEIGHT) * semantic + WEIGHT * fused._lexical_scores([query])[0]
+
+        results = fused.search_top_matches(query, top_k=10)
+        similarities = [result['similarity'] for result in results]
+        assert similarities == sorted(similarities, reverse=True)
+        rows = [result['row_index'] for result in results]
+        np.testing.assert_allclose(similarities, expected[rows], atol=1e-6)
+        # 未返回的行的融合得分不高于第10个结果
+        others = np.delete(expected, rows)
+        assert others.max() <= similarities[-1] + 1e-6
+
+
+def test_confident_hit_for_multi_word_query(make_matcher, terminology):
+    lexical = make_matcher(lexical_confident=0.95)
+    # CT的H列中多个词组成的文本：按原始查询（保留空格）计算字面得分为1.0，不调用模型编码
+    checked = 0
+    for text in terminology['NCI Preferred Term'].dropna().head(20):
+        query = text.split(';')[0].strip()
+        results = lexical.search_top_matches(query, top_k=5)
+        if results[0].get('is_exact_match'):
+            continue
+        assert ' ' in query
+        assert results[0]['is_lexical_match']
+        assert results[0]['similarity'] == pytest.approx(1.0)
+        assert query in results[0]['h_value']
+        assert lexical.search_top_matches_batch([query], top_k=5) == [results]
+        checked += 1
+    assert checked
+
+
+def test_below_confidence_falls_back_to_semantic(make_matcher, matcher):
+    lexical = make_matcher(lexical_confident=0.95)
+    for query in SEMANTIC_QUERIES[:5]:
+        results = lexical.search_top_matches(query, top_k=10)
+        assert not any(result.get('is_lexical_match') for result in results)
+        assert results == matcher.search_top_matches(query, top_k=10)
+
+
+@pytest.fixture(scope='module')
+def partial_version_paths(terminology, data_dir, tmp_path_factory):
+    """两个CT版本：v2没有Codelist 5"""
+    path = tmp_path_factory.mktemp('partial') / 'terminology_v2.xlsx'
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'Readme': ["version 2"]}).to_excel(writer, sheet_name="README", index=False)
+        terminology[terminology['Codelist Name'] != 'Codelist 5'].to_excel(writer, sheet_name="Terminology",
+                                                                          index=False)
+    return {'v1': str(data_dir / 'terminology.xlsx'), 'v2': str(path)}
+
+
+def test_codelist_missing_from_version(make_matcher, terminology, partial_version_paths):
+    merged = make_matcher(excel_paths=partial_version_paths, lexical_confident=0.95)
+    query = terminology['NCI Preferred Term'][ROWS - 1].split(';')[0]
+    assert merged.search_top_matches(query, codelists='Codelist 5', ct_versions='v2') == []
+    assert merged.search_top_matches_batch([query, SEMANTIC_QUERIES[0]], codelists='Codelist 5',
+                                           ct_versions='v2') == [[], []]
+    assert merged.search_top_matches(query, codelists='Codelist 5', ct_versions='v1')[0]['is_lexical_match']
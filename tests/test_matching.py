@@ -0,0 +1,169 @@
+"""
+匹配结果的回归测试：映射文件精确匹配、与基线版本的一致性、Codelist和CT版本过滤、多进程打分
+
+fixtures/baseline_results.json由基线版本（本仓库第一个提交中的lab_test_matcher.py）在conftest.py描述的
+合成数据上生成（同样的哈希编码器，top_k=20，相似度保留7位小数）。基线版本用矩阵-向量乘法计算相似度，
+文本相同的行之间可能相差1个ulp，因此与基线比较时并列结果之间的顺序不限
+"""
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import lab_test_matcher
+from conftest import CODELISTS, DIM, MAPPING_ROWS, ROWS, SEED, assert_same_ranking
+
+with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'baseline_results.json'), encoding='utf-8') as f:
+    BASELINE = json.load(f)
+
+# 走语义匹配路径的查询（基线结果不是映射文件精确匹配）
+SEMANTIC_QUERIES = [query for query, results in BASELINE['results'].items()
+                    if results and not results[0]['is_exact_match']]
+
+
+def test_baseline_fixture_generator():
+    assert BASELINE['generator'] == {'rows': ROWS, 'codelists': CODELISTS, 'mapping_rows': MAPPING_ROWS,
+                                     'seed': SEED, 'dim': DIM, 'top_k': 20}
+
+
+@pytest.mark.parametrize('query', list(BASELINE['results']))
+def test_single_query_matches_baseline(matcher, query):
+    expected = BASELINE['results'][query]
+    assert_same_ranking(matcher.search_top_matches(query, top_k=10), expected)
+    assert_same_ranking(matcher.search_top_matches(query, top_k=20), expected)
+
+
+@pytest.fixture(scope='module')
+def exact_matcher(make_matcher, tmp_path_factory):
+    """使用小型映射文件的匹配器（包含分号分隔的同义词、'计数'和'绝对值'、空单元格）"""
+    path = tmp_path_factory.mktemp('mapping') / 'mapping.xlsx'
+    pd.DataFrame([
+        {'TESTCD': 'HGB', 'TEST': 'Hemoglobin; HGB', 'TESTDS': 'HGB', 'TESTS_CN': '血红蛋白', 'TESTS_EN': 'Hemoglobin'},
+        {'TESTCD': 'RBC', 'TEST': 'Erythrocytes', 'TESTDS': 'RBC', 'TESTS_CN': '红细胞计数',
+         'TESTS_EN': 'Red Blood Cell Count'},
+        {'TESTCD': 'LYM', 'TEST': 'Lymphocytes', 'TESTDS': 'LYM', 'TESTS_CN': '淋巴细胞绝对值', 'TESTS_EN': None},
+        {'TESTCD': 'HGB2', 'TEST': 'Hemoglobin', 'TESTDS': 'HGB2', 'TESTS_CN': None, 'TESTS_EN': 'Hb'},
+    ]).to_excel(path, sheet_name='Sheet1', index=False)
+    return make_matcher(mapping_file=str(path))
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('Hemoglobin', ['HGB', 'HGB2']),
+    ('hemoglobin', ['HGB', 'HGB2']),
+    ('HEMOGLOBIN', ['HGB', 'HGB2']),
+    ('  Hemoglobin  ', ['HGB', 'HGB2']),
+    ('hgb', ['HGB']),
+    ('Hemoglobin; HGB', ['HGB']),
+    ('血红蛋白', ['HGB']),
+    ('红细胞', ['RBC']),
+    ('红细胞计数', ['RBC']),
+    ('red blood cell count', ['RBC']),
+    ('淋巴细胞', ['LYM']),
+    ('淋巴细胞绝对值', ['LYM']),
+    ('HB', ['HGB2']),
+])
+def test_exact_mapping_hits(exact_matcher, query, expected):
+    results = exact_matcher.search_top_matches(query, top_k=10)
+    assert [result['testds_value'] for result in results] == expected
+    for result in results:
+        assert result['is_exact_match'] is True
+        assert result['similarity'] == 1.0
+        assert result['row_index'] == -1
+    assert results[0]['tests_en_value'] == {'HGB': 'Hemoglobin', 'RBC': 'Red Blood Cell Count', 'LYM': '',
+                                            'HGB2': 'Hb'}[expected[0]]
+
+
+@pytest.mark.parametrize('query', ['Hemoglobin A1c', '计数', 'nan', ''])
+def test_exact_mapping_misses(exact_matcher, query):
+    results = exact_matcher.search_top_matches(query, top_k=5)
+    assert not any(result['is_exact_match'] for result in results)
+
+
+@pytest.mark.parametrize('codelists', ['Codelist 1', ['codelist 0', 'CODELIST 4'], []])
+def test_codelist_filter_equals_post_filtering(matcher, terminology, codelists):
+    names = [codelists] if isinstance(codelists, str) else codelists
+    names = {name.lower() for name in names}
+    allowed = set(terminology.index[terminology['Codelist Name'].str.lower().isin(names)])
+    for query in SEMANTIC_QUERIES:
+        expected = [result for result in matcher.search_top_matches(query, top_k=ROWS)
+                    if result['row_index'] in allowed]
+        assert_same_ranking(matcher.search_top_matches(query, top_k=10, codelists=codelists), expected)
+
+
+def test_unknown_codelist(matcher):
+    with pytest.raises(ValueError):
+        matcher.search_top_matches('glucose free level', codelists='No Such Codelist')
+
+
+@pytest.fixture(scope='module')
+def interleaved_path(terminology, tmp_path_factory):
+    """Codelist交错排列的SDTM Terminology（匹配器需要按Codelist重新排列行）"""
+    path = tmp_path_factory.mktemp('interleaved') / 'terminology.xlsx'
+    data = terminology.copy()
+    data['Codelist Name'] = [f"Codelist {i % 3}" for i in range(len(data))]
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'Readme': ["interleaved"]}).to_excel(writer, sheet_name="README", index=False)
+        data.to_excel(writer, sheet_name="Terminology", index=False)
+    return path
+
+
+def test_interleaved_codelists(make_matcher, matcher, interleaved_path):
+    interleaved = make_matcher(excel_path=str(interleaved_path))
+    assert interleaved.list_codelists() == {'Codelist 0': 200, 'Codelist 1': 200, 'Codelist 2': 200}
+    for query in SEMANTIC_QUERIES:
+        full = interleaved.search_top_matches(query, top_k=ROWS)
+        # 行的重新排列不改变结果（并列时仍按Excel中的原有顺序）
+        assert_same_ranking(full[:20], matcher.search_top_matches(query, top_k=20))
+        expected = [result for result in full if result['row_index'] % 3 == 1]
+        assert_same_ranking(interleaved.search_top_matches(query, top_k=10, codelists='Codelist 1'), expected)
+
+
+@pytest.fixture(scope='module')
+def version_paths(terminology, data_dir, tmp_path_factory):
+    """两个CT版本：v2删除了前50行，修改了10行的E列，并在中间插入了20个新行"""
+    path = tmp_path_factory.mktemp('versions') / 'terminology_v2.xlsx'
+    data = terminology.iloc[50:].copy()
+    data.loc[100:109, 'CDISC Submission Value'] = [f"V2{i:04d}" for i in range(10)]
+    added = terminology.iloc[300:320].copy()
+    added['CDISC Submission Value'] = [f"NEW{i:03d}" for i in range(20)]
+    added['CDISC Synonym(s)'] = [f"Fasting Glucose New {i}" for i in range(20)]
+    data = pd.concat([data.loc[:299], added, data.loc[300:]], ignore_index=True)
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'Readme': ["version 2"]}).to_excel(writer, sheet_name="README", index=False)
+        data.to_excel(writer, sheet_name="Terminology", index=False)
+    return {'v1': str(data_dir / 'terminology.xlsx'), 'v2': str(path)}
+
+
+def test_ct_version_filter(make_matcher, version_paths):
+    merged = make_matcher(excel_paths=version_paths)
+    assert merged.list_ct_versions() == {'v1': ROWS, 'v2': ROWS - 50 + 20}
+    standalone = {version: make_matcher(excel_path=path) for version, path in version_paths.items()}
+    for query in SEMANTIC_QUERIES + ['Fasting Glucose New 3']:
+        full = merged.search_top_matches(query, top_k=2 * ROWS)
+        for version in ('v1', 'v2'):
+            actual = merged.search_top_matches(query, top_k=10, ct_versions=version)
+            # 与单独加载该版本的结果相同，row_index为在该版本中的行索引
+            assert_same_ranking(actual, standalone[version].search_top_matches(query, top_k=20))
+            # 与先查询全部版本、再只保留该版本的行相同
+            expected = [dict(result, row_index=result['ct_versions'][version]) for result in full
+                        if version in result['ct_versions']]
+            assert_same_ranking(actual, expected)
+
+
+def test_worker_scoring_matches_single_process(make_matcher, monkeypatch):
+    monkeypatch.setattr(lab_test_matcher, 'PARALLEL_MIN_WORK', 0)
+    inline = make_matcher()
+    parallel = make_matcher(search_workers=2)
+    try:
+        assert parallel._use_workers(1)
+        # 查询数不少于进程数时按查询分片（结果完全相同，包括并列结果的顺序）
+        expected = inline.search_top_matches_batch(SEMANTIC_QUERIES, top_k=10)
+        assert parallel.search_top_matches_batch(SEMANTIC_QUERIES, top_k=10) == expected
+        # 单个查询按行分片
+        for query in SEMANTIC_QUERIES[:5]:
+            assert (parallel.search_top_matches(query, top_k=10, codelists=['Codelist 1', 'Codelist 3'])
+                    == inline.search_top_matches(query, top_k=10, codelists=['Codelist 1', 'Codelist 3']))
+    finally:
+        parallel.close_workers()
@@ -0,0 +1,45 @@
+"""
+MCP服务器：工具注册和调用（没有安装mcp时跳过）
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip('mcp.server.fastmcp')
+
+import mcp_server  # noqa: E402
+from test_batch import QUERIES  # noqa: E402
+
+TOOLS = {'search_lab_test', 'search_lab_tests_batch', 'list_codelists', 'list_ct_versions'}
+
+
+def test_tools_registered():
+    tools = asyncio.run(mcp_server.mcp.list_tools())
+    assert {tool.name for tool in tools} == TOOLS
+    search = next(tool for tool in tools if tool.name == 'search_lab_test')
+    assert {'query', 'top_k', 'codelists', 'ct_versions'} <= set(search.inputSchema['properties'])
+
+
+@pytest.fixture
+def shared_matcher(matcher, monkeypatch):
+    """服务器的共享匹配器替换为测试数据的匹配器"""
+    monkeypatch.setattr(mcp_server, '_matcher', matcher)
+    return matcher
+
+
+def test_tools_use_shared_matcher(shared_matcher):
+    assert mcp_server.get_matcher() is shared_matcher
+    assert mcp_server.search_lab_test(QUERIES[0], top_k=5) == \
+        shared_matcher.format_results_json(shared_matcher.search_top_matches(QUERIES[0], top_k=5))
+    batch = mcp_server.search_lab_tests_batch(QUERIES[:3], top_k=3)
+    assert [item['query'] for item in batch['results']] == QUERIES[:3]
+    assert mcp_server.list_codelists() == shared_matcher.list_codelists()
+
+
+def test_call_tool_through_server(shared_matcher):
+    # 不同版本的mcp返回的内容结构不同，只检查结果中包含工具返回的JSON
+    result = asyncio.run(mcp_server.mcp.call_tool('search_lab_test', {'query': QUERIES[0], 'top_k': 3}))
+    assert '"total_matches"' in str(result)
+    result = asyncio.run(mcp_server.mcp.call_tool('list_codelists', {}))
+    assert 'Codelist 1' in str(result)
@@ -0,0 +1,85 @@
+"""
+查询embedding缓存：内存LRU、磁盘存储的延后提交、条目数上限和旧版本表
+"""
+
+import sqlite3
+
+import numpy as np
+
+import query_cache
+from query_cache import QueryEmbeddingCache
+
+
+def vectors(count, dim=4):
+    return np.arange(count * dim, dtype=np.float32).reshape(count, dim)
+
+
+def disk_rows(path):
+    with sqlite3.connect(path) as conn:
+        return dict(conn.execute("SELECT query, last_used FROM query_embeddings"))
+
+
+def test_memory_lru():
+    cache = QueryEmbeddingCache(max_size=2)
+    cache.put_many('m', ['a', 'b', 'c'], vectors(3))
+    assert [e is None for e in cache.get_many('m', ['a', 'b', 'c'])] == [True, False, False]
+    assert cache.info()['persistent'] is False
+
+
+def test_disk_store_survives_restart(tmp_path):
+    path = str(tmp_path / 'q.sqlite')
+    cache = QueryEmbeddingCache(max_size=0, db_path=path)
+    cache.put_many('m', ['a', 'b'], vectors(2))
+    # 未到提交条件时不提交：其他连接看不到
+    assert disk_rows(path) == {}
+    # 同一连接可以读到未提交的写入
+    np.testing.assert_array_equal(cache.get_many('m', ['b'])[0], vectors(2)[1])
+    cache.close()
+
+    reopened = QueryEmbeddingCache(max_size=0, db_path=path)
+    results = reopened.get_many('m', ['a', 'b', 'x'])
+    np.testing.assert_array_equal(np.stack(results[:2]), vectors(2))
+    assert results[2] is None
+    assert reopened.info()['disk_hits'] == 2
+    reopened.close()
+
+
+def test_commit_after_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_cache, 'COMMIT_BATCH', 3)
+    path = str(tmp_path / 'q.sqlite')
+    cache = QueryEmbeddingCache(max_size=0, db_path=path)
+    cache.put_many('m', ['a', 'b'], vectors(2))
+    assert disk_rows(path) == {}
+    cache.put_many('m', ['c'], vectors(1))
+    assert set(disk_rows(path)) == {'a', 'b', 'c'}
+    cache.close()
+
+
+def test_disk_size_evicts_least_recently_used(tmp_path):
+    path = str(tmp_path / 'q.sqlite')
+    cache = QueryEmbeddingCache(max_size=0, db_path=path, disk_size=3)
+    cache.put_many('m', ['a', 'b', 'c'], vectors(3))
+    cache.get_many('m', ['a'])  # a最近使用过
+    cache.put_many('m', ['d', 'e'], vectors(2))
+    cache.flush()
+    assert set(disk_rows(path)) == {'a', 'd', 'e'}
+    cache.close()
+
+    # 重新打开后使用顺序继续递增
+    reopened = QueryEmbeddingCache(max_size=0, db_path=path, disk_size=3)
+    reopened.put_many('m', ['f'], vectors(1))
+    reopened.close()
+    assert set(disk_rows(path)) == {'d', 'e', 'f'}
+
+
+def test_legacy_table_is_rebuilt(tmp_path):
+    path = str(tmp_path / 'q.sqlite')
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE query_embeddings (model TEXT NOT NULL, query TEXT NOT NULL, "
+                     "embedding BLOB NOT NULL, PRIMARY KEY (model, query))")
+        conn.execute("INSERT INTO query_embeddings VALUES ('m', 'a', ?)", (vectors(1)[0].tobytes(),))
+    cache = QueryEmbeddingCache(max_size=0, db_path=path)
+    assert cache.get_many('m', ['a']) == [None]
+    cache.put_many('m', ['a'], vectors(1))
+    cache.close()
+    assert set(disk_rows(path)) == {'a'}
@@ -0,0 +1,58 @@
+"""
+HTTP服务的路径处理（随机端口启动真实服务）
+"""
+
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from search_service import make_server
+
+
+@pytest.fixture(scope='module')
+def base_url(matcher):
+    server = make_server(matcher, host='127.0.0.1', port=0, max_wait_ms=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def request(url, payload=None):
+    data = None if payload is None else json.dumps(payload).encode('utf-8')
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=30) as response:
+            return response.status, json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read().decode('utf-8'))
+
+
+@pytest.mark.parametrize('path', ['/health', '/health?verbose=1'])
+def test_health_ignores_query_string(base_url, path):
+    status, body = request(base_url + path)
+    assert status == 200
+    assert body['status'] == 'ok'
+
+
+@pytest.mark.parametrize('path', ['/search', '/search?trace=1'])
+def test_search_ignores_query_string(base_url, matcher, path):
+    status, body = request(base_url + path, {'query': 'glucose free level', 'top_k': 5})
+    assert status == 200
+    assert body == matcher.format_results_json(matcher.search_top_matches('glucose free level', top_k=5))
+
+
+def test_batch_ignores_query_string(base_url):
+    status, body = request(base_url + '/search/batch?x=1', {'queries': ['glucose free level', 'ALT'], 'top_k': 3})
+    assert status == 200
+    assert len(body['results']) == 2
+
+
+@pytest.mark.parametrize('path, payload', [('/unknown', None), ('/healthz?x=1', None), ('/search/other', {})])
+def test_unknown_path(base_url, path, payload):
+    status, body = request(base_url + path, payload)
+    assert status == 404
+    assert 'error' in body
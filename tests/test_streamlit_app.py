@@ -0,0 +1,53 @@
+"""
+Streamlit界面的搜索触发：回车、选择候选词、点击"搜索"时搜索，修改其他控件时不重新搜索（没有安装streamlit时跳过）
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip('streamlit.testing.v1')
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import lab_test_matcher  # noqa: E402
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'streamlit_app.py')
+
+
+@pytest.fixture
+def app(make_matcher, monkeypatch):
+    """使用测试数据的匹配器运行界面（不翻译结果）"""
+    shared = make_matcher()
+    monkeypatch.setattr(lab_test_matcher, 'LabTestMatcher', lambda **kwargs: shared)
+    monkeypatch.setenv('TRANSLATOR', 'none')
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.run()
+    return at
+
+
+def result_headers(at):
+    return [header.value for header in at.subheader if '结果' in header.value]
+
+
+def test_search_triggers(app):
+    assert not result_headers(app)
+
+    # 回车提交任意文本时搜索，同时显示候选词
+    app.text_input(key='query').input('Hemoglobin').run()
+    assert result_headers(app)
+    options = app.pills[0].options
+    assert len(options) > 1
+
+    # 选择候选词时填入输入框并用它搜索
+    app.pills[0].set_value(options[1]).run()
+    assert app.session_state['query'] == options[1]
+    assert result_headers(app)
+
+    # 修改其他控件不重新搜索
+    app.slider[0].set_value(3).run()
+    assert not result_headers(app)
+
+    app.button[0].click().run()
+    assert result_headers(app)
+    assert not app.exception
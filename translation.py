@@ -0,0 +1,206 @@
+"""
+结果列的英译中
+一次收集整个结果表中需要翻译的文本片段（按分号拆分），去重后用有上限的线程池并发翻译，
+整批有总超时；翻译结果持久化到SQLite（CACHE_DIR/translations.sqlite），重启后仍可命中
+
+翻译后端：
+- google: deep-translator的GoogleTranslator（需要网络）
+- stub: 本地桩翻译器，返回 "[zh] 原文"，不访问网络（用于测试）
+- none: 不翻译
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+_CHINESE = re.compile(r'[\u4e00-\u9fff]')
+
+
+class StubTranslator:
+    """本地桩翻译器：不访问网络，返回可预期的结果"""
+
+    def translate(self, text: str) -> str:
+        return f"[zh] {text}"
+
+
+class GoogleBackend:
+    """deep-translator的GoogleTranslator（每个线程使用自己的实例）"""
+
+    def __init__(self, source: str = 'en', target: str = 'zh'):
+        from deep_translator import GoogleTranslator
+        self._translator_class = GoogleTranslator
+        self.source = source
+        self.target = target
+        self._local = threading.local()
+
+    def translate(self, text: str) -> str:
+        translator = getattr(self._local, 'translator', None)
+        if translator is None:
+            translator = self._translator_class(source=self.source, target=self.target)
+            self._local.translator = translator
+        return translator.translate(text)
+
+
+class TranslationStore:
+    """翻译结果的持久化存储（SQLite），键为 (翻译后端, 原文)"""
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._conn = None
+        try:
+            store_dir = os.path.dirname(db_path)
+            if store_dir and not os.path.exists(store_dir):
+                os.makedirs(store_dir)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "backend TEXT NOT NULL, text TEXT NOT NULL, translated TEXT NOT NULL, "
+                "PRIMARY KEY (backend, text))"
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"警告: 无法打开翻译缓存: {e}，翻译结果将只保存在内存中", file=sys.stderr, flush=True)
+            self._conn = None
+
+    def get_many(self, backend: str, texts: List[str]) -> Dict[str, str]:
+        if self._conn is None or not texts:
+            return {}
+        found = {}
+        with self._lock:
+            try:
+                for text in texts:
+                    row = self._conn.execute(
+                        "SELECT translated FROM translations WHERE backend = ? AND text = ?", (backend, text)
+                    ).fetchone()
+                    if row is not None:
+                        found[text] = row[0]
+            except sqlite3.Error:
+                pass
+        return found
+
+    def put(self, backend: str, text: str, translated: str):
+        if self._conn is None:
+            return
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO translations (backend, text, translated) VALUES (?, ?, ?)",
+                    (backend, text, translated)
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"警告: 写入翻译缓存失败: {e}", file=sys.stderr, flush=True)
+
+
+class ResultTranslator:
+    """批量、并发、带持久化缓存的翻译器"""
+
+    def __init__(self, backend: str = 'google', db_path: str = None, max_workers: int = 8, timeout: float = 5.0):
+        """
+        Args:
+            backend: 'google'、'stub' 或 'none'
+            db_path: 持久化存储的SQLite路径（None表示只在内存中缓存）
+            max_workers: 同时进行的翻译请求数上限
+            timeout: 一批翻译的总超时（秒），超时未完成的片段显示原文（完成后仍会写入缓存）
+        """
+        self.backend_name = backend
+        self.timeout = timeout
+        self._memory = {}
+        self._store = TranslationStore(db_path) if db_path else None
+        self._backend = None
+        if backend == 'google':
+            try:
+                self._backend = GoogleBackend()
+            except ImportError:
+                print("警告: 未安装deep-translator，将不翻译结果", file=sys.stderr, flush=True)
+        elif backend == 'stub':
+            self._backend = StubTranslator()
+        elif backend != 'none':
+            raise ValueError(f"不支持的翻译后端: {backend}（可选: google、stub、none）")
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="translate") \
+            if self._backend is not None else None
+
+    @property
+    def enabled(self) -> bool:
+        return self._backend is not None
+
+    @staticmethod
+    def _units(text: str) -> List[str]:
+        """需要翻译的片段：含分号时为每个非中文的片段，否则为整个文本"""
+        if not text or not text.strip() or _CHINESE.search(text):
+            return []
+        if ';' in text:
+            return [part.strip() for part in text.split(';') if part.strip() and not _CHINESE.search(part)]
+        return [text]
+
+    def _translate_one(self, text: str) -> Optional[str]:
+        try:
+            translated = self._backend.translate(text)
+        except Exception:
+            return None
+        if translated:
+            self._memory[text] = translated
+            if self._store is not None:
+                self._store.put(self.backend_name, text, translated)
+        return translated
+
+    def translate_many(self, texts: List[str]) -> Dict[str, str]:
+        """
+        翻译一批片段（去重；先查内存和持久化缓存，其余并发翻译）
+
+        Returns:
+            {片段: 译文}，失败或超时的片段不在其中
+        """
+        if not self.enabled:
+            return {}
+        unique = list(dict.fromkeys(texts))
+        translations = {text: self._memory[text] for text in unique if text in self._memory}
+
+        missing = [text for text in unique if text not in translations]
+        if self._store is not None and missing:
+            stored = self._store.get_many(self.backend_name, missing)
+            self._memory.update(stored)
+            translations.update(stored)
+            missing = [text for text in missing if text not in stored]
+
+        if missing:
+            futures = {self._executor.submit(self._translate_one, text): text for text in missing}
+            done, _ = wait(futures, timeout=self.timeout)
+            for future in done:
+                translated = future.result()
+                if translated:
+                    translations[futures[future]] = translated
+        return translations
+
+    def translate_values(self, values: List[str]) -> List[str]:
+        """
+        翻译一组列值，格式与原来相同："英文 (中文)"，含分号时逐个片段翻译后用"; "连接；
+        中文文本和翻译失败的片段保持原样
+
+        Args:
+            values: 列值列表（例如结果表的全部F列和H列值）
+
+        Returns:
+            与values一一对应的显示文本
+        """
+        if not self.enabled:
+            return list(values)
+        translations = self.translate_many([unit for value in values for unit in self._units(value)])
+
+        def display(part: str) -> str:
+            translated = translations.get(part)
+            return f"{part} ({translated})" if translated else part
+
+        results = []
+        for value in values:
+            if not self._units(value):
+                results.append(value)
+            elif ';' in value:
+                results.append('; '.join(display(part.strip()) for part in value.split(';')))
+            else:
+                results.append(display(value))
+        return results